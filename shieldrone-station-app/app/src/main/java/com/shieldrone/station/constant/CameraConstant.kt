@@ -9,5 +9,12 @@ class CameraConstant {
         const val JPEG_QUALITY = 25 // JPEG 압축 품질
         const val RESIZED_WIDTH = 640
         const val RESIZED_HEIGHT = 480
+
+        // 프레임 조각 전송 프로토콜 (station-pc 의 UdpFrameReassembler 와 동일해야 함)
+        const val FRAGMENT_MAGIC_0: Byte = 0x53 // 'S'
+        const val FRAGMENT_MAGIC_1: Byte = 0x44 // 'D'
+        const val FRAGMENT_VERSION: Byte = 1
+        const val FRAGMENT_HEADER_SIZE = 20
+        const val FRAGMENT_PAYLOAD_SIZE = 1400 // MTU 를 넘지 않는 조각 크기
     }
 }
\ No newline at end of file
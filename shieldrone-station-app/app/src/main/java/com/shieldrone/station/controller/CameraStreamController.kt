@@ -12,6 +12,7 @@ import java.io.ByteArrayOutputStream
 import java.net.DatagramPacket
 import java.net.DatagramSocket
 import java.net.InetAddress
+import java.nio.ByteBuffer
 
 class CameraStreamController {
 
@@ -24,6 +25,9 @@ class CameraStreamController {
     // 전송 간격 (30fps의 모든 프레임을 보내지 않기 위해 샘플링)
     private val frameIntervalMs = 50 // 100ms 간격으로 전송 (약 10fps)
 
+    // 조각 헤더에 기록되는 프레임 번호
+    private var frameId = 0
+
     init {
         initializeSocket()
     }
@@ -54,20 +58,53 @@ class CameraStreamController {
             if (jpegData.isEmpty()) return@launch
 
             try {
-                val packet = DatagramPacket(
-                    jpegData,
-                    jpegData.size,
-                    InetAddress.getByName(CameraConstant.HOST),
-                    CameraConstant.PORT
-                )
-                udpSocket?.send(packet)
-                Log.d("StreamController", "Frame sent to ${CameraConstant.HOST}:${CameraConstant.PORT}, size: ${jpegData.size} bytes")
+                val fragmentCount = sendFragments(jpegData, currentTime)
+                Log.d("StreamController", "Frame sent to ${CameraConstant.HOST}:${CameraConstant.PORT}, size: ${jpegData.size} bytes, fragments: $fragmentCount")
             } catch (e: Exception) {
                 Log.e("StreamController", "Error sending UDP packet: ${e.message}")
             }
         }
     }
 
+    /**
+     * JPEG 데이터를 MTU 이하 크기의 조각으로 나누어 헤더와 함께 전송합니다.
+     *
+     * 헤더 (big endian, 20 bytes): magic 'SD' | version | flags | frameId(u32) |
+     * fragIndex(u16) | fragCount(u16) | timestampMs(u64)
+     */
+    @Synchronized
+    private fun sendFragments(jpegData: ByteArray, timestampMs: Long): Int {
+        val address = InetAddress.getByName(CameraConstant.HOST)
+        val payloadSize = CameraConstant.FRAGMENT_PAYLOAD_SIZE
+        val fragmentCount = (jpegData.size + payloadSize - 1) / payloadSize
+        val currentFrameId = frameId
+        frameId += 1
+
+        val buffer = ByteArray(CameraConstant.FRAGMENT_HEADER_SIZE + payloadSize)
+        for (index in 0 until fragmentCount) {
+            val offset = index * payloadSize
+            val length = minOf(payloadSize, jpegData.size - offset)
+            ByteBuffer.wrap(buffer)
+                .put(CameraConstant.FRAGMENT_MAGIC_0)
+                .put(CameraConstant.FRAGMENT_MAGIC_1)
+                .put(CameraConstant.FRAGMENT_VERSION)
+                .put(0.toByte())
+                .putInt(currentFrameId)
+                .putShort(index.toShort())
+                .putShort(fragmentCount.toShort())
+                .putLong(timestampMs)
+            System.arraycopy(jpegData, offset, buffer, CameraConstant.FRAGMENT_HEADER_SIZE, length)
+            val packet = DatagramPacket(
+                buffer,
+                CameraConstant.FRAGMENT_HEADER_SIZE + length,
+                address,
+                CameraConstant.PORT
+            )
+            udpSocket?.send(packet)
+        }
+        return fragmentCount
+    }
+
     /**
      * NV21 형식의 데이터를 JPEG로 변환하고 압축합니다.
      */
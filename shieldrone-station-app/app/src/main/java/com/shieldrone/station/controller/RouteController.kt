@@ -11,6 +11,7 @@ import kotlinx.coroutines.launch
 import org.json.JSONObject
 import java.net.DatagramPacket
 import java.net.DatagramSocket
+import java.nio.ByteBuffer
 import kotlin.math.abs
 
 class RouteController(private val routeVM: RouteVM) {
@@ -18,11 +19,19 @@ class RouteController(private val routeVM: RouteVM) {
     private val coroutineScope = CoroutineScope(Dispatchers.IO)
     private var udpSocket: DatagramSocket? = null
     private var isReceiving = false
+    private var lastEpoch: Long = -1
+    private var lastSeq: Long = -1
 
     private val TAG = "RouteController"
 
     companion object {
         private const val PORT = 23456      // RouteDecision에서 보낸 포트와 일치
+
+        // protocol/route_packet.py 와 같은 형식 (magic, version, type, epoch, seq, time, lat, lng, destLat, destLng)
+        private const val PACKET_SIZE = 52
+        private const val PACKET_VERSION = 2
+        private const val MSG_START = 1
+        private const val MSG_ROUTE = 2
     }
 
     init {
@@ -51,46 +60,10 @@ class RouteController(private val routeVM: RouteVM) {
                 val packet = DatagramPacket(buffer, buffer.size)
                 udpSocket?.receive(packet)  // 데이터 패킷 수신 대기
 
-                val message = String(packet.data, 0, packet.length, Charsets.UTF_8)
-                val data = JSONObject(message)  // JSON 데이터로 변환
-
-                val startFlag = data.optBoolean("start_flag", false)
-
-                if (startFlag) {
-                    // start_flag가 true인 경우
-                    Log.i(
-                        TAG,
-                        "Received start_flag: $startFlag (No location data expected)"
-                    )
-                    routeVM.setStartFlag(startFlag)
-
-                    // 필요한 추가 로직
-                } else if (data.has("location") && data.has("dest_location")) {
-                    // location과 dest_location이 모두 존재하는 경우
-                    val location = data.getJSONObject("location")
-                    val destLocation = data.getJSONObject("dest_location")
-
-                    val locationLat = location.optDouble("lat", Double.NaN)
-                    val locationLng = location.optDouble("lng", Double.NaN)
-                    val destLat = destLocation.optDouble("lat", Double.NaN)
-                    val destLng = destLocation.optDouble("lng", Double.NaN)
-
-                    routeVM.setRouteUpdate(
-                        locationLat,
-                        locationLng,
-                        destLat,
-                        destLng,
-                        altitude = GPS_ALTITUDE
-                    )
-                    // 로그 출력
-                    Log.i(
-                        TAG, "route Updated. locLat: $locationLat, locLng: $locationLng" +
-                                "destLat : $destLat, destLng: $destLng"
-                    )
+                if (isRoutePacket(packet)) {
+                    handleRoutePacket(ByteBuffer.wrap(packet.data, 0, packet.length))
                 } else {
-                    // 데이터가 누락된 경우 처리
-                    Log.e(TAG, "Missing location or dest_location data.")
-                    // 필요에 따라 기본값 설정이나 예외 처리
+                    handleJsonMessage(String(packet.data, 0, packet.length, Charsets.UTF_8))
                 }
                 delay(1000)
             }
@@ -99,6 +72,113 @@ class RouteController(private val routeVM: RouteVM) {
         }
     }
 
+    private fun isRoutePacket(packet: DatagramPacket): Boolean {
+        return packet.length == PACKET_SIZE &&
+                packet.data[0] == 'S'.code.toByte() && packet.data[1] == 'R'.code.toByte()
+    }
+
+    private fun handleRoutePacket(buffer: ByteBuffer) {
+        buffer.position(buffer.position() + 2)  // magic
+        val version = buffer.get().toInt()
+        val msgType = buffer.get().toInt()
+        val epoch = buffer.int.toLong() and 0xFFFFFFFFL
+        val seq = buffer.int.toLong() and 0xFFFFFFFFL
+        if (version != PACKET_VERSION) {
+            Log.e(TAG, "Unsupported route packet version: $version")
+            return
+        }
+        if (epoch != lastEpoch) {
+            // 스테이션 PC 가 다시 시작되어 순번이 처음부터 시작됨
+            Log.i(TAG, "Route sender restarted (epoch: $lastEpoch -> $epoch)")
+            lastEpoch = epoch
+            lastSeq = -1
+        }
+
+        if (msgType == MSG_START) {
+            // 이륙 신호는 새 순번의 시작
+            lastSeq = seq
+            Log.i(TAG, "Received start_flag (seq: $seq)")
+            routeVM.setStartFlag(true)
+            return
+        }
+        if (msgType != MSG_ROUTE) {
+            Log.e(TAG, "Unknown route packet type: $msgType")
+            return
+        }
+        if (lastSeq >= 0 && !isNewerSeq(seq, lastSeq)) {
+            // 순서가 뒤바뀐 이전 위치는 버림
+            Log.w(TAG, "Dropped out-of-order route packet. seq: $seq, last: $lastSeq")
+            return
+        }
+        lastSeq = seq
+
+        buffer.double  // 측정 시각
+        val locationLat = buffer.double
+        val locationLng = buffer.double
+        val destLat = buffer.double
+        val destLng = buffer.double
+        routeVM.setRouteUpdate(
+            locationLat,
+            locationLng,
+            destLat,
+            destLng,
+            altitude = GPS_ALTITUDE
+        )
+        Log.i(
+            TAG, "route Updated. seq: $seq, locLat: $locationLat, locLng: $locationLng" +
+                    "destLat : $destLat, destLng: $destLng"
+        )
+    }
+
+    // 32비트 순번 비교, 되돌아감을 고려해 차이가 2^31 보다 작으면 새 순번
+    private fun isNewerSeq(seq: Long, last: Long): Boolean {
+        val diff = (seq - last) and 0xFFFFFFFFL
+        return diff in 1 until 0x80000000L
+    }
+
+    private fun handleJsonMessage(message: String) {
+        val data = JSONObject(message)  // JSON 데이터로 변환
+
+        val startFlag = data.optBoolean("start_flag", false)
+
+        if (startFlag) {
+            // start_flag가 true인 경우
+            Log.i(
+                TAG,
+                "Received start_flag: $startFlag (No location data expected)"
+            )
+            routeVM.setStartFlag(startFlag)
+
+            // 필요한 추가 로직
+        } else if (data.has("location") && data.has("dest_location")) {
+            // location과 dest_location이 모두 존재하는 경우
+            val location = data.getJSONObject("location")
+            val destLocation = data.getJSONObject("dest_location")
+
+            val locationLat = location.optDouble("lat", Double.NaN)
+            val locationLng = location.optDouble("lng", Double.NaN)
+            val destLat = destLocation.optDouble("lat", Double.NaN)
+            val destLng = destLocation.optDouble("lng", Double.NaN)
+
+            routeVM.setRouteUpdate(
+                locationLat,
+                locationLng,
+                destLat,
+                destLng,
+                altitude = GPS_ALTITUDE
+            )
+            // 로그 출력
+            Log.i(
+                TAG, "route Updated. locLat: $locationLat, locLng: $locationLng" +
+                        "destLat : $destLat, destLng: $destLng"
+            )
+        } else {
+            // 데이터가 누락된 경우 처리
+            Log.e(TAG, "Missing location or dest_location data.")
+            // 필요에 따라 기본값 설정이나 예외 처리
+        }
+    }
+
     fun validateLocationData(
         locationLat: Double,
         locationLng: Double,
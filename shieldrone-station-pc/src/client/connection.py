@@ -4,7 +4,6 @@ import websockets
 import threading
 import json
 import zmq
-import time
 from datetime import datetime
 
 class Server:
@@ -14,6 +13,8 @@ class Server:
         """
         self.app = Flask(__name__)
         self.ws_clients = set()
+        self.loop = None
+        self.flag_queue = None
         self.setup_routes()
         self.setup_zmq()
 
@@ -26,7 +27,8 @@ class Server:
 
     def setup_zmq(self):
         """
-        ZeroMQ 소켓을 설정하고 TCP 주소와 타임아웃을 5초로 지정.
+        ZeroMQ 소켓을 설정하고 TCP 주소를 지정.
+        PUB 소켓은 WebSocket 이벤트 루프에서만 사용하며 NOBLOCK 으로 전송함.
         """
         self.context = zmq.Context()
         self.socket_danger = self.context.socket(zmq.PUB)
@@ -38,11 +40,16 @@ class Server:
         self.socket_flag.connect("tcp://127.0.0.1:5590") 
 
         self.socket_flag.setsockopt_string(zmq.SUBSCRIBE, "")
-
-        self.socket_danger.setsockopt(zmq.SNDTIMEO, 5000)
-        self.socket_route.setsockopt(zmq.SNDTIMEO, 5000)
         self.socket_flag.setsockopt(zmq.RCVTIMEO, 5000)
 
+    def setup_flag_bridge(self):
+        """
+        ZeroMQ 수신 스레드에서 WebSocket 이벤트 루프로 flag 를 넘기는 브리지를 설정.
+        이벤트 루프 안에서 호출해야 함.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.flag_queue = asyncio.Queue(maxsize=32)
+        self.loop.create_task(self.relay_flags())
         threading.Thread(target=self.receive_flag_data, daemon=True).start()
 
     def test(self):
@@ -61,7 +68,8 @@ class Server:
         Returns:
             Response: user_id가 없을 경우 400 에러 발생, 성공 시 200 상태 코드 반환.
         """
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
+        user_id = data.get("user_id")
 
         if user_id:
             print(f"유저 {user_id}가 연결되었습니다. 이제 WebSocket을 통해 실시간 데이터를 전송할 수 있습니다.")
@@ -99,13 +107,12 @@ class Server:
 
     def receive_flag_data(self):
         """
-        5590 포트에서 flag 데이터를 수신하여 처리.
+        5590 포트에서 flag 데이터를 수신하여 이벤트 루프로 전달.
         """
         while True:
             try:
                 message = self.socket_flag.recv_string()
                 data = json.loads(message)
-                time = data.get("time", datetime.now().isoformat())
 
                 # 위험 상황 판단 및 경고음 전송
                 if data.get("type") == "sendWarningFlag":
@@ -117,10 +124,34 @@ class Server:
                     self.trigger_warning_object()
                     print(f"[sendObjectFlag] {data}")
 
+            except zmq.Again:
+                continue  # 수신 타임아웃, 계속 대기
             except zmq.ZMQError as e:
                 print(f"ZeroMQ 에러 발생: {e}")
                 break
 
+    def enqueue_flag(self, flag_type):
+        """
+        이벤트 루프 스레드에서 flag 를 대기열에 넣음. 대기열이 가득 차면 가장 오래된 flag 를 버림.
+        """
+        if self.flag_queue.full():
+            self.flag_queue.get_nowait()
+        self.flag_queue.put_nowait(flag_type)
+
+    async def relay_flags(self):
+        """
+        대기열의 flag 를 WebSocket 클라이언트에 순서대로 전송.
+        """
+        while True:
+            flag_type = await self.flag_queue.get()
+            try:
+                if flag_type == "sendWarningFlag":
+                    await self.send_warning_beep()
+                elif flag_type == "sendObjectFlag":
+                    await self.send_object_flag()
+            except Exception as e:
+                print(f"flag 전송 중 오류 발생: {e}")
+
     async def handle_track_position(self, data):
         """
         사용자의 위치 데이터를 처리하고 로그에 기록하며 ZeroMQ로 전송.
@@ -187,7 +218,7 @@ class Server:
         """
         time = datetime.now().isoformat()
         message = json.dumps({"type": "sendWarningFlag", "time": time, "warningFlag": True})
-        for client in self.ws_clients:
+        for client in list(self.ws_clients):
             try:
                 await client.send(message)
                 print(f"[경고음 전송] 시간: {time}, WarningFlag: True")
@@ -200,7 +231,7 @@ class Server:
         """
         time = datetime.now().isoformat()
         message = json.dumps({"type": "sendObjectFlag", "time": time, "objectFlag": True})
-        for client in self.ws_clients:
+        for client in list(self.ws_clients):
             try:
                 await client.send(message)
                 print(f"[객체 감지] 시간: {time}, objectFlag: True")
@@ -209,15 +240,15 @@ class Server:
 
     def trigger_warning_beep(self):
         """
-        경고음을 WebSocket 클라이언트에 비동기적으로 전송함.
+        경고음 전송을 WebSocket 이벤트 루프에 요청함 (다른 스레드에서 호출 가능).
         """
-        asyncio.run(self.send_warning_beep())
+        self.loop.call_soon_threadsafe(self.enqueue_flag, "sendWarningFlag")
     
     def trigger_warning_object(self):
         """
-        경고음을 WebSocket 클라이언트에 비동기적으로 전송함.
+        객체 감지 알림 전송을 WebSocket 이벤트 루프에 요청함 (다른 스레드에서 호출 가능).
         """
-        asyncio.run(self.send_object_flag())
+        self.loop.call_soon_threadsafe(self.enqueue_flag, "sendObjectFlag")
 
     def run_flask(self):
         self.app.run(host="0.0.0.0", port=5000)
@@ -226,30 +257,30 @@ class Server:
         """
         WebSocket 서버를 0.0.0.0:8765에서 대기 상태로 실행.
         """
+        self.setup_flag_bridge()
         async with websockets.serve(self.websocket_handler, "0.0.0.0", 8765):
             print("WebSocket 서버가 8765 포트에서 대기 중입니다...")
             await asyncio.Future()
 
-    async def send_message_with_retry(self, socket, message):
+    async def send_message_with_retry(self, socket, message, retries=3, backoff=0.05):
         """
-        메시지를 소켓을 통해 전송. 타임아웃 에러 발생 시 재시도.
+        메시지를 소켓을 통해 NOBLOCK 으로 전송. 전송할 수 없으면 이벤트 루프를 막지 않고
+        대기 시간을 두 배씩 늘리며 재시도.
         """
-        retries=3
-        attempt = 0
-        while attempt < retries:
+        for attempt in range(1, retries + 1):
             try:
-                socket.send_string(message)
-                break  # 성공 시 루프 종료
+                socket.send_string(message, flags=zmq.NOBLOCK)
+                return True
             except zmq.Again:
-                attempt += 1
                 print(f"Attempt {attempt} failed. Retrying...")
-                time.sleep(1)  # 잠시 대기 후 재시도
+                await asyncio.sleep(backoff)
+                backoff *= 2
             except Exception as e:
                 print(f"Unexpected error while sending message: {e}")
-                break
+                return False
 
-        if attempt == retries:
-            print("Failed to send message after multiple attempts.")
+        print("Failed to send message after multiple attempts.")
+        return False
 
     def start(self):
         flask_thread = threading.Thread(target=self.run_flask)
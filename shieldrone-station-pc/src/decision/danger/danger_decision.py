@@ -1,89 +1,247 @@
-import json
 import time
+from collections import deque
 from datetime import datetime
 
+import numpy as np
+
+# 위험 신호 출처
+SOURCES = ("pulse", "db", "camera")
+
+
+def to_epoch_seconds(value, default=None):
+    """
+    이벤트 시각을 epoch 초(float)로 변환합니다.
+    클라이언트가 보내는 epoch 밀리초(int), epoch 초, datetime, ISO 문자열을 모두 받습니다.
+    """
+    if value is None:
+        return default
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            try:
+                value = float(value)
+            except ValueError:
+                return default
+    value = float(value)
+    # 1e11 초는 5138년이므로 그보다 크면 밀리초로 간주
+    return value / 1000.0 if value > 1e11 else value
+
+
+class EventWindow:
+    """
+    출처 하나의 (시각, 값) 이벤트를 고정 크기 링 버퍼에 보관하는 슬라이딩 윈도우.
+
+    Args:
+        capacity (int): 보관할 최대 이벤트 수, 가득 차면 가장 오래된 이벤트를 덮어씀
+    """
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def push(self, event_time, value):
+        self.times[self.head] = event_time
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def view(self, start, end):
+        """
+        start < 시각 <= end 인 이벤트의 (times, values) 를 반환합니다.
+        """
+        times = self.times[:self.count]
+        mask = (times > start) & (times <= end)
+        return times[mask], self.values[:self.count][mask]
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+
 class DangerDecision:
-    def __init__(self):
+    """
+    심박, 음성(dB), 카메라 위험 신호를 이벤트 시각 기준으로 융합하는 위험 판단 엔진.
+
+    출처별로 최근 window 초 동안의 이벤트를 링 버퍼에 보관하고, 어느 출처의 이벤트가 들어오든
+    (그리고 타이머로 tick() 이 호출될 때마다) 즉시 평가합니다. 평가 시각은 지금까지 받은 가장 늦은
+    이벤트 시각(워터마크)이므로, 같은 이벤트 순서를 다시 넣으면 항상 같은 결과가 나옵니다.
+
+    출처별 점수는 윈도우 안의 위험 이벤트 중 감쇠 적용 후 가장 큰 값이며,
+    가중합이 threshold 이상이면 위험으로 판단하고 모든 윈도우를 초기화합니다.
+
+    Args:
+        window (float): 이벤트 유효 시간(초)
+        weights (dict): 출처별 가중치, 기본값은 모두 1/3
+        threshold (float): 위험 판단 기준 점수
+        decay (str): 'none', 'linear', 'exponential' 중 하나. 이벤트 경과 시간에 따른 점수 감쇠
+        half_life (float): 'exponential' 감쇠의 반감기(초)
+        capacity (int): 출처별 링 버퍼 크기
+        max_skew (float): 이벤트 시각과 수신 시각 차이 허용치(초), 넘으면 수신 시각을 사용.
+            시계가 앞선 클라이언트가 워터마크를 당겨도 뒤처진 클라이언트의 이벤트가 윈도우 안에 들도록
+            window 의 절반보다 작아야 하며, None 이면 window / 4
+    """
+    DECAYS = ("none", "linear", "exponential")
+
+    def __init__(self, window=5.0, weights=None, threshold=0.9, decay="none",
+                 half_life=2.0, capacity=64, max_skew=None):
+        assert decay in self.DECAYS, "decay should be one of {}".format(self.DECAYS)
+        if max_skew is None:
+            max_skew = window / 4
+        assert 2 * max_skew < window, "max_skew should be less than window / 2"
+        self.window = window
+        self.weights = weights or {source: 1 / 3 for source in SOURCES}
+        self.threshold = threshold
+        self.decay = decay
+        self.half_life = half_life
+        self.max_skew = max_skew
+        self.windows = {source: EventWindow(capacity) for source in SOURCES}
+
+        # 지금까지 받은 가장 늦은 이벤트 시각, 마지막 위험 판단 시각
+        self.watermark = 0.0
+        self.reset_time = 0.0
+
+        # 평가 지연 시간(ms) 및 통계
+        self.latencies = deque(maxlen=256)
+        self.evaluations = 0
+        self.fired = 0
+        self.late_events = 0
+
+    def _decay_factor(self, age):
+        if self.decay == "linear":
+            return np.clip(1.0 - age / self.window, 0.0, 1.0)
+        if self.decay == "exponential":
+            return np.power(0.5, age / self.half_life)
+        return np.ones_like(age)
+
+    def _event_time(self, event_time, now):
+        if now is None:
+            now = time.time()
+        event_time = to_epoch_seconds(event_time, now)
+        # 시계가 크게 어긋난 클라이언트의 이벤트는 수신 시각으로 대체
+        if abs(event_time - now) > self.max_skew:
+            event_time = now
+        return event_time
+
+    def ingest(self, source, flag, event_time=None, now=None):
         """
-        DangerDecision 클래스 초기화 및 카메라 소켓 설정.
+        이벤트 하나를 넣고 즉시 평가합니다. 위험이 감지되면 True 를 반환합니다.
+
+        Args:
+            source (str): 'pulse', 'db', 'camera' 중 하나
+            flag (bool): 위험 신호 여부
+            event_time: 클라이언트가 보낸 이벤트 시각, None 이면 수신 시각
+            now (float): 수신 시각(epoch 초), 로그 재생 시에는 이벤트 시각을 넘김
         """
-        
-        # 트리거와 타임스탬프 변수 초기화
-        self.pulse_flag_trigger = False
-        self.db_flag_trigger = False
-        self.camera_flag_trigger = False
-        self.pulse_flag_time = 0
-        self.db_flag_time = 0
-        self.camera_flag_time = 0
+        assert source in self.windows, "source should be one of {}".format(SOURCES)
+        event_time = self._event_time(event_time, now)
+        if event_time <= max(self.reset_time, self.watermark - self.window):
+            # 이미 윈도우를 벗어났거나 마지막 위험 판단 이전의 이벤트
+            self.late_events += 1
+            return False
 
-        # 타임아웃 설정 (5초)
-        self.trigger_timeout = 5
+        self.windows[source].push(event_time, 1.0 if flag else 0.0)
+        if flag:
+            print(f"[트리거 설정] {source} 트리거가 발동되었습니다.")
+        self.watermark = max(self.watermark, event_time)
+        return self.evaluate(self.watermark)
+
+    def tick(self, now=None):
+        """
+        타이머에서 주기적으로 호출합니다. 워터마크를 현재 시각까지 진행시키고 평가합니다.
+        """
+        if now is None:
+            now = time.time()
+        self.watermark = max(self.watermark, now)
+        return self.evaluate(self.watermark)
 
-    def set_pulse_flag_trigger(self, pulse_flag):
+    def scores(self, at):
+        """
+        시각 at 에서의 출처별 점수를 반환합니다.
+        """
+        start = max(at - self.window, self.reset_time)
+        scores = {}
+        for source, window in self.windows.items():
+            times, values = window.view(start, at)
+            if len(values) == 0:
+                scores[source] = 0.0
+                continue
+            scores[source] = float(np.max(values * self._decay_factor(at - times)))
+        return scores
+
+    def evaluate(self, at):
+        """
+        시각 at 에서 가중합 점수를 계산하고, 기준을 넘으면 윈도우를 초기화한 뒤 True 를 반환합니다.
+        """
+        start = time.perf_counter()
+        scores = self.scores(at)
+        total = sum(self.weights.get(source, 0.0) * score for source, score in scores.items())
+        danger = total >= self.threshold - 1e-9
+        if danger:
+            print(f"[경고] 조건이 충족되었습니다. 점수: {total:.3f} {scores}")
+            self.fired += 1
+            self.reset_time = at
+            self.reset_triggers()
+        self.evaluations += 1
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        return danger
+
+    def replay(self, events):
+        """
+        로그에 기록된 (source, flag, event_time) 이벤트를 순서대로 다시 넣고 위험 판단 시각 목록을 반환합니다.
+        """
+        fired = []
+        for source, flag, event_time in events:
+            event_time = to_epoch_seconds(event_time)
+            if self.ingest(source, flag, event_time, now=event_time):
+                fired.append(self.watermark)
+        return fired
+
+    def set_pulse_flag_trigger(self, pulse_flag, event_time=None):
         """
         심박 급등 시그널을 설정합니다.
         """
-        current_time = time.time()
-        if self.pulse_flag_trigger and current_time - self.pulse_flag_time > self.trigger_timeout:
-            self.pulse_flag_trigger = pulse_flag
-            self.pulse_flag_time = current_time
-            print("[트리거 재설정] sendPulseFlag 트리거가 재설정되었습니다.")
-        elif pulse_flag:
-            self.pulse_flag_trigger = True
-            self.pulse_flag_time = current_time
-            print("[트리거 설정] sendPulseFlag 트리거가 발동되었습니다.")
+        return self.ingest("pulse", pulse_flag, event_time)
 
-    def set_db_flag_trigger(self, db_flag):
+    def set_db_flag_trigger(self, db_flag, event_time=None):
         """
         음성 위험 신호를 설정합니다.
         """
-        current_time = time.time()
-        if self.db_flag_trigger and current_time - self.db_flag_time > self.trigger_timeout:
-            self.db_flag_trigger = db_flag
-            self.db_flag_time = current_time
-            print("[트리거 재설정] sendDbFlag 트리거가 재설정되었습니다.")
-        elif db_flag:
-            self.db_flag_trigger = True
-            self.db_flag_time = current_time
-            print("[트리거 설정] sendDbFlag 트리거가 발동되었습니다.")
+        return self.ingest("db", db_flag, event_time)
 
-    def set_camera_flag_trigger(self, camera_flag):
+    def set_camera_flag_trigger(self, camera_flag, event_time=None):
         """
         카메라에서 감지된 위험 신호를 설정합니다.
         """
-        current_time = time.time()
-        if self.camera_flag_trigger and current_time - self.camera_flag_time > self.trigger_timeout:
-            self.camera_flag_trigger = camera_flag
-            self.camera_flag_time = current_time
-            print("[트리거 재설정] sendCameraFlag 트리거가 재설정되었습니다.")
-        elif camera_flag:
-            self.camera_flag_trigger = True
-            self.camera_flag_time = current_time
-            
+        return self.ingest("camera", camera_flag, event_time)
+
     def check_condition(self):
         """
-        각 트리거를 기반으로 위험 상황 조건을 검사하고, 위험이 감지되면 True를 반환합니다.
+        현재 워터마크 기준으로 위험 상황 조건을 검사하고, 위험이 감지되면 True를 반환합니다.
         """
-        pulse_weight = 1/3
-        db_weight = 1/3
-        camera_weight = 1/3
-
-        active_triggers = (self.pulse_flag_trigger * pulse_weight +
-                           self.db_flag_trigger * db_weight +
-                           self.camera_flag_trigger * camera_weight)
-
-        print(f"[경고] 조건 체크 결과: {active_triggers}")
-        if active_triggers >= 0.9:
-            print("[경고] 조건이 충족되었습니다. 위험 상황 처리 로직을 수행합니다.")
-            self.reset_triggers()
-            return True
-        return False
+        return self.evaluate(self.watermark)
 
     def reset_triggers(self):
         """
-        모든 트리거를 False로 초기화하여 다시 대기 상태로 전환합니다.
+        모든 윈도우를 비워 다시 대기 상태로 전환합니다.
         """
-        self.pulse_flag_trigger = False
-        self.db_flag_trigger = False
-        self.camera_flag_trigger = False
+        for window in self.windows.values():
+            window.clear()
         print("[트리거 초기화] 모든 트리거가 초기화되었습니다.")
+
+    def stats(self):
+        latencies = np.asarray(self.latencies)
+        return {
+            "evaluations": self.evaluations,
+            "fired": self.fired,
+            "late_events": self.late_events,
+            "latency_ms_mean": float(latencies.mean()) if len(latencies) else 0.0,
+            "latency_ms_max": float(latencies.max()) if len(latencies) else 0.0
+        }
@@ -0,0 +1,128 @@
+import math
+
+import numpy as np
+
+# WGS84 장반경 (m)
+EARTH_RADIUS = 6378137.0
+
+
+class GeoKalmanFilter:
+    """
+    위경도 측정값을 로컬 ENU(동, 북) 미터 좌표에서 보정하는 등속 칼만 필터.
+
+    첫 측정 위치를 원점으로 하는 접평면에 투영한 뒤, 동/북 축을 각각 [위치, 속도] 2차원 상태로 두고
+    메시지 간 실제 시간 간격 dt 로 예측합니다. 두 축은 서로 독립이므로 4x4 행렬 연산 대신
+    축별 2x2 닫힌 형태 식을 미리 할당한 배열에서 두 축 동시에 계산합니다.
+
+    Args:
+        meas_std (float): GPS 측정 잡음 표준편차 (m)
+        accel_std (float): 가속도 과정 잡음 표준편차 (m/s^2)
+        init_vel_std (float): 초기 속도 불확실성 표준편차 (m/s)
+        max_gap (float): 이 시간(초)보다 오래 측정이 없으면 측정 위치에서 다시 초기화
+        min_dt (float): 같은 시각으로 들어온 측정에 사용할 최소 시간 간격(초)
+    """
+    def __init__(self, meas_std=5.0, accel_std=1.0, init_vel_std=10.0,
+                 max_gap=30.0, min_dt=1e-3):
+        self.params = dict(meas_std=meas_std, accel_std=accel_std, init_vel_std=init_vel_std,
+                           max_gap=max_gap, min_dt=min_dt)
+        self.r = meas_std ** 2
+        self.q = accel_std ** 2
+        self.init_vel_var = init_vel_std ** 2
+        self.max_gap = max_gap
+        self.min_dt = min_dt
+
+        # 축(동, 북)별 상태 [위치, 속도] 와 공분산 [[P00, P01], [P01, P11]]
+        self.pos = np.zeros(2)
+        self.vel = np.zeros(2)
+        self.p00 = np.zeros(2)
+        self.p01 = np.zeros(2)
+        self.p11 = np.zeros(2)
+        self._gain = np.zeros((2, 2))
+        self._innov = np.zeros(2)
+
+        self.origin = None
+        self.last_time = None
+
+    @property
+    def initialized(self):
+        return self.origin is not None
+
+    def set_origin(self, lat, lng):
+        self.origin = (lat, lng)
+        self._m_per_deg_lat = math.radians(1.0) * EARTH_RADIUS
+        self._m_per_deg_lng = self._m_per_deg_lat * math.cos(math.radians(lat))
+
+    def to_enu(self, lat, lng):
+        return ((lng - self.origin[1]) * self._m_per_deg_lng,
+                (lat - self.origin[0]) * self._m_per_deg_lat)
+
+    def to_geodetic(self, east, north):
+        return (self.origin[0] + north / self._m_per_deg_lat,
+                self.origin[1] + east / self._m_per_deg_lng)
+
+    def reset(self, east, north, timestamp):
+        self.pos[:] = (east, north)
+        self.vel[:] = 0.0
+        self.p00[:] = self.r
+        self.p01[:] = 0.0
+        self.p11[:] = self.init_vel_var
+        self.last_time = timestamp
+
+    def predict(self, dt):
+        """
+        등속 모델로 dt 초 후의 상태를 예측합니다. 과정 잡음은 백색 가속도 모델을 사용합니다.
+        """
+        dt2 = dt * dt
+        self.pos += self.vel * dt
+        # P = F P F^T + Q
+        self.p00 += 2 * dt * self.p01 + dt2 * self.p11 + self.q * dt2 * dt / 3
+        self.p01 += dt * self.p11 + self.q * dt2 / 2
+        self.p11 += self.q * dt
+
+    def correct(self, east, north):
+        self._innov[0] = east - self.pos[0]
+        self._innov[1] = north - self.pos[1]
+        s = self.p00 + self.r
+        np.divide(self.p00, s, out=self._gain[0])
+        np.divide(self.p01, s, out=self._gain[1])
+        self.pos += self._gain[0] * self._innov
+        self.vel += self._gain[1] * self._innov
+        # P = (I - K H) P
+        k0, k1 = self._gain
+        self.p11 -= k1 * self.p01
+        self.p01 -= k1 * self.p00
+        self.p00 -= k0 * self.p00
+
+    def update(self, lat, lng, timestamp):
+        """
+        측정값 하나를 반영하고 (보정 위도, 보정 경도, 북쪽 속도 m/s, 동쪽 속도 m/s) 를 반환합니다.
+
+        Args:
+            lat (float): 측정 위도
+            lng (float): 측정 경도
+            timestamp (float): 측정 시각 (epoch 초)
+        """
+        if not self.initialized:
+            self.set_origin(lat, lng)
+        east, north = self.to_enu(lat, lng)
+        if self.last_time is None or timestamp - self.last_time > self.max_gap:
+            self.reset(east, north, timestamp)
+        else:
+            self.predict(max(timestamp - self.last_time, self.min_dt))
+            self.correct(east, north)
+            self.last_time = max(timestamp, self.last_time)
+        lat, lng = self.to_geodetic(self.pos[0], self.pos[1])
+        return lat, lng, float(self.vel[1]), float(self.vel[0])
+
+    def filter_track(self, times, lats, lngs):
+        """
+        기록된 경로 전체를 새 필터 상태로 다시 보정합니다.
+
+        Returns:
+            ndarray: (N, 4) [위도, 경도, 북쪽 속도, 동쪽 속도]
+        """
+        track = GeoKalmanFilter(**self.params)
+        out = np.empty((len(times), 4))
+        for i, (t, lat, lng) in enumerate(zip(times, lats, lngs)):
+            out[i] = track.update(float(lat), float(lng), float(t))
+        return out
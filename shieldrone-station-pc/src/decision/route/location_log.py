@@ -0,0 +1,184 @@
+import os
+import atexit
+import struct
+import threading
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+# 위치 로그 레코드 (바이너리 포맷의 컬럼 순서와 동일)
+LOG_DTYPE = np.dtype([
+    ("time", "<f8"),       # epoch 초
+    ("raw_lat", "<f8"),
+    ("raw_lng", "<f8"),
+    ("lat", "<f8"),        # 필터 보정 위치
+    ("lng", "<f8"),
+    ("v_north", "<f4"),    # 필터 추정 속도
+    ("v_east", "<f4"),
+])
+
+# 바이너리 청크 헤더: magic, 레코드 수
+CHUNK_MAGIC = b"LOC1"
+CHUNK_HEADER = struct.Struct("<4sI")
+
+
+def encode_chunk(records):
+    """
+    레코드 배열을 컬럼 단위로 이어 붙인 바이너리 청크로 변환합니다.
+    """
+    body = b"".join(np.ascontiguousarray(records[name]).tobytes() for name in LOG_DTYPE.names)
+    return CHUNK_HEADER.pack(CHUNK_MAGIC, len(records)) + body
+
+
+def read_location_log(path):
+    """
+    바이너리 위치 로그 파일을 읽어 LOG_DTYPE 레코드 배열로 반환합니다.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    chunks = []
+    offset = 0
+    while offset + CHUNK_HEADER.size <= len(data):
+        magic, count = CHUNK_HEADER.unpack_from(data, offset)
+        if magic != CHUNK_MAGIC:
+            raise ValueError(f"잘못된 청크 헤더: offset={offset}")
+        offset += CHUNK_HEADER.size
+        chunk = np.empty(count, dtype=LOG_DTYPE)
+        for name in LOG_DTYPE.names:
+            column = LOG_DTYPE[name]
+            size = column.itemsize * count
+            chunk[name] = np.frombuffer(data, dtype=column, count=count, offset=offset)
+            offset += size
+        chunks.append(chunk)
+    if not chunks:
+        return np.empty(0, dtype=LOG_DTYPE)
+    return np.concatenate(chunks)
+
+
+class LocationLogWriter:
+    """
+    위치 로그를 백그라운드 스레드에서 모아서 기록하는 로거.
+
+    write() 는 레코드를 메모리 버퍼에 넣기만 하므로 위치 갱신 경로에서 디스크 I/O 가 발생하지 않습니다.
+    버퍼가 flush_size 개 이상 쌓이거나 flush_interval 초가 지나면 한 번에 기록하고,
+    파일이 max_bytes 를 넘으면 path.1, path.2 ... 로 밀어내며 backup_count 개까지 보관합니다.
+
+    Args:
+        directory (str): 로그 디렉터리
+        fmt (str): 'csv' 는 기존 user/filtered CSV 두 파일, 'binary' 는 컬럼 단위 바이너리 파일 하나
+        flush_size (int): 한 번에 기록할 레코드 수
+        flush_interval (float): 최대 기록 지연 시간(초)
+        max_bytes (int): 로그 파일 최대 크기, 0 이면 로테이션하지 않음
+        backup_count (int): 보관할 이전 로그 파일 수
+        max_pending (int): 기록 대기 가능한 최대 레코드 수, 넘으면 가장 오래된 레코드를 버림
+        prefix (str): 로그 파일 이름 앞에 붙일 문자열 (세션별 로그 구분)
+    """
+    FORMATS = ("csv", "binary")
+
+    def __init__(self, directory, fmt="csv", flush_size=32, flush_interval=1.0,
+                 max_bytes=10 * 1024 * 1024, backup_count=5, max_pending=4096,
+                 prefix=""):
+        assert fmt in self.FORMATS, "fmt should be one of {}".format(self.FORMATS)
+        self.fmt = fmt
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        if fmt == "csv":
+            self.path_origin = os.path.join(directory, prefix + "user_location_log.csv")
+            self.path_filtered = os.path.join(directory, prefix + "filtered_location_log.csv")
+        else:
+            self.path_binary = os.path.join(directory, prefix + "location_log.bin")
+
+        self._buffer = deque(maxlen=max_pending)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.written = 0
+        self.flushes = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, timestamp, raw_lat, raw_lng, lat, lng, v_north=0.0, v_east=0.0):
+        """
+        레코드 하나를 버퍼에 추가합니다. timestamp 는 epoch 초입니다.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append((timestamp, raw_lat, raw_lng, lat, lng, v_north, v_east))
+            if len(self._buffer) >= self.flush_size:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._buffer) >= self.flush_size or self._closed,
+                    self.flush_interval)
+                batch = list(self._buffer)
+                self._buffer.clear()
+                closed = self._closed
+            if batch:
+                try:
+                    self._flush(np.array(batch, dtype=LOG_DTYPE))
+                except OSError as e:
+                    print(f"[위치 로그] 기록 실패: {e}")
+            if closed:
+                return
+
+    def _flush(self, records):
+        if self.fmt == "csv":
+            times = [datetime.fromtimestamp(t).isoformat() for t in records["time"]]
+            self._append(self.path_origin, "".join(
+                f"{t},\"{lat}, {lng}\"\n"
+                for t, lat, lng in zip(times, records["raw_lat"], records["raw_lng"])).encode())
+            self._append(self.path_filtered, "".join(
+                f"{t},\"{lat}, {lng}\"\n"
+                for t, lat, lng in zip(times, records["lat"], records["lng"])).encode())
+        else:
+            self._append(self.path_binary, encode_chunk(records))
+        self.written += len(records)
+        self.flushes += 1
+
+    def _append(self, path, data):
+        if self.max_bytes and os.path.exists(path) and \
+                os.path.getsize(path) + len(data) > self.max_bytes:
+            self._rotate(path)
+        with open(path, mode="ab") as file:
+            file.write(data)
+
+    def _rotate(self, path):
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+
+    def close(self, timeout=5):
+        """
+        남은 레코드를 모두 기록하고 스레드를 종료합니다.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        atexit.unregister(self.close)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._buffer),
+                "written": self.written,
+                "flushes": self.flushes,
+                "dropped": self.dropped
+            }
@@ -1,27 +1,31 @@
 import os
 import json
-import socket
-import csv
 import re
 import time
-import numpy as np
-from datetime import datetime
-from filterpy.kalman import KalmanFilter
+
+from decision.danger.danger_decision import to_epoch_seconds
+from decision.route.geo_kalman import GeoKalmanFilter
+from decision.route.location_log import LocationLogWriter
+from decision.route.route_sender import shared_route_sender
 
 class RouteDecision:
-    def __init__(self):
+    def __init__(self, session_id=None):
         """
         RouteDecision 클래스 초기화 및 ZeroMQ 소켓 설정.
         각 트리거 신호를 저장할 변수를 초기화.
+        session_id 가 있으면 위치 로그 파일 이름 앞에 붙여 세션별로 기록.
         """
+        self.session_id = session_id
         config_path = os.path.join(os.path.dirname(__file__), "../../config.json")
         with open(config_path, "r") as config_file:
             config = json.load(config_file)
 
-        # UDP 소켓 설정
-        self.sender_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # UDP 송신 설정 (connect 된 소켓, 전송 간격 안의 위치는 최신 위치 하나로 합쳐 전송)
+        # 앱은 순번 기준이 하나이므로 모든 세션이 송신기와 순번을 공유
         self.target_host = config["APPSERVER_HOST"]
         self.target_port = config["APPSERVER_PORT"]
+        self.sender = shared_route_sender(self.target_host, self.target_port,
+                                          max_rate=config.get("ROUTE_MAX_RATE", 1.0))
 
         # 위치 정보 초기화
         self.lat = 0.0
@@ -29,66 +33,48 @@ class RouteDecision:
         self.dest_lat = 0.0
         self.dest_lng = 0.0
         self.last_processed_time = None
-        self.file_path_filtered = os.path.join(os.path.dirname(__file__), "filtered_location_log.csv")
-        self.file_path_origin = os.path.join(os.path.dirname(__file__), "user_location_log.csv")
 
-        # 칼만 필터 설정
-        self.kf = KalmanFilter(dim_x=4, dim_z=2)
-        dt = 1.0
-        self.kf.F = np.array([[1, dt, 0,  0],
-                              [0,  1, 0,  0],
-                              [0,  0, 1, dt],
-                              [0,  0, 0,  1]])
-        self.kf.H = np.array([[1, 0, 0, 0],
-                              [0, 0, 1, 0]])
-        
-        # 공분산 및 노이즈 설정
-        self.kf.P *= 1000.0
-        self.kf.R = np.array([[5, 0], [0, 5]])
-        self.kf.Q = np.eye(4) * 0.1
+        # 위치 로그는 백그라운드 스레드에서 모아서 기록
+        log_config = config.get("LOCATION_LOG", {})
+        self.location_log = LocationLogWriter(
+            log_config.get("directory", os.path.dirname(__file__)),
+            fmt=log_config.get("format", "csv"),
+            flush_size=log_config.get("flush_size", 32),
+            flush_interval=log_config.get("flush_interval", 1.0),
+            max_bytes=log_config.get("max_bytes", 10 * 1024 * 1024),
+            backup_count=log_config.get("backup_count", 5),
+            prefix=re.sub(r"[^\w.-]", "_", f"{session_id}_") if session_id else "")
 
-        # 초기값 설정 여부를 추적하는 플래그
-        self.initialized = False
+        # 칼만 필터 설정 (로컬 ENU 미터 좌표, 메시지 간 실제 시간 간격 사용)
+        self.kf = GeoKalmanFilter(meas_std=5.0, accel_std=1.0)
 
     def send_initial_trigger(self):
         """
         최초 소켓 연결시, 앱서버에 startFlag 전송
         """
-        data = {
-            "start_flag" : True
-        }
-        message = json.dumps(data)
-        self.sender_socket.sendto(message.encode('utf-8'), (self.target_host, self.target_port))  
+        self.sender.send_start()
         print("[시작 플래그] 앱서버에 이륙 신호를 전딜했습니다.")
 
-    def handle_position_update(self, lat, lng, dest_lat, dest_lng):
+    def handle_position_update(self, lat, lng, dest_lat, dest_lng, timestamp=None):
         """
-        위치 정보를 업데이트 하기 전, 첫 위치를 초기값으로 설정하고 이후에는 칼만 필터(보정) 적용
+        위치 정보를 업데이트 하기 전, 첫 위치를 초기값으로 설정하고 이후에는 칼만 필터(보정) 적용.
+        timestamp 는 클라이언트가 보낸 측정 시각이며, 없으면 수신 시각을 사용
         """
-        if not self.initialized:
-            # 첫 번째 위치 업데이트 시 초기 상태 설정
-            self.kf.x = np.array([float(lat), 0, float(lng), 0])  # 초기 위치 설정
-            self.initialized = True
+        timestamp = to_epoch_seconds(timestamp, time.time())
+        self.last_processed_time = timestamp
+        initialized = self.kf.initialized
+        filtered_lat, filtered_lng, v_north, v_east = self.kf.update(float(lat), float(lng), timestamp)
+        if not initialized:
             print(f"[초기화] 초기 위치 설정됨: lat={lat}, lng={lng}")
         else:
-            # 이후 위치 업데이트 시 칼만 필터로 보정 수행
-            self.kf.predict()
-            self.kf.update([float(lat), float(lng)])
-            print(f"[보정] 측정값 lat={lat}, lng={lng} -> 보정값 lat={self.kf.x[0]}, lng={self.kf.x[2]}")
+            print(f"[보정] 측정값 lat={lat}, lng={lng} -> 보정값 lat={filtered_lat}, lng={filtered_lng}")
 
-        with open(self.file_path_origin, mode="a") as file:
-            file.write(f"{datetime.now().isoformat()},\"{self.lat}, {self.lng}\"\n")
-            file.flush()
-        
         # 필터링된 위치로 위치 업데이트
-        filtered_lat = self.kf.x[0]
-        filtered_lng = self.kf.x[2]
         self.dest_lat = dest_lat
         self.dest_lng = dest_lng
 
-        with open(self.file_path_filtered, mode="a") as file:
-            file.write(f"{datetime.now().isoformat()},\"{filtered_lat}, {filtered_lng}\"\n")
-            file.flush()
+        self.location_log.write(timestamp, float(lat), float(lng), filtered_lat, filtered_lng,
+                                v_north, v_east)
 
         self.set_position({"lat": filtered_lat, "lng": filtered_lng})
 
@@ -106,18 +92,13 @@ class RouteDecision:
 
     def send_data(self):
         """
-        현재 위치 정보를 UDP 소켓을 통해 앱서버로 전송.
+        현재 위치 정보를 UDP 로 앱서버에 전송 요청. 실제 전송은 RouteSender 가 전송 간격에 맞춰 수행.
+        """
+        self.sender.send_route(self.lat, self.lng, self.dest_lat, self.dest_lng,
+                               self.last_processed_time, key=self.session_id)
+
+    def close(self):
+        """
+        남은 위치 로그를 기록함. 송신기는 다른 세션과 공유하므로 닫지 않고, 남은 위치는 그대로 전송됨.
         """
-        location_data = {
-            "location" : {
-                "lat": self.lat,
-                "lng": self.lng
-            },
-            "dest_location" : {
-                "lat": self.dest_lat,
-                "lng": self.dest_lng
-            },
-        }
-        message = json.dumps(location_data)
-        self.sender_socket.sendto(message.encode('utf-8'), (self.target_host, self.target_port))
-        print(f"[데이터 전송] 위치 정보가 앱서버로 전송되었습니다.")
+        self.location_log.close()
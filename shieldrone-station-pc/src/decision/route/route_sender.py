@@ -0,0 +1,146 @@
+import random
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from protocol.route_packet import MSG_ROUTE, MSG_START, build_route_packet
+
+
+class RouteSender:
+    """
+    경로 패킷을 UDP 로 스테이션 앱에 보내는 송신 단계.
+
+    소켓은 대상 주소에 connect 해 두고 고정 길이 바이너리 패킷(protocol.route_packet)을 보냅니다.
+    send_route() 는 최신 위치만 남겨 두고 바로 반환하며, 전송은 전용 스레드가 max_rate 이하로 수행하므로
+    전송 간격 안에 들어온 중간 위치는 마지막 위치 하나로 합쳐집니다.
+
+    순번은 송신기마다 0 부터 시작하므로 임의의 epoch(부팅 id)를 함께 보내, 스테이션 PC 가 다시 시작되면
+    앱이 이전 순번 기준을 버리도록 합니다.
+
+    스테이션 앱은 수신 순번 기준을 하나만 가지므로 같은 앱으로 보내는 세션들은 shared_route_sender() 로
+    송신기 하나와 순번 하나를 공유합니다. 위치 합치기와 전송 간격은 send_route() 의 key(세션)별로 적용됩니다.
+
+    Args:
+        host (str): 스테이션 앱 주소
+        port (int): 스테이션 앱 UDP 포트
+        max_rate (float): 초당 최대 위치 패킷 수, 0 이면 제한하지 않음
+    """
+    def __init__(self, host, port, max_rate=1.0):
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.connect((host, port))
+
+        self._cond = threading.Condition()
+        # key 별 아직 전송되지 않은 최신 위치 (먼저 요청된 key 부터 전송)
+        self._pending = OrderedDict()
+        self._closed = False
+        self.epoch = random.getrandbits(32)
+        self._seq = 0
+        self._last_send = {}
+        self.counters = {
+            "sent": 0,
+            "coalesced": 0,
+            "errors": 0
+        }
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _next_seq(self):
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        return self._seq
+
+    def _send(self, packet):
+        try:
+            self.socket.send(packet)
+            self.counters["sent"] += 1
+        except OSError as e:
+            # connect 된 UDP 소켓은 이전 패킷의 ICMP 오류를 다음 send 에서 보고함
+            self.counters["errors"] += 1
+            print(f"[데이터 전송] 경로 패킷 전송 실패: {e}")
+
+    def send_start(self):
+        """
+        이륙 신호 패킷을 바로 전송합니다.
+        """
+        with self._cond:
+            packet = build_route_packet(MSG_START, self.epoch, self._next_seq(), time.time())
+            self._send(packet)
+
+    def send_route(self, lat, lng, dest_lat, dest_lng, timestamp=None, key=None):
+        """
+        위치 패킷 전송을 요청합니다. 같은 key 로 아직 전송되지 않은 위치가 있으면 새 위치로 교체합니다.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            if key in self._pending:
+                self.counters["coalesced"] += 1
+            self._pending[key] = (timestamp or time.time(), lat, lng, dest_lat, dest_lng)
+            self._cond.notify()
+
+    def _next_ready(self, now):
+        """
+        전송 간격이 지난 key 와 다음 key 가 준비될 때까지 남은 시간을 반환합니다.
+        """
+        wait = None
+        for key in self._pending:
+            remain = self._last_send.get(key, -self.min_interval) + self.min_interval - now
+            if remain <= 0 or self._closed:
+                return key, 0
+            wait = remain if wait is None else min(wait, remain)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed and not self._pending:
+                    return
+                now = time.monotonic()
+                key, wait = self._next_ready(now)
+                if key is None:
+                    # 전송 간격이 지날 때까지 기다리며 그 사이 들어온 위치는 합침
+                    self._cond.wait(wait)
+                    continue
+                timestamp, lat, lng, dest_lat, dest_lng = self._pending.pop(key)
+                packet = build_route_packet(MSG_ROUTE, self.epoch, self._next_seq(),
+                                            timestamp, lat, lng, dest_lat, dest_lng)
+                self._send(packet)
+                # 전송 간격이 지난 key 는 더 기억할 필요가 없음
+                self._last_send = {k: t for k, t in self._last_send.items()
+                                   if t + self.min_interval > now}
+                self._last_send[key] = now
+
+    def close(self, timeout=2):
+        """
+        남은 위치를 전송한 뒤 스레드를 종료하고 소켓을 닫습니다.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self.socket.close()
+
+    def stats(self):
+        with self._cond:
+            return dict(self.counters, pending=len(self._pending))
+
+
+_shared_senders = {}
+_shared_lock = threading.Lock()
+
+
+def shared_route_sender(host, port, max_rate=1.0):
+    """
+    대상 주소별로 하나만 만들어지는 RouteSender 를 반환합니다.
+    여러 세션이 같은 스테이션 앱에 보내도 순번이 하나로 이어지도록 세션들이 이 송신기를 공유합니다.
+    """
+    with _shared_lock:
+        sender = _shared_senders.get((host, port))
+        if sender is None or sender._closed:
+            sender = RouteSender(host, port, max_rate=max_rate)
+            _shared_senders[(host, port)] = sender
+        return sender
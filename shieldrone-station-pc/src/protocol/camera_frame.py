@@ -0,0 +1,98 @@
+"""
+파이프라인(pipeline.py)이 5580 채널로 보내고 서버(server.py)가 받는 카메라 위험 프레임 메시지 형식.
+
+메시지는 두 프레임으로 된 ZMQ multipart 메시지입니다.
+    [0] 헤더 (HEADER, 네트워크 바이트 순서)
+        magic       2s  b'SC'
+        version     B   스키마 버전
+        msg_type    B   메시지 종류 (MSG_CAMERA_FLAG)
+        flags       H   FLAG_WARNING 등 비트 플래그
+        seq         I   송신 순번
+        timestamp   d   프레임 시각 (epoch 초)
+        drone_id    H   프레임을 보낸 드론(카메라) 번호 (버전 2부터)
+    [1] JPEG 바이트 (base64 인코딩 없음)
+
+헤더 형식이 바뀌면 VERSION 을 올리고, 수신 측은 SUPPORTED_VERSIONS 에 있는 버전만 해석합니다.
+"""
+import struct
+from datetime import datetime
+
+MAGIC = b'SC'
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+HEADER = struct.Struct('!2sBBHIdH')
+HEADER_V1 = struct.Struct('!2sBBHId')
+
+# 메시지 종류
+MSG_CAMERA_FLAG = 1
+MESSAGE_TYPES = {
+    MSG_CAMERA_FLAG: "sendCameraFlag",
+}
+
+# 플래그
+FLAG_WARNING = 0x01
+
+
+def build_camera_frame(jpeg, timestamp=None, warning=True, seq=0, drone_id=0):
+    """
+    카메라 위험 프레임 multipart 메시지를 만듭니다.
+
+    Args:
+        jpeg: JPEG 바이트 (bytes 또는 cv2.imencode 결과 같은 버퍼 객체, 복사하지 않음)
+        timestamp (datetime | float): 프레임 시각, None 이면 현재 시각
+        warning (bool): 위험 플래그
+        seq (int): 송신 순번
+        drone_id (int): 드론(카메라) 번호, 서버가 해당 드론에 연결된 세션으로 전달
+
+    Returns:
+        list: [헤더 bytes, jpeg], send_multipart(..., copy=False) 로 전송
+    """
+    if timestamp is None:
+        timestamp = datetime.now()
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.timestamp()
+    flags = FLAG_WARNING if warning else 0
+    header = HEADER.pack(MAGIC, VERSION, MSG_CAMERA_FLAG, flags,
+                         seq & 0xFFFFFFFF, float(timestamp), drone_id & 0xFFFF)
+    return [header, jpeg]
+
+
+def parse_camera_frame(frames):
+    """
+    수신한 multipart 메시지를 해석합니다.
+
+    Args:
+        frames (list): recv_multipart 결과 (bytes 또는 zmq.Frame)
+
+    Returns:
+        dict: {"type", "version", "seq", "time", "warningFlag", "droneId", "frame"}, "frame" 은 JPEG bytes
+
+    Raises:
+        ValueError: 형식이 맞지 않거나 지원하지 않는 버전인 경우
+    """
+    if len(frames) != 2:
+        raise ValueError("카메라 프레임 메시지는 2개의 프레임이어야 합니다: {}".format(
+            len(frames)))
+    header, payload = [getattr(f, "bytes", f) for f in frames]
+    if len(header) == HEADER.size:
+        magic, version, msg_type, flags, seq, timestamp, drone_id = HEADER.unpack(header)
+    elif len(header) == HEADER_V1.size:
+        magic, version, msg_type, flags, seq, timestamp = HEADER_V1.unpack(header)
+        drone_id = 0
+    else:
+        raise ValueError("헤더 크기가 잘못되었습니다: {}".format(len(header)))
+    if magic != MAGIC:
+        raise ValueError("알 수 없는 메시지입니다: {!r}".format(magic))
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError("지원하지 않는 메시지 버전입니다: {}".format(version))
+    if msg_type not in MESSAGE_TYPES:
+        raise ValueError("알 수 없는 메시지 종류입니다: {}".format(msg_type))
+    return {
+        "type": MESSAGE_TYPES[msg_type],
+        "version": version,
+        "seq": seq,
+        "time": datetime.fromtimestamp(timestamp),
+        "warningFlag": bool(flags & FLAG_WARNING),
+        "droneId": drone_id,
+        "frame": payload
+    }
@@ -0,0 +1,91 @@
+"""
+경로 판단(RouteDecision)이 UDP 로 스테이션 앱(RouteController)에 보내는 경로 패킷 형식.
+
+패킷은 고정 길이 바이너리 하나입니다 (PACKET, 네트워크 바이트 순서).
+    magic       2s  b'SR'
+    version     B   스키마 버전
+    msg_type    B   MSG_START (이륙 신호) 또는 MSG_ROUTE (위치 갱신)
+    epoch       I   송신기 부팅 id, 스테이션 PC 가 다시 시작될 때마다 바뀜
+    seq         I   송신 순번, 수신 측은 마지막으로 받은 순번보다 작거나 같은 패킷을 버림
+    timestamp   d   위치 측정 시각 (epoch 초)
+    lat         d   보정된 현재 위도
+    lng         d   보정된 현재 경도
+    dest_lat    d   목적지 위도 (없으면 NaN)
+    dest_lng    d   목적지 경도 (없으면 NaN)
+
+MSG_START 패킷은 새 송신 순번의 시작이므로 수신 측은 순번 기준을 이 패킷의 seq 로 다시 맞춥니다.
+앱은 순번 기준을 하나만 가지므로 송신 측의 모든 세션은 순번 하나를 공유합니다 (route_sender.shared_route_sender).
+epoch 가 바뀌면 송신기가 다시 시작되어 순번이 처음부터 시작된 것이므로 수신 측은 순번 기준을 버립니다.
+순번은 32비트에서 되돌아가므로 seq_newer() 처럼 차이가 2^31 보다 작은 쪽을 새 순번으로 비교합니다.
+"""
+import math
+import struct
+
+MAGIC = b'SR'
+VERSION = 2
+PACKET = struct.Struct('!2sBBIIddddd')
+
+# 메시지 종류
+MSG_START = 1
+MSG_ROUTE = 2
+MESSAGE_TYPES = {
+    MSG_START: "startFlag",
+    MSG_ROUTE: "route",
+}
+
+
+def _coord(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def seq_newer(seq, last):
+    """
+    32비트 순번 seq 가 last 보다 뒤의 순번인지 반환합니다 (되돌아감 고려).
+    """
+    diff = (seq - last) & 0xFFFFFFFF
+    return 0 < diff < 0x80000000
+
+
+def build_route_packet(msg_type, epoch, seq, timestamp, lat=None, lng=None,
+                       dest_lat=None, dest_lng=None):
+    """
+    경로 패킷을 만듭니다. 좌표가 없거나 숫자가 아니면 NaN 으로 채웁니다.
+    """
+    return PACKET.pack(MAGIC, VERSION, msg_type, epoch & 0xFFFFFFFF, seq & 0xFFFFFFFF,
+                       float(timestamp), _coord(lat), _coord(lng), _coord(dest_lat),
+                       _coord(dest_lng))
+
+
+def parse_route_packet(data):
+    """
+    수신한 경로 패킷을 해석합니다.
+
+    Returns:
+        dict: {"type", "epoch", "seq", "time", "lat", "lng", "dest_lat", "dest_lng"}
+
+    Raises:
+        ValueError: 형식이 맞지 않거나 지원하지 않는 버전인 경우
+    """
+    if len(data) != PACKET.size:
+        raise ValueError("패킷 크기가 잘못되었습니다: {}".format(len(data)))
+    (magic, version, msg_type, epoch, seq, timestamp,
+     lat, lng, dest_lat, dest_lng) = PACKET.unpack(data)
+    if magic != MAGIC:
+        raise ValueError("알 수 없는 패킷입니다: {!r}".format(magic))
+    if version != VERSION:
+        raise ValueError("지원하지 않는 패킷 버전입니다: {}".format(version))
+    if msg_type not in MESSAGE_TYPES:
+        raise ValueError("알 수 없는 메시지 종류입니다: {}".format(msg_type))
+    return {
+        "type": MESSAGE_TYPES[msg_type],
+        "epoch": epoch,
+        "seq": seq,
+        "time": timestamp,
+        "lat": lat,
+        "lng": lng,
+        "dest_lat": dest_lat,
+        "dest_lng": dest_lng
+    }
@@ -4,15 +4,239 @@ import os
 import sys
 import time
 import zmq
+import zmq.asyncio
 from datetime import datetime
-from flask import Flask
+from flask import Flask, jsonify, request
 import asyncio
 import websockets
 import threading
+from collections import deque
+from urllib.parse import urlparse, parse_qs
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from decision.route.route_decision import RouteDecision
 from decision.danger.danger_decision import DangerDecision
+from protocol.camera_frame import parse_camera_frame
+
+class ClientChannel:
+    """
+    WebSocket 클라이언트 하나의 송신 대기열과 송신 태스크 상태.
+    """
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.queue = deque()
+        self.pending_keys = set()
+        self.ready = asyncio.Event()
+        self.task = None
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        # 전송이 진행되지 않는 동안 버려진 메시지 수
+        self.overflow_streak = 0
+
+
+class WebSocketBroadcaster:
+    """
+    연결된 WebSocket 클라이언트들에게 메시지를 동시에 전송하는 브로드캐스터.
+
+    클라이언트마다 송신 대기열과 송신 태스크를 두어, 느린 클라이언트가 다른 클라이언트의 수신을 지연시키지 않음.
+    메시지는 한 번만 직렬화해 모든 클라이언트가 공유함. 대기열이 가득 차면 가장 오래된 메시지를 버리고,
+    전송 제한 시간을 넘기거나 전송 없이 queue_size 개 넘게 버려진 클라이언트는 느린 클라이언트로 보고 연결을 끊음.
+
+    Args:
+        queue_size (int): 클라이언트별 최대 대기 메시지 수
+        send_timeout (float): 메시지 하나의 전송 제한 시간(초)
+    """
+    def __init__(self, queue_size=16, send_timeout=2.0):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.channels = {}
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.channels)
+
+    def register(self, websocket):
+        channel = ClientChannel(websocket)
+        channel.task = asyncio.ensure_future(self._send_loop(channel))
+        self.channels[websocket] = channel
+        return channel
+
+    def unregister(self, websocket):
+        channel = self.channels.pop(websocket, None)
+        if channel is not None and channel.task is not asyncio.current_task():
+            channel.task.cancel()
+
+    def broadcast(self, messages, coalesce_key=None, targets=None):
+        """
+        직렬화된 메시지(str 또는 bytes) 목록을 클라이언트의 대기열에 넣음. 목록은 순서대로 함께 전송됨.
+        coalesce_key 가 같은 메시지가 아직 대기 중인 클라이언트에는 다시 넣지 않음.
+        targets 가 있으면 해당 WebSocket 클라이언트에만 전송함.
+        """
+        if targets is None:
+            channels = list(self.channels.values())
+        else:
+            channels = [self.channels[ws] for ws in list(targets) if ws in self.channels]
+        for channel in channels:
+            if coalesce_key is not None and coalesce_key in channel.pending_keys:
+                channel.coalesced += 1
+                continue
+            if len(channel.queue) >= self.queue_size:
+                if channel.overflow_streak >= self.queue_size:
+                    self.evict(channel, "송신 대기열 초과")
+                    continue
+                old_key, _ = channel.queue.popleft()
+                channel.pending_keys.discard(old_key)
+                channel.dropped += 1
+                channel.overflow_streak += 1
+            channel.queue.append((coalesce_key, messages))
+            if coalesce_key is not None:
+                channel.pending_keys.add(coalesce_key)
+            channel.ready.set()
+
+    def evict(self, channel, reason):
+        """
+        느린 클라이언트의 연결을 끊고 대기 중인 메시지를 버림.
+        """
+        print(f"[브로드캐스트] 느린 클라이언트 연결 해제: {reason}")
+        self.evicted += 1
+        self.unregister(channel.websocket)
+        channel.queue.clear()
+        asyncio.ensure_future(channel.websocket.close(code=1013, reason="slow consumer"))
+
+    async def _send_loop(self, channel):
+        while True:
+            while not channel.queue:
+                channel.ready.clear()
+                await channel.ready.wait()
+            key, messages = channel.queue.popleft()
+            channel.pending_keys.discard(key)
+            try:
+                for message in messages:
+                    await asyncio.wait_for(channel.websocket.send(message), self.send_timeout)
+                channel.sent += 1
+                channel.overflow_streak = 0
+            except asyncio.TimeoutError:
+                self.evict(channel, "전송 제한 시간 초과")
+                return
+            except websockets.ConnectionClosed:
+                print("클라이언트가 예상치 않게 연결 해제됨.")
+                self.unregister(channel.websocket)
+                return
+
+    def stats(self):
+        return {
+            "clients": len(self.channels),
+            "pending": sum(len(c.queue) for c in self.channels.values()),
+            "dropped": sum(c.dropped for c in self.channels.values()),
+            "evicted": self.evicted
+        }
+
+
+# user_id 없이 연결한 클라이언트와 세션이 지정되지 않은 드론의 프레임이 모이는 세션
+DEFAULT_SESSION = "default"
+
+
+class Session:
+    """
+    사용자(에스코트) 한 명의 경로/위험 판단 상태와 연결된 WebSocket 클라이언트.
+    """
+    __slots__ = ("user_id", "drone_id", "route_decision", "danger_decision",
+                 "clients", "frame", "last_active")
+
+    def __init__(self, user_id, drone_id=None):
+        self.user_id = user_id
+        self.drone_id = drone_id
+        # 기본 세션은 기존 위치 로그 파일 이름을 그대로 사용
+        self.route_decision = RouteDecision(None if user_id == DEFAULT_SESSION else user_id)
+        self.danger_decision = DangerDecision()
+        self.clients = set()
+        self.frame = None
+        self.last_active = time.monotonic()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def close(self):
+        self.route_decision.close()
+
+
+class SessionRegistry:
+    """
+    user_id 로 세션을 찾고, drone_id 로 카메라 프레임을 받을 세션을 찾는 세션 저장소.
+
+    /connect 핸드셰이크(Flask 스레드)와 WebSocket 이벤트 루프 양쪽에서 호출되므로 잠금으로 보호함.
+    연결된 클라이언트가 없고 idle_timeout 초 동안 활동이 없는 세션은 evict_idle() 에서 정리됨.
+    세션이 지정되지 않은 드론의 프레임을 받는 기본 세션은 정리하지 않음.
+
+    Args:
+        idle_timeout (float): 유휴 세션 정리 기준 시간(초)
+    """
+    def __init__(self, idle_timeout=300.0):
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.drones = {}
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def values(self):
+        with self._lock:
+            return list(self.sessions.values())
+
+    def open(self, user_id=None, drone_id=None):
+        """
+        세션을 찾거나 새로 만들고, drone_id 가 있으면 해당 드론을 이 세션에 연결함.
+        """
+        user_id = str(user_id) if user_id else DEFAULT_SESSION
+        if drone_id is not None:
+            drone_id = int(drone_id)
+        with self._lock:
+            session = self.sessions.get(user_id)
+            if session is None:
+                session = Session(user_id)
+                self.sessions[user_id] = session
+                print(f"[세션] {user_id} 세션이 생성되었습니다. (총 {len(self.sessions)}개)")
+            if drone_id is not None and session.drone_id != drone_id:
+                previous = self.sessions.get(self.drones.get(drone_id))
+                if previous is not None and previous is not session:
+                    previous.drone_id = None
+                if session.drone_id is not None:
+                    self.drones.pop(session.drone_id, None)
+                self.drones[drone_id] = user_id
+                session.drone_id = drone_id
+            session.touch()
+            return session
+
+    def for_drone(self, drone_id):
+        """
+        드론에 연결된 세션을 반환. 연결된 세션이 없으면 기본 세션을 반환함.
+        """
+        with self._lock:
+            user_id = self.drones.get(drone_id, DEFAULT_SESSION)
+            return self.sessions.get(user_id)
+
+    def evict_idle(self):
+        """
+        유휴 세션을 정리하고 정리된 세션 목록을 반환함.
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [s for s in self.sessions.values()
+                    if not s.clients and s.last_active < deadline
+                    and s.user_id != DEFAULT_SESSION]
+            for session in idle:
+                del self.sessions[session.user_id]
+                if session.drone_id is not None:
+                    self.drones.pop(session.drone_id, None)
+            self.evicted += len(idle)
+        for session in idle:
+            session.close()
+            print(f"[세션] 유휴 세션 {session.user_id} 정리됨.")
+        return idle
+
 
 class Server:
     def __init__(self):
@@ -20,68 +244,132 @@ class Server:
         Server 클래스 초기화 및 Flask 앱, WebSocket 클라이언트 세트 생성.
         """
         self.app = Flask(__name__)
-        self.ws_clients = set()
+        self.app.add_url_rule('/connect', 'connect', self.connect, methods=['POST'])
+        self.broadcaster = WebSocketBroadcaster()
         self.frame_lasttime = datetime.now()
-        self.frame = None
 
-        # RouteDecision 및 DangerDecision 클래스 인스턴스 생성
-        self.route_decision = RouteDecision()
-        self.danger_decision = DangerDecision()
+        # 사용자별 RouteDecision 및 DangerDecision 을 가진 세션 저장소
+        self.sessions = SessionRegistry()
 
-        # ZeroMQ 소켓 설정
-        self.context = zmq.Context()
+        # ZeroMQ 소켓 설정 (WebSocket 이벤트 루프에서 직접 수신)
+        self.context = zmq.asyncio.Context()
         self.socket_camera = self.context.socket(zmq.SUB)
+        # 최신 프레임만 필요하므로 수신 대기열을 최소화
+        self.socket_camera.setsockopt(zmq.RCVHWM, 2)
         self.socket_camera.connect("tcp://127.0.0.1:5580")
         self.socket_camera.setsockopt_string(zmq.SUBSCRIBE, "")
 
+    def connect(self):
+        """
+        user_id(와 drone_id)로 세션을 미리 만들거나 드론을 세션에 연결하는 핸드셰이크.
+        """
+        data = request.get_json(silent=True) or {}
+        user_id = data.get("user_id")
+        if not user_id:
+            return jsonify({"error": "user_id missing"}), 400
+        try:
+            session = self.sessions.open(user_id, data.get("drone_id"))
+        except (TypeError, ValueError):
+            return jsonify({"error": "invalid drone_id"}), 400
+        print(f"유저 {session.user_id}가 연결되었습니다. (드론: {session.drone_id})")
+        return jsonify({"user_id": session.user_id, "drone_id": session.drone_id}), 200
+
+    def join_session(self, websocket, user_id=None, drone_id=None, current=None):
+        """
+        WebSocket 클라이언트를 세션에 참여시킴. 다른 세션에 있었다면 옮김.
+        """
+        try:
+            session = self.sessions.open(user_id, drone_id)
+        except (TypeError, ValueError):
+            print(f"[세션] 잘못된 drone_id 무시: {drone_id}")
+            session = self.sessions.open(user_id)
+        if current is not None and current is not session:
+            current.clients.discard(websocket)
+            current.touch()
+        session.clients.add(websocket)
+        return session
+
     async def websocket_handler(self, websocket, path):
         """
         WebSocket 연결을 관리하며, 연결된 클라이언트로부터 메시지를 수신하고 처리함.
+        세션은 접속 경로의 ?user_id=&drone_id= 또는 {"type": "connect"} 메시지로 지정하며,
+        지정하지 않으면 기본 세션에 참여함.
         """
-        self.ws_clients.add(websocket)
-        print("WebSocket 클라이언트가 연결되었습니다.")
+        self.broadcaster.register(websocket)
+        query = parse_qs(urlparse(path or "").query)
+        session = self.join_session(websocket,
+                                    query.get("user_id", [None])[0],
+                                    query.get("drone_id", [None])[0])
+        print(f"WebSocket 클라이언트가 {session.user_id} 세션에 연결되었습니다.")
 
-        self.route_decision.send_initial_trigger()
+        session.route_decision.send_initial_trigger()
 
         try:
             async for message in websocket:
                 data = json.loads(message)
                 message_type = data.get("type")
+                session.touch()
 
-                if message_type == "trackPosition":
-                    await self.handle_track_position(data)
+                if message_type == "connect":
+                    session = self.join_session(websocket, data.get("user_id"),
+                                                data.get("drone_id"), session)
+                elif message_type == "trackPosition":
+                    await self.handle_track_position(session, data)
                 elif message_type == "sendPulseFlag":
-                    self.danger_decision.set_pulse_flag_trigger(data.get("pulseFlag"))
+                    danger = session.danger_decision.ingest("pulse", data.get("pulseFlag"), data.get("time"))
+                    await self.notify_danger(session, danger)
                 elif message_type == "sendDbFlag":
-                    self.danger_decision.set_db_flag_trigger(data.get("dbFlag"))
-
-                # DangerDecision을 통해 위험 상태 확인 후 클라이언트에게 알림
-                if self.danger_decision.check_condition():
-                    await self.send_warning_to_clients()
+                    danger = session.danger_decision.ingest("db", data.get("dbFlag"), data.get("time"))
+                    await self.notify_danger(session, danger)
 
         except websockets.ConnectionClosed:
             print("WebSocket 연결이 닫혔습니다.")
         finally:
-            self.ws_clients.remove(websocket)
+            self.broadcaster.unregister(websocket)
+            session.clients.discard(websocket)
+            session.touch()
 
-    async def send_warning_to_clients(self):
+    async def notify_danger(self, session, danger):
         """
-        위험 상황 발생 시 모든 WebSocket 클라이언트에 경고 메시지 전송.
+        DangerDecision 평가 결과가 위험이면 세션의 클라이언트에게 알림.
         """
-        print("[클라이언트 전송] 위험상황 전송")
+        if danger:
+            await self.send_warning_to_clients(session)
+
+    async def danger_timer(self, interval=0.5):
+        """
+        이벤트가 없어도 주기적으로 세션별 위험 판단을 평가하여 만료된 신호를 정리함.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            for session in self.sessions.values():
+                await self.notify_danger(session, session.danger_decision.tick())
+
+    async def session_reaper(self, interval=30.0):
+        """
+        주기적으로 유휴 세션을 정리함.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.sessions.evict_idle()
+
+    async def send_warning_to_clients(self, session):
+        """
+        위험 상황 발생 시 세션의 WebSocket 클라이언트에 경고 메시지 전송.
+        프레임이 있으면 JSON 메시지(frameSize 포함) 바로 뒤에 JPEG 을 바이너리 메시지로 전송.
+        """
+        print(f"[클라이언트 전송] {session.user_id} 세션에 위험상황 전송")
+        frame = session.frame
         message = json.dumps({
             "type": "sendWarningFlag",
             "time": datetime.now().isoformat(),
             "warningFlag": True,
-            "frame": self.frame
+            "frameSize": len(frame) if frame is not None else 0
         })
-        for client in self.ws_clients:
-            try:
-                await client.send(message)
-            except websockets.ConnectionClosed:
-                print("클라이언트가 예상치 않게 연결 해제됨.")
+        self.broadcaster.broadcast([message, frame] if frame is not None else [message],
+                                   targets=session.clients)
 
-    async def handle_track_position(self, data):
+    async def handle_track_position(self, session, data):
         """
         사용자의 위치 데이터를 처리하고 로그에 기록하며 RouteDecision에 전달.
         """
@@ -95,40 +383,46 @@ class Server:
         print(f"[유저 위치 전송] 시간: {time}, 현재 위도: {lat}, 현재 경도: {lng}, 목적지 위도: {dest_lat}, 목적지 경도: {dest_lng}")
 
         # 위치 정보를 RouteDecision에 직접 전달
-        self.route_decision.handle_position_update(lat, lng, dest_lat, dest_lng)
+        session.route_decision.handle_position_update(lat, lng, dest_lat, dest_lng, data.get("time"))
 
-    def camera_data_thread(self, loop):
+    async def receive_camera_data(self):
         """
-        별도 스레드에서 카메라 데이터를 수신하여 asyncio 루프에 전달.
+        이벤트 루프에서 카메라 데이터를 수신하여 드론에 연결된 세션의 위험 판단과 클라이언트 알림에 반영.
+        밀린 메시지는 버리고 가장 최근 프레임만 처리함.
         """
-        asyncio.set_event_loop(loop)
         while True:
+            frames = await self.socket_camera.recv_multipart()
+            # ZMQ_CONFLATE 는 multipart 메시지를 지원하지 않으므로 직접 최신 메시지만 남김
+            while await self.socket_camera.poll(0):
+                frames = await self.socket_camera.recv_multipart()
             try:
-                message = self.socket_camera.recv_string(flags=zmq.NOBLOCK)
-                data = json.loads(message)
-                self.frame = data.get("frame")
-                self.danger_decision.set_camera_flag_trigger(True)
-                print("[카메라 데이터 수신] Frame 데이터 업데이트됨.")
+                data = parse_camera_frame(frames)
+            except ValueError as e:
+                print(f"[카메라 데이터 수신] 잘못된 메시지 무시: {e}")
+                continue
+            session = self.sessions.for_drone(data["droneId"])
+            if session is None:
+                print(f"[카메라 데이터 수신] 드론 {data['droneId']} 에 연결된 세션이 없어 무시함.")
+                continue
+            session.frame = data["frame"]
+            print(f"[카메라 데이터 수신] {session.user_id} 세션 Frame 데이터 업데이트됨.")
 
-                asyncio.run_coroutine_threadsafe(self.update_clients_with_frame(), loop)
+            await self.update_clients_with_frame(session)
+            # 카메라 신호만 들어와도 바로 위험 판단을 평가
+            danger = session.danger_decision.ingest("camera", data["warningFlag"], data["time"])
+            await self.notify_danger(session, danger)
 
-            except zmq.Again:
-                time.sleep(0.1)  # 데이터가 없을 경우 잠시 대기
-
-    async def update_clients_with_frame(self):
+    async def update_clients_with_frame(self, session):
         """
-        WebSocket 클라이언트에 업데이트된 카메라 프레임을 전송.
+        세션의 WebSocket 클라이언트에 객체 감지 알림을 전송.
         """
         message = json.dumps({
             "type": "sendObjectFlag",
             "time": datetime.now().isoformat(),
             "objectFlag": True
         })
-        for client in self.ws_clients:
-            try:
-                await client.send(message)
-            except websockets.ConnectionClosed:
-                print("클라이언트가 연결 해제됨.")
+        # 연속된 객체 감지 알림은 아직 전송되지 않은 알림 하나로 합침
+        self.broadcaster.broadcast([message], coalesce_key="sendObjectFlag", targets=session.clients)
 
     def run_flask(self):
         self.app.run(host="0.0.0.0", port=5000)
@@ -139,14 +433,22 @@ class Server:
         """
         async with websockets.serve(self.websocket_handler, "0.0.0.0", 8765):
             print("WebSocket 서버가 8765 포트에서 대기 중입니다...")
-            await asyncio.Future()
+            tasks = [
+                asyncio.ensure_future(self.receive_camera_data()),
+                asyncio.ensure_future(self.danger_timer()),
+                asyncio.ensure_future(self.session_reaper())
+            ]
+            try:
+                await asyncio.Future()
+            finally:
+                for task in tasks:
+                    task.cancel()
 
     def start(self):
         flask_thread = threading.Thread(target=self.run_flask)
         flask_thread.start()
 
         loop = asyncio.get_event_loop()
-        threading.Thread(target=self.camera_data_thread, args=(loop,), daemon=True).start()
         loop.run_until_complete(self.run_websocket())
 
 if __name__ == "__main__":
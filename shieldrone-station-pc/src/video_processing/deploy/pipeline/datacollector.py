@@ -13,9 +13,10 @@
 # limitations under the License.
 
 import os
-import copy
 from collections import Counter
 
+import numpy as np
+
 
 class Result(object):
     def __init__(self):
@@ -48,6 +49,147 @@ class Result(object):
         self.res_dict[name].clear()
 
 
+class TrackHistory(object):
+    """
+    Struct-of-arrays history of a single track id.
+
+    Every column is a preallocated numpy array indexed by row, and rows
+    [start, end) are the retained window, so all accessors return views into
+    the columns without copying. Optional columns (kpts, features, ...) are
+    created on first write and hold NaN (or None for object columns) on rows
+    where the result was not available.
+
+    With max_frames set the columns hold 2 * max_frames rows; once the end is
+    reached the newest max_frames rows are moved back to the front, which
+    keeps append amortized O(1). Without max_frames the columns double.
+
+    Args:
+        track_id (int): track id of the history
+        max_frames (int|None): rows kept, older rows are dropped
+        initial_size (int): initial rows when max_frames is None
+    """
+    OBJECT_COLUMNS = ('attrs', 'skeleton_action', 'vehicleplate')
+
+    def __init__(self, track_id, max_frames=None, initial_size=64):
+        self.track_id = track_id
+        self.max_frames = max_frames
+        self.capacity = 2 * max_frames if max_frames else initial_size
+        self.start = 0
+        self.end = 0
+        self.columns = {
+            'frames': np.zeros(self.capacity, dtype=np.int64),
+            'rects': np.zeros((self.capacity, 5), dtype=np.float32),
+        }
+
+    def __len__(self):
+        return self.end - self.start
+
+    @staticmethod
+    def _fill_value(dtype):
+        if dtype == object:
+            return None
+        return np.nan if np.issubdtype(dtype, np.floating) else 0
+
+    def _new_column(self, name, shape, capacity, dtype=np.float32):
+        if name in self.OBJECT_COLUMNS:
+            dtype = object
+        return np.full(
+            (capacity, ) + shape, self._fill_value(dtype), dtype=dtype)
+
+    def _make_room(self):
+        size = len(self)
+        if self.max_frames:
+            for col in self.columns.values():
+                col[:size] = col[self.start:self.end]
+        else:
+            self.capacity *= 2
+            for name, col in self.columns.items():
+                grown = self._new_column(name, col.shape[1:], self.capacity,
+                                         col.dtype)
+                grown[:size] = col[self.start:self.end]
+                self.columns[name] = grown
+        self.start, self.end = 0, size
+
+    def append(self, frameid, rect, **values):
+        """
+        Append one row. values maps optional column names to the row value.
+        """
+        if self.end == self.capacity:
+            self._make_room()
+        row = self.end
+        self.columns['frames'][row] = frameid
+        self.columns['rects'][row] = rect
+        for name, value in values.items():
+            if name not in self.columns:
+                shape = () if name in self.OBJECT_COLUMNS else np.shape(value)
+                self.columns[name] = self._new_column(name, shape,
+                                                      self.capacity)
+            self.columns[name][row] = value
+        if len(values) + 2 < len(self.columns):
+            # rows are reused after compaction, reset columns missing this row
+            for name, col in self.columns.items():
+                if name not in values and name not in ('frames', 'rects'):
+                    col[row] = self._fill_value(col.dtype)
+        self.end += 1
+        if self.max_frames and len(self) > self.max_frames:
+            self.start += 1
+
+    def column(self, name):
+        """
+        View of the retained rows of a column, None if it was never written.
+        """
+        col = self.columns.get(name)
+        if col is None:
+            return None
+        return col[self.start:self.end]
+
+    @property
+    def frames(self):
+        return self.column('frames')
+
+    @property
+    def rects(self):
+        """
+        [N, 5] (score, xmin, ymin, xmax, ymax)
+        """
+        return self.column('rects')
+
+    @property
+    def last_frame(self):
+        return int(self.columns['frames'][self.end - 1]) if len(self) else None
+
+    def trajectory(self):
+        """
+        [N, 2] box centers of the retained rows.
+        """
+        rects = self.rects
+        return (rects[:, 1:3] + rects[:, 3:5]) / 2.
+
+    def last_keypoints(self, num):
+        """
+        View of the keypoints [n, 17, 3] of the last num rows.
+        """
+        col = self.columns.get('kpts')
+        if col is None:
+            return None
+        return col[max(self.end - num, self.start):self.end]
+
+    def mean_feature(self):
+        """
+        Mean reid feature over the rows that have one, None if there is none.
+        """
+        features = self.column('features')
+        if features is None:
+            return None
+        valid = features[~np.isnan(features[:, 0])]
+        if len(valid) == 0:
+            return None
+        return valid.mean(axis=0)
+
+    def as_dict(self):
+        return {name: self.column(name) for name in self.columns}
+
+
 class DataCollector(object):
     """
   DataCollector of Pipeline, collect results in every frames and assign it to each track ids.
@@ -55,30 +197,27 @@ class DataCollector(object):
   
   data struct:
   collector:
-    - [id1]: (all results of N frames)
-      - frames(list of int): Nx[int]
-      - rects(list of rect): Nx[rect(conf, xmin, ymin, xmax, ymax)]
-      - features(list of array(256,)): Nx[array(256,)]
-      - qualities(list of float): Nx[float]
-      - attrs(list of attr): refer to attrs for details
-      - kpts(list of kpts): refer to kpts for details
-      - skeleton_action(list of skeleton_action): refer to skeleton_action for details
+    - [id1]: TrackHistory, one row per frame the id was tracked, columns:
+      - frames(int64): N
+      - rects(float32): Nx5 (conf, xmin, ymin, xmax, ymax)
+      - features(float32): Nx256
+      - qualities(float32): N
+      - attrs(object): refer to attrs for details
+      - kpts(float32): Nx17x3, kpt_scores(float32): N
+      - skeleton_action(object): refer to skeleton_action for details
+      - vehicleplate(object): N
     ...
     - [idN]
+
+  Args:
+    max_frames (int|None): results kept per track id, older ones are dropped
+    max_idle (int|None): track ids not updated for this many frames are evicted
   """
 
-    def __init__(self):
-        #id, frame, rect, score, label, attrs, kpts, skeleton_action
-        self.mots = {
-            "frames": [],
-            "rects": [],
-            "attrs": [],
-            "kpts": [],
-            "features": [],
-            "qualities": [],
-            "skeleton_action": [],
-            "vehicleplate": []
-        }
+    def __init__(self, max_frames=None, max_idle=None):
+        self.max_frames = max_frames
+        self.max_idle = max_idle
+        # track id -> TrackHistory, ordered from least recently updated
         self.collector = {}
 
     def append(self, frameid, Result):
@@ -97,38 +236,55 @@ class DataCollector(object):
 
         for idx, mot_item in enumerate(rects):
             ids = int(mot_item[0])
-            if ids not in self.collector:
-                self.collector[ids] = copy.deepcopy(self.mots)
-            self.collector[ids]["frames"].append(frameid)
-            self.collector[ids]["rects"].append([mot_item[2:]])
+            track = self.collector.pop(ids, None)
+            if track is None:
+                track = TrackHistory(ids, self.max_frames)
+            self.collector[ids] = track
+
+            values = {}
             if attr_res:
-                self.collector[ids]["attrs"].append(attr_res['output'][idx])
+                values['attrs'] = attr_res['output'][idx]
             if kpt_res:
-                self.collector[ids]["kpts"].append(
-                    [kpt_res['keypoint'][0][idx], kpt_res['keypoint'][1][idx]])
+                values['kpts'] = kpt_res['keypoint'][0][idx]
+                values['kpt_scores'] = kpt_res['keypoint'][1][idx]
             if skeleton_action_res and (idx + 1) in skeleton_action_res:
-                self.collector[ids]["skeleton_action"].append(
-                    skeleton_action_res[idx + 1])
-            else:
-                # action model generate result per X frames, Not available every frames
-                self.collector[ids]["skeleton_action"].append(None)
+                values['skeleton_action'] = skeleton_action_res[idx + 1]
             if reid_res:
-                self.collector[ids]["features"].append(reid_res['features'][
-                    idx])
-                self.collector[ids]["qualities"].append(reid_res['qualities'][
-                    idx])
+                values['features'] = reid_res['features'][idx]
+                values['qualities'] = reid_res['qualities'][idx]
             if vehicleplate_res and vehicleplate_res['plate'][idx] != "":
-                self.collector[ids]["vehicleplate"].append(vehicleplate_res[
-                    'plate'][idx])
+                values['vehicleplate'] = vehicleplate_res['plate'][idx]
+            track.append(frameid, mot_item[2:], **values)
+        self.evict(frameid)
+
+    def evict(self, frameid):
+        """
+        Drop track ids whose last update is older than max_idle frames.
+        """
+        if self.max_idle is None:
+            return
+        while self.collector:
+            track = next(iter(self.collector.values()))
+            if frameid - track.last_frame <= self.max_idle:
+                break
+            del self.collector[track.track_id]
+
+    def get(self, trackid):
+        return self.collector.get(trackid)
 
     def get_res(self):
-        return self.collector
+        return {
+            ids: track.as_dict()
+            for ids, track in self.collector.items()
+        }
 
     def get_carlp(self, trackid):
-        lps = self.collector[trackid]["vehicleplate"]
-        counter = Counter(lps)
+        lps = self.collector[trackid].column('vehicleplate')
+        if lps is None:
+            return None
+        counter = Counter(lp for lp in lps if lp is not None)
         carlp = counter.most_common()
         if len(carlp) > 0:
             return carlp[0][0]
         else:
-            return None
\ No newline at end of file
+            return None
@@ -22,8 +22,16 @@ import cv2
 import threading
 import time
 import socket
+import struct
+import copy
+import zmq
+from datetime import datetime
+from collections import defaultdict, deque
 
-from python.keypoint_preprocess import expand_crop
+from python.keypoint_preprocess import expand_crop, expand_crop_rects
+from python.visualize import visualize_pose
+from pptracking.python.mot.visualize import plot_tracking_dict
+from protocol.camera_frame import build_camera_frame
 
 
 class Times(object):
@@ -44,6 +52,9 @@ class Times(object):
         else:
             self.time = (self.et - self.st) / repeats
 
+    def add(self, elapsed):
+        self.time += elapsed
+
     def reset(self):
         self.time = 0.
         self.st = 0.
@@ -85,10 +96,17 @@ class PipeTimer(Times):
             'vehicleplate': Times(),
             'lanes': Times(),
             'vehicle_press': Times(),
-            'vehicle_retrograde': Times()
+            'vehicle_retrograde': Times(),
+            'decode': Times()
         }
         self.img_num = 0
         self.track_num = 0
+        self.decode_num = 0
+
+    def add_decode_time(self, elapsed):
+        # called from decoder threads, time is accumulated without start()/end()
+        self.module_time['decode'].add(elapsed)
+        self.decode_num += 1
 
     def get_total_time(self):
         total_time = self.total_time.value()
@@ -107,7 +125,11 @@ class PipeTimer(Times):
 
         for k, v in self.module_time.items():
             v_time = round(v.value(), 4)
-            if v_time > 0 and k in ['det', 'mot', 'video_action']:
+            if v_time > 0 and k == 'decode':
+                print("{} time(ms): {}; per decoded frame average time(ms): {}".
+                      format(k, v_time * 1000,
+                             v_time * 1000 / max(1, self.decode_num)))
+            elif v_time > 0 and k in ['det', 'mot', 'video_action']:
                 print("{} time(ms): {}; per frame average time(ms): {}".format(
                     k, v_time * 1000, v_time * 1000 / self.img_num))
             elif v_time > 0:
@@ -134,6 +156,9 @@ class PipeTimer(Times):
         dic['kpt'] = round(self.module_time['kpt'].value() /
                            max(1, self.img_num),
                            4) if average else self.module_time['kpt'].value()
+        dic['decode'] = round(self.module_time['decode'].value() /
+                              max(1, self.decode_num),
+                              4) if average else self.module_time['decode'].value()
         dic['video_action'] = self.module_time['video_action'].value()
         dic['skeleton_action'] = round(
             self.module_time['skeleton_action'].value() / max(1, self.img_num),
@@ -241,6 +266,18 @@ def crop_image_with_mot(input, mot_res, expand=True):
     return crop_res, new_bboxes, ori_bboxes
 
 
+def crop_rects_with_mot(image_shape, mot_res):
+    """
+    crop_image_with_mot 과 같은 확장 crop 영역을 이미지를 자르지 않고 한 번에 계산합니다.
+    반환되는 keep 은 crop 영역에 대응하는 mot_res['boxes'] 의 인덱스입니다.
+    """
+    res = mot_res['boxes']
+    if len(res) == 0:
+        return np.zeros((0, 4), dtype=np.int64), [], np.zeros(0, dtype=np.int64)
+    new_bboxes, ori_bboxes, keep = expand_crop_rects(image_shape, res[:, 1:])
+    return new_bboxes, ori_bboxes.tolist(), keep
+
+
 def parse_mot_res(input):
     mot_res = []
     boxes, scores, ids = input[0]
@@ -280,6 +317,85 @@ def parse_mot_keypoint(input, coord_size):
     parsed_skeleton_with_mot["skeleton"] = skeleton
     return parsed_skeleton_with_mot
 
+def visualize_video_frame(image_rgb,
+                          result,
+                          frame_id,
+                          fps,
+                          labels,
+                          target_id=None,
+                          records=None,
+                          center_traj=None,
+                          latency=None):
+    image = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+    mot_res = copy.deepcopy(result.get('mot'))
+
+    if mot_res is not None:
+        ids = mot_res['boxes'][:, 0]
+        scores = mot_res['boxes'][:, 2]
+        boxes = mot_res['boxes'][:, 3:]
+        boxes[:, 2] = boxes[:, 2] - boxes[:, 0]
+        boxes[:, 3] = boxes[:, 3] - boxes[:, 1]
+    else:
+        boxes = np.zeros([0, 4])
+        ids = np.zeros([0])
+        scores = np.zeros([0])
+
+    # single class, still need to be defaultdict type for ploting
+    num_classes = 1
+    online_tlwhs = defaultdict(list)
+    online_scores = defaultdict(list)
+    online_ids = defaultdict(list)
+    online_tlwhs[0] = boxes
+    online_scores[0] = scores
+    online_ids[0] = ids
+
+    if mot_res is not None:
+        image = plot_tracking_dict(
+            image,
+            num_classes,
+            online_tlwhs,
+            online_ids,
+            online_scores,
+            frame_id=frame_id,
+            fps=fps,
+            ids2names=labels,
+            records=records,
+            center_traj=center_traj,
+            target_id=target_id)
+
+    kpt_res = result.get('kpt')
+    if kpt_res is not None:
+        image = visualize_pose(
+            image,
+            kpt_res,
+            # visual_thresh=self.cfg['kpt_thresh'],
+            returnimg=True)
+    
+    if latency:
+        # 이미지에 텍스트 표시
+        # 이미지 처리 후 우상단에 레이턴시 표시
+        latency = time.time() - latency
+        text = f"Latency: {latency:.2f} sec"
+
+        # 이미지 크기 가져오기
+        height, width, _ = image.shape
+
+        # 텍스트 표시할 위치를 오른쪽 상단으로 설정
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        font_scale = 1
+        font_color = (0, 255, 0)  # 녹색
+        thickness = 2
+
+        # 텍스트 크기 계산
+        (text_width, text_height), _ = cv2.getTextSize(text, font, font_scale, thickness)
+        position = (width - text_width - 10, text_height + 10)  # 오른쪽 상단에서 약간의 여백을 줌
+
+        # 이미지에 텍스트 표시
+        cv2.putText(image, text, position, font, font_scale, font_color, thickness)
+
+    return image
+
+
 class HandAboveHeadTracker(object):
     def __init__(self, min_hold_time=5):
         self.holding_ids=dict()
@@ -324,10 +440,589 @@ class HandAboveHeadTracker(object):
                 del self.holding_ids[tracker]
         return None
 
+class KeypointTrackCache(object):
+    """
+    트랙 id 별 키포인트 추론 결과 캐시.
+
+    목표 지정 전에는 매 프레임 모든 사람에 대해 키포인트를 추론하는 대신,
+    캐시가 없거나 오래되었거나 박스가 크게 움직인 트랙만 다시 추론합니다.
+    손을 들고 있는 트랙(HandAboveHeadTracker.holding_ids)은 유지 시간 판정을 위해 매 프레임 우선 추론합니다.
+    키포인트는 crop 좌표계로 저장하고, 원본 좌표로 옮길 수 있도록 추론에 사용한 crop 영역을 함께 저장합니다.
+
+    Args:
+        refresh_interval (int): 캐시된 결과를 다시 추론하기까지의 프레임 수
+        motion_thresh (float): 박스 중심 이동량 또는 가로/세로 크기 변화가 박스 크기 대비 이 비율을 넘으면 캐시 무효화
+        max_crops (int): 한 프레임에서 추론할 최대 crop 수, 0 이하면 제한 없음
+        max_age (int): 보이지 않는 트랙의 캐시를 제거하기까지의 프레임 수
+    """
+
+    def __init__(self, refresh_interval=5, motion_thresh=0.2, max_crops=0,
+                 max_age=30):
+        self.refresh_interval = refresh_interval
+        self.motion_thresh = motion_thresh
+        self.max_crops = max_crops
+        self.max_age = max_age
+        self.cache = dict()  # track_id -> {"frame_id", "bbox", "rect", "keypoint", "score"}
+        self.last_seen = dict()
+
+    def clear(self):
+        self.cache.clear()
+        self.last_seen.clear()
+
+    def _moved(self, cached_bbox, bbox):
+        x1, y1, x2, y2 = cached_bbox
+        w, h = max(x2 - x1, 1), max(y2 - y1, 1)
+        nx1, ny1, nx2, ny2 = bbox
+        shift = max(abs((nx1 + nx2 - x1 - x2) / 2.) / w,
+                    abs((ny1 + ny2 - y1 - y2) / 2.) / h)
+        resize = max(abs((nx2 - nx1) / w - 1), abs((ny2 - ny1) / h - 1))
+        return max(shift, resize) > self.motion_thresh
+
+    def select(self, frame_id, track_ids, bboxes, holding_ids=()):
+        """
+        이번 프레임에 키포인트를 추론할 트랙의 인덱스를 우선순위 순서로 반환합니다.
+        우선순위: 손을 들고 있는 트랙 > 캐시가 없는 트랙 > 움직인 트랙 > 오래된 트랙
+        """
+        holding = set(int(i) for i in holding_ids)
+        candidates = []
+        for idx, (track_id, bbox) in enumerate(zip(track_ids, bboxes)):
+            track_id = int(track_id)
+            self.last_seen[track_id] = frame_id
+            entry = self.cache.get(track_id)
+            if track_id in holding:
+                candidates.append((0, 0, idx))
+            elif entry is None:
+                candidates.append((1, 0, idx))
+            elif self._moved(entry["bbox"], bbox):
+                candidates.append((2, entry["frame_id"], idx))
+            elif frame_id - entry["frame_id"] >= self.refresh_interval:
+                candidates.append((3, entry["frame_id"], idx))
+        self._evict(frame_id)
+
+        candidates.sort()
+        if self.max_crops > 0:
+            # 예산을 넘은 트랙도 캐시가 없으면 결과가 없으므로 반드시 추론
+            selected = [c for i, c in enumerate(candidates)
+                        if i < self.max_crops or c[0] <= 1]
+        else:
+            selected = candidates
+        return np.array(sorted(c[2] for c in selected), dtype=np.int64)
+
+    def update(self, frame_id, track_ids, bboxes, rects, kpt_pred):
+        """
+        bboxes 는 트랙 박스, rects 는 키포인트를 추론한 crop 영역 [x1, y1, x2, y2] 입니다.
+        """
+        for i, track_id in enumerate(track_ids):
+            self.cache[int(track_id)] = {
+                "frame_id": frame_id,
+                "bbox": list(bboxes[i]),
+                "rect": np.array(rects[i], dtype=np.float32),
+                "keypoint": kpt_pred['keypoint'][i],
+                "score": kpt_pred['score'][i]
+            }
+
+    def gather(self, track_ids):
+        """
+        트랙 순서대로 캐시된 결과를 모아 predict_crops 와 같은 형태로 반환합니다 (복사본).
+        'rect' 는 각 결과를 추론한 crop 영역으로, 이전 프레임에서 추론된 결과도 그 영역 기준으로 원본 좌표로 옮겨야 합니다.
+        """
+        if len(track_ids) == 0:
+            return {
+                'keypoint': np.zeros(
+                    (0, 17, 3), dtype=np.float32),
+                'score': np.zeros(
+                    (0, 1), dtype=np.float32),
+                'rect': np.zeros(
+                    (0, 4), dtype=np.float32)
+            }
+        entries = [self.cache[int(track_id)] for track_id in track_ids]
+        return {
+            'keypoint': np.stack([e["keypoint"] for e in entries]),
+            'score': np.stack([e["score"] for e in entries]),
+            'rect': np.stack([e["rect"] for e in entries])
+        }
+
+    def _evict(self, frame_id):
+        expired = [
+            track_id for track_id, seen in self.last_seen.items()
+            if frame_id - seen > self.max_age
+        ]
+        for track_id in expired:
+            del self.last_seen[track_id]
+            self.cache.pop(track_id, None)
+
+
+class FrameRingBuffer(object):
+    """
+    수신 스레드와 추론 루프 사이에서 프레임을 주고받는 고정 슬롯 링 버퍼.
+
+    슬롯마다 numpy 버퍼를 미리 할당해 재사용하며, 소비자가 get()으로 받은 슬롯은
+    다음 get() 또는 release() 호출 전까지 덮어쓰지 않습니다.
+
+    Args:
+        capacity (int): 소비자를 기다릴 수 있는 최대 프레임 수 (fifo 정책에서만 의미 있음)
+        policy (str): 'latest' 는 가장 최신 프레임 하나만 유지, 'fifo' 는 순서대로 capacity 개 유지
+    """
+
+    POLICIES = ('latest', 'fifo')
+
+    def __init__(self, capacity=10, policy='latest'):
+        assert policy in self.POLICIES, \
+            "policy should be one of {}".format(self.POLICIES)
+        self.policy = policy
+        self.capacity = 1 if policy == 'latest' else max(1, int(capacity))
+        # 대기 중인 프레임 + 쓰는 중인 슬롯 1개 + 소비자가 점유한 슬롯 1개
+        num_slots = self.capacity + 2
+        self._buffers = [None] * num_slots
+        self._times = np.zeros(num_slots, dtype=np.float64)
+        self._seqs = np.zeros(num_slots, dtype=np.int64)
+        self._free = deque(range(num_slots))
+        self._ready = deque()
+        self._held = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._seq = 0
+
+        self.put_count = 0
+        self.get_count = 0
+        self.dropped = 0
+
+    def _ensure_slot(self, slot, frame):
+        buf = self._buffers[slot]
+        if buf is None or buf.shape != frame.shape or buf.dtype != frame.dtype:
+            buf = np.empty(frame.shape, dtype=frame.dtype)
+            self._buffers[slot] = buf
+        return buf
+
+    def put(self, frame, input_time=None, block=False):
+        """
+        프레임을 빈 슬롯에 복사해 넣습니다.
+
+        'latest' 정책이거나 block=False 인 'fifo' 정책에서 버퍼가 가득 차면
+        가장 오래된 미처리 프레임을 버립니다. block=True 인 'fifo' 정책은 자리가 날 때까지 대기합니다.
+
+        Returns:
+            int: 이번 호출로 버려진 프레임 수, 버퍼가 닫혀 있으면 -1
+        """
+        if input_time is None:
+            input_time = time.time()
+        dropped = 0
+        with self._cond:
+            if self._closed:
+                return -1
+            if self.policy == 'fifo' and block:
+                self._cond.wait_for(
+                    lambda: len(self._ready) < self.capacity or self._closed)
+                if self._closed:
+                    return -1
+            while len(self._ready) >= self.capacity:
+                self._free.append(self._ready.popleft())
+                dropped += 1
+            slot = self._free.popleft()
+            self._seq += 1
+            seq = self._seq
+
+        # 슬롯은 이 시점에 생산자만 소유하므로 잠금 밖에서 복사합니다.
+        np.copyto(self._ensure_slot(slot, frame), frame)
+        self._times[slot] = input_time
+        self._seqs[slot] = seq
+
+        with self._cond:
+            self._ready.append(slot)
+            self.put_count += 1
+            self.dropped += dropped
+            self._cond.notify_all()
+        return dropped
+
+    def get(self, timeout=None):
+        """
+        다음 프레임을 꺼냅니다. 이전에 꺼낸 슬롯은 자동으로 반환됩니다.
+
+        Returns:
+            dict: {"frame", "inputTime", "seq"}, 버퍼가 닫혔고 남은 프레임이 없거나
+                timeout 이 지나면 None. "frame" 은 슬롯 버퍼의 뷰이므로 다음 get() 이후에도
+                필요하면 복사해서 사용해야 합니다.
+        """
+        with self._cond:
+            self._release_locked()
+            if not self._cond.wait_for(
+                    lambda: len(self._ready) > 0 or self._closed, timeout):
+                return None
+            if not self._ready:
+                return None
+            slot = self._ready.popleft()
+            self._held = slot
+            self.get_count += 1
+            self._cond.notify_all()
+            return {
+                "frame": self._buffers[slot],
+                "inputTime": float(self._times[slot]),
+                "seq": int(self._seqs[slot])
+            }
+
+    def release(self):
+        """
+        소비자가 점유한 슬롯을 반환합니다.
+        """
+        with self._cond:
+            self._release_locked()
+
+    def _release_locked(self):
+        if self._held is not None:
+            self._free.append(self._held)
+            self._held = None
+            self._cond.notify_all()
+
+    def close(self):
+        """
+        더 이상 프레임이 들어오지 않음을 알리고 대기 중인 스레드를 깨웁니다.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def empty(self):
+        with self._cond:
+            return len(self._ready) == 0
+
+    def full(self):
+        with self._cond:
+            return len(self._ready) >= self.capacity
+
+    def stats(self):
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "pending": len(self._ready),
+                "put": self.put_count,
+                "get": self.get_count,
+                "dropped": self.dropped
+            }
+
+
+class UdpFrameReassembler(object):
+    """
+    조각(fragment) 단위로 전송된 UDP 영상 프레임을 다시 조립합니다.
+
+    패킷 구조 (network byte order, 헤더 20 bytes):
+        magic(2s) 'SD' | version(B) | flags(B) | frame_id(I) |
+        frag_index(H) | frag_count(H) | timestamp_ms(Q) | payload
+
+    헤더가 없는 패킷(JPEG SOI 로 시작)은 기존 방식의 단일 데이터그램 프레임으로 처리합니다.
+
+    Args:
+        timeout (float): 첫 조각 수신 후 이 시간(초) 안에 완성되지 않은 프레임은 폐기
+        max_pending (int): 동시에 조립 중일 수 있는 최대 프레임 수
+        restart_gap (int): frame_id 가 마지막 프레임보다 이만큼 넘게 뒤로(또는 앞으로) 건너뛰면
+            송신 앱이 다시 시작된 것으로 보고 순서 기준을 초기화
+        restart_timeout (float): 이 시간(초) 동안 완성된 프레임이 없으면 이전 프레임 번호도 새 순서로 받음
+    """
+
+    HEADER = struct.Struct('!2sBBIHHQ')
+    MAGIC = b'SD'
+    VERSION = 1
+    JPEG_SOI = b'\xff\xd8'
+
+    def __init__(self, timeout=0.2, max_pending=32, restart_gap=64,
+                 restart_timeout=1.0):
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.restart_gap = restart_gap
+        self.restart_timeout = restart_timeout
+        # frame_id -> [frag_count, received, parts, first_arrival, timestamp_ms]
+        self._pending = {}
+        # 마지막으로 완성된 프레임 이후 폐기한 미완성 프레임 id (손실을 두 번 세지 않기 위함)
+        self._dropped = set()
+        self._last_frame_id = None
+        self._last_complete = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.completed = 0
+        self.lost = 0
+        self.late = 0
+        self.duplicates = 0
+        self.malformed = 0
+        self.fragments = 0
+        self.restarts = 0
+        self.reassembly_time = 0.
+
+    @staticmethod
+    def _is_newer(a, b):
+        # frame_id 는 32bit 로 순환하므로 차이의 부호로 선후를 비교
+        return 0 < ((a - b) & 0xFFFFFFFF) < 0x80000000
+
+    def _gap(self, frame_id):
+        # 마지막 완성 프레임에서 frame_id 까지의 순방향 거리
+        return (frame_id - self._last_frame_id) & 0xFFFFFFFF
+
+    def _restart(self):
+        """
+        송신 측이 다시 시작된 것으로 보고 조립 중인 프레임과 순서 기준을 버립니다.
+        """
+        self.lost += len(self._pending)
+        self._pending.clear()
+        self._dropped.clear()
+        self._last_frame_id = None
+        self.restarts += 1
+
+    def push(self, packet, arrival=None):
+        """
+        패킷 하나를 넣고, 프레임이 완성되면 (payload, arrival, timestamp_ms) 를 반환합니다.
+        완성된 프레임이 없으면 None 을 반환합니다.
+        """
+        if arrival is None:
+            arrival = time.time()
+        header_size = self.HEADER.size
+        if len(packet) < header_size or packet[:2] != self.MAGIC:
+            if packet[:2] == self.JPEG_SOI:
+                self.completed += 1
+                return bytes(packet), arrival, None
+            self.malformed += 1
+            return None
+
+        magic, version, flags, frame_id, frag_index, frag_count, timestamp_ms = \
+            self.HEADER.unpack_from(packet)
+        if version != self.VERSION or frag_count == 0 or frag_index >= frag_count:
+            self.malformed += 1
+            return None
+        self.fragments += 1
+
+        if self._last_frame_id is not None:
+            gap = self._gap(frame_id)
+            backward = (-gap) & 0xFFFFFFFF
+            stalled = arrival - self._last_complete > self.restart_timeout
+            if (gap > self.restart_gap and backward > self.restart_gap) or \
+                    (stalled and not self._is_newer(frame_id, self._last_frame_id)):
+                # 앱 재시작 등으로 frame_id 가 크게 건너뛰었거나, 한동안 프레임이 없다가 이전 번호가 들어옴
+                self._restart()
+            elif not self._is_newer(frame_id, self._last_frame_id):
+                # 이미 더 최신 프레임을 내보냈으므로 늦게 도착한 조각은 버림
+                self.late += 1
+                return None
+
+        entry = self._pending.get(frame_id)
+        if entry is None:
+            if len(self._pending) >= self.max_pending:
+                self._evict_oldest()
+            entry = [frag_count, 0, [None] * frag_count, arrival, timestamp_ms]
+            self._pending[frame_id] = entry
+        elif entry[0] != frag_count:
+            self.malformed += 1
+            return None
+
+        parts = entry[2]
+        if parts[frag_index] is not None:
+            self.duplicates += 1
+            return None
+        parts[frag_index] = packet[header_size:]
+        entry[1] += 1
+        if entry[1] < frag_count:
+            return None
+
+        del self._pending[frame_id]
+        # 완성된 프레임보다 오래된 미완성 프레임은 더 이상 쓸모가 없으므로 폐기
+        for pending_id in [
+                k for k in self._pending if self._is_newer(frame_id, k)
+        ]:
+            del self._pending[pending_id]
+        if self._last_frame_id is not None:
+            # 사이에 빠진 프레임 번호는 조각이 하나도 오지 않은 프레임까지 포함해 모두 손실,
+            # 이미 timeout/max_pending 으로 폐기하며 센 프레임은 제외
+            skipped = self._gap(frame_id) - 1
+            counted = sum(1 for k in self._dropped
+                          if self._is_newer(frame_id, k))
+            self.lost += skipped - counted
+        self._dropped = {
+            k for k in self._dropped if self._is_newer(k, frame_id)
+        }
+        self._last_frame_id = frame_id
+        self._last_complete = arrival
+        self.completed += 1
+        self.reassembly_time += arrival - entry[3]
+        return b''.join(parts), entry[3], timestamp_ms
+
+    def _evict_oldest(self):
+        oldest_id = min(self._pending, key=lambda k: self._pending[k][3])
+        del self._pending[oldest_id]
+        self._dropped.add(oldest_id)
+        self.lost += 1
+
+    def evict_expired(self, now=None):
+        """
+        timeout 이 지난 미완성 프레임을 폐기하고 폐기한 개수를 반환합니다.
+        """
+        if now is None:
+            now = time.time()
+        expired = [
+            k for k, entry in self._pending.items()
+            if now - entry[3] > self.timeout
+        ]
+        for frame_id in expired:
+            del self._pending[frame_id]
+        self._dropped.update(expired)
+        self.lost += len(expired)
+        return len(expired)
+
+    def stats(self):
+        total = self.completed + self.lost
+        return {
+            "completed": self.completed,
+            "lost": self.lost,
+            "loss_rate": self.lost / total * 100 if total > 0 else 0.,
+            "late": self.late,
+            "duplicates": self.duplicates,
+            "malformed": self.malformed,
+            "restarts": self.restarts,
+            "pending": len(self._pending),
+            "avg_reassembly_ms":
+            self.reassembly_time / max(1, self.completed) * 1000
+        }
+
+
+class JpegDecodePool(object):
+    """
+    수신 스레드가 넘겨준 JPEG 바이트를 여러 디코더 스레드에서 병렬로 디코딩합니다.
+
+    cv2.imdecode / cvtColor 는 실행 중 GIL 을 해제하므로 스레드만으로 여러 코어를 사용할 수 있습니다.
+    디코딩 결과는 submit() 된 순서(seq)대로 callback(frame_rgb, input_time) 으로 전달됩니다.
+
+    Args:
+        callback (callable): 디코딩된 RGB 프레임을 받을 함수
+        num_workers (int): 디코더 스레드 수
+        max_pending (int): 디코딩 대기 가능한 최대 프레임 수, 초과 시 가장 오래된 프레임을 버림
+        pipe_timer (PipeTimer): 디코딩 시간을 누적할 타이머
+    """
+
+    def __init__(self, callback, num_workers=2, max_pending=None,
+                 pipe_timer=None):
+        self.callback = callback
+        self.num_workers = max(1, int(num_workers))
+        self.max_pending = max_pending or self.num_workers * 2
+        self.pipe_timer = pipe_timer
+        self._jobs = deque()
+        # seq -> (frame_rgb, input_time), 디코딩 실패/폐기된 프레임은 None
+        self._results = {}
+        self._cond = threading.Condition()
+        self._emit_lock = threading.Lock()
+        self._submit_seq = 0
+        self._next_seq = 0
+        self._closed = False
+
+        self.decoded = 0
+        self.failed = 0
+        self.dropped = 0
+        self.decode_time = 0.
+
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(self.num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, payload, input_time):
+        """
+        디코딩할 JPEG 바이트를 넣습니다. 수신 스레드를 막지 않습니다.
+
+        Returns:
+            int: 대기열이 가득 차 버려진 프레임 수
+        """
+        dropped = 0
+        with self._cond:
+            if self._closed:
+                return 0
+            while len(self._jobs) >= self.max_pending:
+                seq, _, _ = self._jobs.popleft()
+                self._results[seq] = None
+                dropped += 1
+            self._jobs.append((self._submit_seq, payload, input_time))
+            self._submit_seq += 1
+            self.dropped += dropped
+            self._cond.notify()
+        if dropped > 0:
+            self._emit_ready()
+        return dropped
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._jobs) > 0 or self._closed)
+                if self._closed:
+                    return
+                seq, payload, input_time = self._jobs.popleft()
+
+            start = time.time()
+            img = cv2.imdecode(
+                np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+            frame_rgb = None
+            if img is not None:
+                frame_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            elapsed = time.time() - start
+
+            with self._cond:
+                if frame_rgb is None:
+                    self.failed += 1
+                    self._results[seq] = None
+                else:
+                    self.decoded += 1
+                    self.decode_time += elapsed
+                    self._results[seq] = (frame_rgb, input_time)
+                    if self.pipe_timer is not None:
+                        self.pipe_timer.add_decode_time(elapsed)
+            if frame_rgb is None:
+                print("수신한 이미지를 디코딩하는데 실패했습니다.")
+            self._emit_ready()
+
+    def _emit_ready(self):
+        # 결과는 한 스레드씩만 seq 순서대로 내보냄
+        with self._emit_lock:
+            while True:
+                with self._cond:
+                    if self._next_seq not in self._results:
+                        return
+                    result = self._results.pop(self._next_seq)
+                    self._next_seq += 1
+                if result is not None:
+                    self.callback(*result)
+
+    def close(self):
+        """
+        대기 중인 작업을 버리고 디코더 스레드를 종료합니다.
+        """
+        with self._cond:
+            self._closed = True
+            self._jobs.clear()
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.num_workers,
+                "pending": len(self._jobs),
+                "decoded": self.decoded,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "avg_decode_ms":
+                self.decode_time / max(1, self.decoded) * 1000
+            }
+
+
 class VideoReceiverHandler:
-    def __init__(self, input_type, input_source):
+    def __init__(self, input_type, input_source, reassembly_timeout=0.2,
+                 decode_workers=2, pipe_timer=None):
         self.input_type = input_type
         self.input_source = input_source
+        self.reassembler = UdpFrameReassembler(timeout=reassembly_timeout)
+        self.decode_workers = decode_workers
+        self.pipe_timer = pipe_timer
+        self.decode_pool = None
         self.streaming_timer = self.StreamingTimer()
         self.start_time = time.time()  # FPS 측정 시작 시간
         self.fps_measured = False  # 첫 번째 FPS 측정 여부
@@ -361,63 +1056,100 @@ class VideoReceiverHandler:
             print("5초 요약:")
             print(f" - 건너뛴 프레임 수: {skipped_frames}")
             print(f" - 초당 프레임 수 (FPS): {self.fps:.2f}")
+            if self.input_type == "udp":
+                print(f" - UDP 재조립: {self.reassembler.stats()}")
+                if self.decode_pool is not None:
+                    print(f" - 디코딩: {self.decode_pool.stats()}")
             self.streaming_timer.reset()
             self.start_time = current_time
             self.fps_measured = True  # 첫 번째 FPS 측정 완료
 
-    def capture_video(self, queue, is_prepareing = False):
+    def _push_frame(self, framebuffer, frame_rgb, block=False, input_time=None):
+        if input_time is None:
+            input_time = time.time()
+        dropped = framebuffer.put(frame_rgb, input_time, block=block)
+        for _ in range(max(0, dropped)):
+            self.streaming_timer.increment_skip()
+
+    def capture_video(self, framebuffer, is_prepareing = False):
         assert self.input_type == "file"
         capture = cv2.VideoCapture(self.input_source)
         ret, frame = capture.read()
         if ret:
             self.height, self.width = frame.shape[:2]
 
-        while is_prepareing ^ self.fps_measured:
-            if queue.full():
-                time.sleep(0.1)
-            else:
+        try:
+            while (is_prepareing ^ self.fps_measured) and not framebuffer.closed:
                 ret, frame = capture.read()
                 if not ret:
                     return
                 frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                 if self.fps_measured:
-                    queue.put({"frame": frame_rgb, "inputTime": time.time()})
+                    # 파일 입력은 프레임을 버리지 않고 자리가 날 때까지 대기
+                    self._push_frame(framebuffer, frame_rgb, block=True)
                 self.streaming_timer.increment_frame()
-            self.update_fps()
+                self.update_fps()
+        finally:
+            capture.release()
+            if not is_prepareing:
+                framebuffer.close()
 
-    def receive_frames(self, queue, is_prepareing = False):
+    def receive_frames(self, framebuffer, is_prepareing = False):
         assert self.input_type == "udp"
+
+        def on_decoded(frame_rgb, input_time):
+            # 디코더 스레드에서 seq 순서대로 호출됨
+            self.height, self.width = frame_rgb.shape[:2]
+            if self.fps_measured and not is_prepareing:
+                self._push_frame(framebuffer, frame_rgb, input_time=input_time)
+            self.streaming_timer.increment_frame()
+
+        # 수신 스레드는 조립된 JPEG 바이트만 넘기고 디코딩은 디코더 스레드에서 수행
+        self.decode_pool = JpegDecodePool(
+            on_decoded,
+            num_workers=self.decode_workers,
+            pipe_timer=None if is_prepareing else self.pipe_timer)
+
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # 고해상도 프레임의 조각이 한꺼번에 몰려도 유실되지 않도록 수신 버퍼 확장
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
         server_socket.bind((self.input_source.split(":")[0], int(self.input_source.split(":")[1])))
+        server_socket.settimeout(self.reassembler.timeout)
         print("서버가 대기 중입니다...")
 
         try:
-            while is_prepareing ^ self.fps_measured:
-                packet, addr = server_socket.recvfrom(65507)
-                frame = np.frombuffer(packet, dtype=np.uint8)
-                img = cv2.imdecode(frame, cv2.IMREAD_COLOR)
-                if img is not None:
-                    frame_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                    self.height, self.width = frame_rgb.shape[:2]
-                    if self.fps_measured and not queue.full():
-                        queue.put({"frame": frame_rgb, "inputTime": time.time()})
-                    self.streaming_timer.increment_frame()
-                else:
-                    print("수신한 이미지를 디코딩하는데 실패했습니다.")
+            while (is_prepareing ^ self.fps_measured) and not framebuffer.closed:
+                try:
+                    packet, addr = server_socket.recvfrom(65507)
+                except socket.timeout:
+                    self.reassembler.evict_expired()
+                    self.update_fps()
+                    continue
+                arrival = time.time()
+                self.reassembler.evict_expired(arrival)
+                assembled = self.reassembler.push(packet, arrival)
+                if assembled is not None:
+                    payload, input_time, _ = assembled
+                    for _ in range(self.decode_pool.submit(payload, input_time)):
+                        self.streaming_timer.increment_skip()
                 self.update_fps()
         except Exception as e:
             print(f"Error: {e}")
         finally:
             server_socket.close()
+            self.decode_pool.close()
+            self.decode_pool = None
+            if not is_prepareing:
+                framebuffer.close()
 
-    def capture_webcam(self, queue, is_prepareing = False):
+    def capture_webcam(self, framebuffer, is_prepareing = False):
         assert self.input_type == "camera"
         cap = cv2.VideoCapture(int(self.input_source))
         self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
         try:
-            while is_prepareing ^ self.fps_measured:
+            while (is_prepareing ^ self.fps_measured) and not framebuffer.closed:
                 ret, frame = cap.read()
                 if not ret:
                     print("웹캠에서 프레임을 읽지 못했습니다.")
@@ -426,39 +1158,41 @@ class VideoReceiverHandler:
                 frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
                 if frame_rgb is not None:
-                    if self.fps_measured and not queue.full():
-                        queue.put({"frame": frame_rgb, "inputTime": time.time()})
+                    if self.fps_measured:
+                        self._push_frame(framebuffer, frame_rgb)
                     self.streaming_timer.increment_frame()
                 self.update_fps()
         except Exception as e:
             print(f"Error: {e}")
         finally:
             cap.release()
+            if not is_prepareing:
+                framebuffer.close()
 
-    def start_video(self, framequeue):
+    def start_video(self, framebuffer):
         self.start_time = time.time()  # FPS 측정 시작 시간
         if self.input_type == "file":
             thread = threading.Thread(
-                target=self.capture_video, args=(framequeue,))
+                target=self.capture_video, args=(framebuffer,))
         elif self.input_type == "camera":
             thread = threading.Thread(
-                target=self.capture_webcam, args=(framequeue,))
+                target=self.capture_webcam, args=(framebuffer,))
         elif self.input_type == "udp":
             thread = threading.Thread(
-                target=self.receive_frames, args=(framequeue,))
+                target=self.receive_frames, args=(framebuffer,))
         thread.start()
         time.sleep(1)
 
 
-    def prepare_video(self, framequeue):
+    def prepare_video(self, framebuffer):
         print("FPS 측정중")
         self.start_time = time.time()  # FPS 측정 시작 시간
         if self.input_type == "file":
-            self.capture_video(framequeue, is_prepareing = True)
+            self.capture_video(framebuffer, is_prepareing = True)
         elif self.input_type == "camera":
-            self.capture_webcam(framequeue, is_prepareing = True)
+            self.capture_webcam(framebuffer, is_prepareing = True)
         elif self.input_type == "udp":
-            self.receive_frames(framequeue, is_prepareing = True)
+            self.receive_frames(framebuffer, is_prepareing = True)
         return self.height, self.width
     
 
@@ -527,3 +1261,130 @@ class ResultSendHandler:
                     # print(f"Sent: {json_result}")
                 except Exception as e:
                     print(f"Error sending data: {e}")
+
+
+class DangerFramePublisher(object):
+    """
+    위험 상황 프레임을 인코딩하고 ZMQ PUB 소켓으로 송신하는 단계.
+
+    publish() 는 프레임을 큐에 넣기만 하고 바로 반환하므로 추론 루프를 막지 않습니다.
+    인코딩(색 변환, JPEG, 메시지 직렬화)과 송신은 전용 스레드에서 수행합니다. 소켓은 start() 에서 바인드해
+    주소 충돌 같은 오류가 호출한 쪽으로 전달되게 하고, 이후에는 송신 스레드가 소유합니다.
+    큐가 가득 차면 가장 오래된 프레임을 버리고, 구독자가 느려 송신할 수 없는 메시지도 재시도 없이 버립니다.
+
+    Args:
+        address (str): PUB 소켓 바인드 주소
+        queue_size (int): 인코딩을 기다릴 수 있는 최대 프레임 수
+        min_interval (float): 위험 프레임 최소 전송 간격(초), 간격 안에 들어온 프레임은 버림
+        jpeg_quality (int): JPEG 인코딩 품질
+        drone_id (int): 메시지 헤더에 실을 드론 번호, 서버는 이 번호로 세션을 찾음
+    """
+
+    def __init__(self, address="tcp://127.0.0.1:5580", queue_size=2,
+                 min_interval=0.2, jpeg_quality=95, drone_id=0):
+        self.address = address
+        self.drone_id = drone_id
+        self.min_interval = min_interval
+        self.jpeg_quality = jpeg_quality
+        self._queue = deque(maxlen=queue_size)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._last_publish = 0.
+        self._seq = 0
+        self.thread = None
+        self.counters = {
+            "queued": 0,
+            "sent": 0,
+            "rate_limited": 0,
+            "queue_dropped": 0,
+            "send_dropped": 0
+        }
+
+    def start(self):
+        """
+        PUB 소켓을 바인드하고 송신 스레드를 시작합니다. 바인드에 실패하면 예외가 그대로 전달됩니다.
+        """
+        context = zmq.Context()
+        socket_camera = context.socket(zmq.PUB)
+        socket_camera.setsockopt(zmq.SNDHWM, 2)
+        socket_camera.setsockopt(zmq.LINGER, 0)
+        try:
+            socket_camera.bind(self.address)
+        except zmq.ZMQError:
+            socket_camera.close()
+            context.term()
+            raise
+        self.thread = threading.Thread(
+            target=self._run, args=(context, socket_camera), daemon=True)
+        self.thread.start()
+
+    def publish(self, frame, flag=True, timestamp=None):
+        """
+        위험 프레임을 송신 큐에 넣습니다. 프레임은 복사하지 않으므로 호출 후 수정하면 안 됩니다.
+        큐에 넣었으면 True, 위험 상황이 아니거나 전송 간격 제한으로 버렸으면 False 를 반환합니다.
+        """
+        if not flag or frame is None:
+            return False
+        now = time.time()
+        with self._cond:
+            if self._closed:
+                return False
+            if now - self._last_publish < self.min_interval:
+                self.counters["rate_limited"] += 1
+                return False
+            self._last_publish = now
+            if len(self._queue) == self._queue.maxlen:
+                self.counters["queue_dropped"] += 1
+            self._queue.append((frame, timestamp or datetime.now(), flag))
+            self.counters["queued"] += 1
+            self._cond.notify()
+        return True
+
+    def encode(self, frame, timestamp, flag):
+        """
+        프레임을 JPEG 으로 인코딩해 protocol.camera_frame 형식의 multipart 메시지를 만듭니다.
+        """
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        _, buffer = cv2.imencode(
+            '.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        self._seq += 1
+        return build_camera_frame(
+            buffer, timestamp, warning=flag, seq=self._seq, drone_id=self.drone_id)
+
+    def _run(self, context, socket_camera):
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._queue or self._closed)
+                    if not self._queue:
+                        break
+                    frame, timestamp, flag = self._queue.popleft()
+                message = self.encode(frame, timestamp, flag)
+                try:
+                    # JPEG 버퍼는 복사 없이 전송
+                    socket_camera.send_multipart(
+                        message, flags=zmq.NOBLOCK, copy=False)
+                    sent = True
+                except zmq.Again:
+                    sent = False
+                with self._cond:
+                    self.counters["sent" if sent else "send_dropped"] += 1
+        finally:
+            socket_camera.close()
+            context.term()
+
+    def close(self, timeout=2):
+        """
+        남은 프레임을 송신한 뒤 스레드를 종료합니다.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counters)
+            stats["pending"] = len(self._queue)
+        return stats
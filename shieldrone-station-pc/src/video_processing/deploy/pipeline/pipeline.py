@@ -12,7 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import base64
 from datetime import datetime
 import json
 import os
@@ -23,30 +22,31 @@ import numpy as np
 import math
 import paddle
 import sys
-import copy
 import queue
-import time
-from collections import defaultdict
-import zmq
+import multiprocessing as mp
+from collections import deque
 
 # add deploy path of PaddleDetection to sys.path
 parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 2)))
 sys.path.insert(0, parent_path)
+# server.py 와 공유하는 메시지 형식(protocol) 경로
+src_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+sys.path.append(src_path)
 
 from datacollector import DataCollector, Result
 from cfg_utils import argsparser, print_arguments, merge_cfg
-from pipe_utils import PipeTimer, HandAboveHeadTracker, ResultSendHandler, VideoReceiverHandler
-from pipe_utils import crop_image_with_mot, parse_mot_res
+from pipe_utils import PipeTimer, HandAboveHeadTracker, KeypointTrackCache, ResultSendHandler, VideoReceiverHandler, FrameRingBuffer, DangerFramePublisher
+from pipe_utils import crop_rects_with_mot, visualize_video_frame
 from spatial_info_utils import SpatialInfoTracker
+from shm_utils import SharedDecodeTimer, SharedFrameRing, VisualizeStage, run_ingest_stage
 
 from python.keypoint_infer import KeyPointDetector
 from python.keypoint_postprocess import translate_to_ori_images
 from python.preprocess import decode_image
-from python.visualize import visualize_box_mask, visualize_pose
+from python.visualize import visualize_box_mask
 from python.drone_control import DroneController
 
-from pptracking.python.mot_sde_infer import SDE_Detector
-from pptracking.python.mot.visualize import plot_tracking_dict
+from pptracking.python.mot_sde_infer import SDE_Detector, as_mot_boxes
 from pptracking.python.mot.utils import flow_statistic
 
 from download import auto_download_model
@@ -182,10 +182,17 @@ class PipePredictor(object):
         self.secs_interval = args.secs_interval
 
         self.warmup_frame = self.cfg['warmup_frame']
+        # 수집/추론/시각화 단계를 별도 프로세스로 실행하고 공유 메모리로 프레임을 전달
+        self.multi_process = self.cfg.get('multi_process', False)
         self.pipeline_res = Result()
         self.pipe_timer = PipeTimer()
         self.file_name = None
-        self.collector = DataCollector()
+        # 장시간 실행 시 메모리가 계속 늘지 않도록 누적 결과의 보관 한도를 둠
+        retention_cfg = self.cfg.get('RETENTION', {})
+        self.records_size = retention_cfg.get('records', 100)
+        self.collector = DataCollector(
+            max_frames=retention_cfg.get('collector_max_frames'),
+            max_idle=retention_cfg.get('collector_max_idle'))
 
         # auto download inference model
         get_model_dir(self.cfg)
@@ -205,6 +212,10 @@ class PipePredictor(object):
             args.cpu_threads,
             args.enable_mkldnn,
             use_dark=False)
+        self.kpt_cache = KeypointTrackCache(
+            refresh_interval=kpt_cfg.get('refresh_interval', 5),
+            motion_thresh=kpt_cfg.get('motion_thresh', 0.2),
+            max_crops=kpt_cfg.get('max_crops', 0))
 
         mot_cfg = self.cfg['MOT']
         model_dir = mot_cfg['model_dir']
@@ -232,7 +243,13 @@ class PipePredictor(object):
         self.handAboveHeadTracker = HandAboveHeadTracker()
         self.target_id = None
         self.drone_controller = DroneController()
-        self.video_handler = VideoReceiverHandler(self.input_type,self.input_source)
+        input_cfg = self.cfg.get('INPUT', {})
+        self.video_handler = VideoReceiverHandler(
+            self.input_type,
+            self.input_source,
+            reassembly_timeout=input_cfg.get('reassembly_timeout', 0.2),
+            decode_workers=input_cfg.get('decode_workers', 2),
+            pipe_timer=self.pipe_timer)
         self.spatial_info_tracker = SpatialInfoTracker()
         # TODO : arg로 변경
         # 앱서버의 ip와 port로 변경하고 사용
@@ -291,39 +308,6 @@ class PipePredictor(object):
             if self.cfg['visual']:
                 self.visualize_image(batch_file, batch_input, self.pipeline_res)
 
-    def send_danger_signal(self, socket, frame=None, flag=False):
-        """
-        위험 상황 발생 시 메시지를 전송합니다.
-        """
-
-        if flag:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            _, buffer = cv2.imencode('.jpg', frame)
-            
-            frame_encoded = base64.b64encode(buffer).decode('utf-8')
-            message = json.dumps({
-                "type": "sendCameraFlag",
-                "time": datetime.now().isoformat(),
-                "warningFlag": flag,
-                "frame": frame_encoded
-            })
-
-            max_retries = 5  # 최대 재시도 횟수
-            retry_count = 0
-
-            while retry_count < max_retries:
-                try:
-                    socket.send_string(message)
-                    print("경고 메시지를 성공적으로 전송했습니다.")
-                    break  # 성공적으로 전송하면 루프 종료
-                except zmq.Again:
-                    print("소켓이 일시적으로 사용 불가능합니다. 재시도 중...")
-                    retry_count += 1
-                    time.sleep(0.1)  # 재시도 전 대기 시간 설정
-
-            if retry_count == max_retries:
-                print("여러 번 시도했지만 메시지 전송에 실패했습니다.")
-
     def send_flight_info(self, send_socket, info):
         message = json.dumps({
             "time": datetime.now().isoformat(),
@@ -343,19 +327,20 @@ class PipePredictor(object):
         in_id_list = list()
         out_id_list = list()
         prev_center = dict()
-        records = list()
-
-        framequeue = queue.Queue(10)
-        frame_height, frame_width = self.video_handler.prepare_video(framequeue)
+        # 시각화에는 마지막 통계만 쓰이므로 최근 records_size 개만 보관
+        records = deque(maxlen=self.records_size)
+
+        input_cfg = self.cfg.get('INPUT', {})
+        # 파일 입력은 모든 프레임을 순서대로 처리해야 하므로 항상 fifo 사용
+        frame_policy = 'fifo' if self.input_type == "file" else input_cfg.get(
+            'frame_policy', 'latest')
+        framebuffer = FrameRingBuffer(
+            input_cfg.get('frame_buffer_size', 10), frame_policy)
+        frame_height, frame_width = self.video_handler.prepare_video(framebuffer)
         print(frame_height, frame_width)
         video_fps = self.video_handler.fps
         self.drone_controller.init(self.video_handler.width, self.video_handler.height)
         self.spatial_info_tracker.lazy_init(self.video_handler.width, self.video_handler.height)
-        self.video_handler.start_video(framequeue)
-
-        resultqueue = queue.Queue(10)
-        self.res_sender.startSending(resultqueue)
-
 
         if self.cfg['visual']:
             video_out_name = 'output' if (
@@ -364,28 +349,73 @@ class PipePredictor(object):
             if not os.path.exists(self.output_dir):
                 os.makedirs(self.output_dir)
             out_path = os.path.join(self.output_dir, video_out_name + ".mp4")
+
+        ingest_process = None
+        decode_timer = None
+        visual_stage = None
+        if self.multi_process:
+            # spawn 으로 생성해 추론 프로세스의 CUDA/스레드 상태를 물려받지 않도록 함
+            mp_ctx = mp.get_context('spawn')
+            framebuffer = SharedFrameRing(
+                (self.video_handler.height, self.video_handler.width, 3),
+                num_slots=input_cfg.get('shm_slots', 6),
+                policy=frame_policy,
+                ctx=mp_ctx)
+            # 수집 프로세스의 디코딩 시간은 공유 카운터로 돌려받음
+            decode_timer = SharedDecodeTimer(ctx=mp_ctx)
+            ingest_process = mp_ctx.Process(
+                target=run_ingest_stage,
+                args=(self.video_handler, framebuffer, decode_timer),
+                daemon=True)
+            ingest_process.start()
+            if self.cfg['visual']:
+                visual_stage = VisualizeStage(
+                    framebuffer,
+                    self.mot_predictor.pred_config.labels,
+                    (self.video_handler.width, self.video_handler.height),
+                    out_path=out_path if self.input_type == "file" else None,
+                    video_fps=video_fps,
+                    draw_center_traj=self.draw_center_traj,
+                    ctx=mp_ctx)
+                visual_stage.start()
+        else:
+            self.video_handler.start_video(framebuffer)
+
+        resultqueue = queue.Queue(10)
+        self.res_sender.startSending(resultqueue)
+
+        if self.cfg['visual'] and visual_stage is None:
             fourcc = cv2.VideoWriter_fourcc(* 'mp4v')
             writer = cv2.VideoWriter(out_path, fourcc, video_fps, (self.video_handler.width, self.video_handler.height))
 
-        context = zmq.Context()
-        socket_camera = context.socket(zmq.PUB)
-        socket_camera.bind("tcp://127.0.0.1:5580")  # 송신자 주소를 지정 (예: 포트 5555)
-        socket_camera.setsockopt(zmq.SNDTIMEO, 5000)  # 5초 타임아웃 설정
+        # 위험 프레임 인코딩/송신은 별도 스레드에서 수행 (추론 루프를 막지 않음)
+        danger_cfg = self.cfg.get('DANGER', {})
+        danger_publisher = DangerFramePublisher(
+            address=danger_cfg.get('address', "tcp://127.0.0.1:5580"),
+            queue_size=danger_cfg.get('queue_size', 2),
+            min_interval=danger_cfg.get('min_interval', 0.2),
+            jpeg_quality=danger_cfg.get('jpeg_quality', 95),
+            drone_id=danger_cfg.get('drone_id', 0))
+        danger_publisher.start()
 
         no_detected_target_frames = 0
         target_prev_bbox = None
         while (1):
-            if framequeue.empty():
-                if self.input_type == "file":
-                    break
-                time.sleep(0.01)
-                continue
-                
+            # 새 프레임이 들어올 때까지 대기, 입력이 종료되면 None
+            frame_data = framebuffer.get()
+            if frame_data is None:
+                break
+
             if frame_id % 10 == 0:
                 print('Thread: {}; frame id: {}'.format(thread_idx, frame_id))
+                print('Thread: {}; frame buffer: {}'.format(
+                    thread_idx, framebuffer.stats()))
 
-            frame_data = framequeue.get()
             frame_rgb = frame_data["frame"]
+            # 시각화 프로세스로 넘길 그리기 정보
+            vis_control = None
+            vis_spatial_info = None
+            vis_other_bboxes = None
 
             # 프레임 크기 축소
             scale_percent = 20
@@ -402,18 +432,12 @@ class PipePredictor(object):
             if frame_id > self.warmup_frame:
                 self.pipe_timer.module_time['mot'].start()
 
-            mot_skip_frame_num = self.mot_predictor.skip_frame_num
-            reuse_det_result = False
-            if mot_skip_frame_num > 1 and frame_id > 0 and frame_id % mot_skip_frame_num > 0:
-                reuse_det_result = True
-            res = self.mot_predictor.predict_image(
-                [copy.deepcopy(frame_rgb)],
-                visual=False,
-                reuse_det_result=reuse_det_result,
-                frame_count=frame_id)
+            # 프레임을 복사하지 않고 추적, skip_frame_num 에 따른 검출 재사용은 스트림 상태로 판단
+            mot_out = self.mot_predictor.track_frame(frame_rgb)
 
             # mot output format: id, class, score, xmin, ymin, xmax, ymax
-            mot_res = parse_mot_res(res)
+            # (track_frame 결과 버퍼를 복사 없이 [N, 7] 배열로 본 것, 다음 프레임에서 덮어씀)
+            mot_res = {'boxes': as_mot_boxes(mot_out)}
 
             if frame_id > self.warmup_frame:
                 self.pipe_timer.module_time['mot'].end()
@@ -424,9 +448,8 @@ class PipePredictor(object):
                     thread_idx, len(mot_res['boxes'])))
 
             # flow_statistic only support single class MOT
-            boxes, scores, ids = res[0]  # batch size = 1 in MOT
-            mot_result = (frame_id + 1, boxes[0], scores[0],
-                            ids[0])  # single class
+            mot_result = (frame_id + 1, mot_res['boxes'][:, 3:], mot_out['score'],
+                            mot_out['id'])  # single class, 박스는 개수만 사용
             statistic = flow_statistic(
                 mot_result,
                 self.secs_interval,
@@ -450,16 +473,25 @@ class PipePredictor(object):
                     if no_detected_target_frames <= self.target_frame_tolerance:
                         no_detected_target_frames+=1
                         self.drone_controller.adjust_drone(target_prev_bbox)
-                        self.drone_controller.visualize_control(frame_rgb)
                         control_res = self.drone_controller.get_control_value()
                         resultqueue.put(control_res.get())
+                        if visual_stage is not None:
+                            vis_control = control_res.get()
+                        else:
+                            self.drone_controller.visualize_control(frame_rgb)
                     else:
                         self.target_id=None
                         self.drone_controller.control_value.init_zero()
                         no_detected_target_frames=0
                         target_prev_bbox=None
                         resultqueue.put(self.drone_controller.get_control_value().get())
-                if self.cfg['visual']:
+                if visual_stage is not None:
+                    visual_stage.submit(
+                        frame_data, mot_res, frame_id, self.video_handler.fps,
+                        self.target_id, records, control=vis_control)
+                    if visual_stage.stopped:
+                        break
+                elif self.cfg['visual']:
                     im = self.visualize_video(
                         frame_rgb, mot_res, frame_id, self.video_handler.fps, records, center_traj,  latency = frame_time)  # visualize
                     if self.input_type=="file":
@@ -487,19 +519,34 @@ class PipePredictor(object):
                 else:
                     no_detected_target_frames=0
             if self.target_id is None:
-                crop_input, new_bboxes, ori_bboxes = crop_image_with_mot(
-                    frame_rgb, mot_res)
+                new_bboxes, ori_bboxes, keep = crop_rects_with_mot(
+                    frame_rgb.shape, mot_res)
                 if frame_id > self.warmup_frame:
                     self.pipe_timer.module_time['kpt'].start()
-                kpt_pred = self.kpt_predictor.predict_image(
-                crop_input, visual=False)
-                self.target_id = self.handAboveHeadTracker.update(kpt_pred, mot_res)
+                # 캐시가 없거나 오래되었거나 움직인 트랙만 키포인트 추론
+                track_ids = mot_res['boxes'][keep, 0].astype(int)
+                infer_idx = self.kpt_cache.select(
+                    frame_id, track_ids, ori_bboxes,
+                    self.handAboveHeadTracker.holding_ids)
+                if len(infer_idx) > 0:
+                    # 사람 영역을 원본 프레임에서 바로 모델 입력 배치로 변환
+                    kpt_new = self.kpt_predictor.predict_crops(
+                        frame_rgb, new_bboxes[infer_idx])
+                    self.kpt_cache.update(frame_id, track_ids[infer_idx],
+                                          [ori_bboxes[i] for i in infer_idx],
+                                          new_bboxes[infer_idx], kpt_new)
+                kpt_pred = self.kpt_cache.gather(track_ids)
+                self.target_id = self.handAboveHeadTracker.update(
+                    kpt_pred, {'boxes': mot_res['boxes'][keep]})
+                if self.target_id is not None:
+                    self.kpt_cache.clear()
                 if frame_id > self.warmup_frame:
                     self.pipe_timer.module_time['kpt'].end()
                 
                 if self.cfg['visual']:
+                    # 캐시된 결과는 추론 당시의 crop 영역 기준으로 원본 좌표로 옮김
                     keypoint_vector, score_vector = translate_to_ori_images(
-                        kpt_pred, np.array(new_bboxes))
+                        kpt_pred, kpt_pred['rect'])
                     kpt_res = {}
                     kpt_res['keypoint'] = [
                         keypoint_vector.tolist(), score_vector.tolist()
@@ -519,24 +566,28 @@ class PipePredictor(object):
                 other_mot_res = boxes[boxes[:, 0].astype(int) != self.target_id]
 
                 self.drone_controller.adjust_drone(target_mot_res)
-                self.drone_controller.visualize_control(frame_rgb)
                 control_res = self.drone_controller.get_control_value()
                 resultqueue.put(control_res.get())
+                if visual_stage is None:
+                    self.drone_controller.visualize_control(frame_rgb)
 
-                spatial_info = self.spatial_info_tracker.run(target_mot_res, other_mot_res, self.video_handler.fps)
-                is_danger = False
-                for other_id, info in spatial_info["others"].items():
-                    if info["is_near"] and info["getting_closer_quickly"]:
-                        is_danger = True
-                        break
-                self.send_danger_signal(socket_camera, origin_frame, is_danger)
+                spatial_info = self.spatial_info_tracker.run(
+                    target_mot_res, other_mot_res, self.video_handler.fps,
+                    target_visible=no_detected_target_frames == 0)
+                is_danger = self.spatial_info_tracker.is_danger(spatial_info)
+                danger_publisher.publish(origin_frame, is_danger)
 
                 # if (frame_id//50)%2==0:
-                #     self.send_danger_signal(socket_camera, frame_rgb, True)
+                #     danger_publisher.publish(frame_rgb, True)
                 # else:
-                #     self.send_danger_signal(socket_camera, frame_rgb, False)
+                #     danger_publisher.publish(frame_rgb, False)
                 
-                self.spatial_info_tracker.visualize(frame_rgb, spatial_info, other_mot_res)
+                if visual_stage is not None:
+                    vis_control = control_res.get()
+                    vis_spatial_info = spatial_info
+                    vis_other_bboxes = other_mot_res
+                else:
+                    self.spatial_info_tracker.visualize(frame_rgb, spatial_info, other_mot_res)
                 target_prev_bbox = target_mot_res
 
 
@@ -547,7 +598,21 @@ class PipePredictor(object):
 
             frame_id += 1
 
-            if self.cfg['visual']:
+            if visual_stage is not None:
+                _, _, fps = self.pipe_timer.get_total_time()
+                visual_stage.submit(
+                    frame_data,
+                    self.pipeline_res,
+                    frame_id,
+                    fps,
+                    self.target_id,
+                    records,
+                    control=vis_control,
+                    spatial_info=vis_spatial_info,
+                    other_bboxes=vis_other_bboxes)
+                if visual_stage.stopped:
+                    break
+            elif self.cfg['visual']:
                 _, _, fps = self.pipe_timer.get_total_time()
 
                 im = self.visualize_video(frame_rgb, self.pipeline_res,
@@ -560,12 +625,19 @@ class PipePredictor(object):
                 if cv2.waitKey(1) & 0xFF == ord('q'):
                     break
 
-        socket_camera.close()
-        context.term()
+        framebuffer.close()
+        danger_publisher.close()
+        print('danger publisher: {}'.format(danger_publisher.stats()))
 
-        if self.cfg['visual']:
+        if visual_stage is not None:
+            visual_stage.close()
+        elif self.cfg['visual']:
             writer.release()
             print('save result to {}'.format(out_path))
+        if ingest_process is not None:
+            ingest_process.join(5)
+            framebuffer.unlink()
+            decode_timer.merge(self.pipe_timer)
 
     def visualize_video(self,
                         image_rgb,
@@ -575,74 +647,16 @@ class PipePredictor(object):
                         records=None,
                         center_traj=None,
                         latency=None):
-        image = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
-        mot_res = copy.deepcopy(result.get('mot'))
-
-        if mot_res is not None:
-            ids = mot_res['boxes'][:, 0]
-            scores = mot_res['boxes'][:, 2]
-            boxes = mot_res['boxes'][:, 3:]
-            boxes[:, 2] = boxes[:, 2] - boxes[:, 0]
-            boxes[:, 3] = boxes[:, 3] - boxes[:, 1]
-        else:
-            boxes = np.zeros([0, 4])
-            ids = np.zeros([0])
-            scores = np.zeros([0])
-
-        # single class, still need to be defaultdict type for ploting
-        num_classes = 1
-        online_tlwhs = defaultdict(list)
-        online_scores = defaultdict(list)
-        online_ids = defaultdict(list)
-        online_tlwhs[0] = boxes
-        online_scores[0] = scores
-        online_ids[0] = ids
-
-        if mot_res is not None:
-            image = plot_tracking_dict(
-                image,
-                num_classes,
-                online_tlwhs,
-                online_ids,
-                online_scores,
-                frame_id=frame_id,
-                fps=fps,
-                ids2names=self.mot_predictor.pred_config.labels,
-                records=records,
-                center_traj=center_traj,
-                target_id=self.target_id)
-
-        kpt_res = result.get('kpt')
-        if kpt_res is not None:
-            image = visualize_pose(
-                image,
-                kpt_res,
-                # visual_thresh=self.cfg['kpt_thresh'],
-                returnimg=True)
-        
-        if latency:
-            # 이미지에 텍스트 표시
-            # 이미지 처리 후 우상단에 레이턴시 표시
-            latency = time.time() - latency
-            text = f"Latency: {latency:.2f} sec"
-
-            # 이미지 크기 가져오기
-            height, width, _ = image.shape
-
-            # 텍스트 표시할 위치를 오른쪽 상단으로 설정
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 1
-            font_color = (0, 255, 0)  # 녹색
-            thickness = 2
-
-            # 텍스트 크기 계산
-            (text_width, text_height), _ = cv2.getTextSize(text, font, font_scale, thickness)
-            position = (width - text_width - 10, text_height + 10)  # 오른쪽 상단에서 약간의 여백을 줌
-
-            # 이미지에 텍스트 표시
-            cv2.putText(image, text, position, font, font_scale, font_color, thickness)
-
-        return image
+        return visualize_video_frame(
+            image_rgb,
+            result,
+            frame_id,
+            fps,
+            self.mot_predictor.pred_config.labels,
+            target_id=self.target_id,
+            records=records,
+            center_traj=center_traj,
+            latency=latency)
 
     def visualize_image(self, im_files, images, result):
         start_idx, boxes_num_i = 0, 0
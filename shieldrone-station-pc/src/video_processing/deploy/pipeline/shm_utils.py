@@ -0,0 +1,415 @@
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from pipe_utils import visualize_video_frame
+from spatial_info_utils import SpatialInfoTracker
+from python.drone_control import DroneController
+
+# 슬롯 상태
+SLOT_FREE = 0
+SLOT_WRITING = 1
+SLOT_READY = 2
+SLOT_HELD = 3
+SLOT_HANDOFF = 4
+
+# 공유 카운터 인덱스
+_SEQ, _PUT, _GET, _DROPPED, _CLOSED = range(5)
+
+
+class SharedFrameRing(object):
+    """
+    프로세스 간에 프레임을 복사 없이 주고받기 위한 공유 메모리 링 버퍼.
+
+    FrameRingBuffer 와 같은 put/get/close 인터페이스를 제공하므로 VideoReceiverHandler 의
+    수집 함수에 그대로 넘길 수 있습니다. 프레임 데이터는 multiprocessing.shared_memory 에 있고,
+    프로세스 사이에는 슬롯 번호와 상태만 오갑니다.
+
+    슬롯 소유권:
+        FREE -> WRITING(수집) -> READY -> HELD(추론) -> FREE
+                                           HELD -> HANDOFF(시각화) -> FREE
+
+    Args:
+        shape (tuple): 프레임 shape (H, W, 3), 크기가 다른 프레임은 슬롯 크기로 리사이즈
+        num_slots (int): 슬롯 수
+        policy (str): 'latest' 또는 'fifo'
+        capacity (int): fifo 정책에서 대기 가능한 최대 프레임 수
+        ctx: multiprocessing context
+    """
+
+    POLICIES = ('latest', 'fifo')
+
+    def __init__(self, shape, num_slots=6, policy='latest', capacity=None,
+                 ctx=None):
+        assert policy in self.POLICIES, \
+            "policy should be one of {}".format(self.POLICIES)
+        ctx = ctx or mp.get_context()
+        self.shape = tuple(int(x) for x in shape)
+        self.policy = policy
+        self.num_slots = int(num_slots)
+        if policy == 'latest':
+            self.capacity = 1
+        else:
+            self.capacity = capacity or self.num_slots - 2
+        assert self.num_slots >= self.capacity + 2, \
+            "num_slots should be larger than capacity + 1"
+
+        frame_size = int(np.prod(self.shape))
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=frame_size * self.num_slots)
+        self._owner = True
+        self._state = ctx.RawArray('i', self.num_slots)
+        self._seqs = ctx.RawArray('q', self.num_slots)
+        self._times = ctx.RawArray('d', self.num_slots)
+        self._counters = ctx.RawArray('q', 5)
+        self._cond = ctx.Condition()
+        self._held = None
+        self._attach()
+
+    def _attach(self):
+        self._frames = np.ndarray(
+            (self.num_slots, ) + self.shape,
+            dtype=np.uint8,
+            buffer=self._shm.buf)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_frames'] = None
+        state['_owner'] = False
+        state['_held'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
+
+    def frame(self, slot):
+        """
+        슬롯의 프레임 뷰 (복사 없음)
+        """
+        return self._frames[slot]
+
+    @property
+    def closed(self):
+        return self._counters[_CLOSED] != 0
+
+    def _slots_in(self, state):
+        slots = [i for i in range(self.num_slots) if self._state[i] == state]
+        return sorted(slots, key=lambda i: self._seqs[i])
+
+    def put(self, frame, input_time=None, block=False):
+        """
+        프레임을 빈 슬롯에 기록합니다. 반환값은 FrameRingBuffer.put 과 같습니다.
+        모든 슬롯을 다른 단계가 점유 중이면 들어온 프레임을 버립니다.
+        fifo 정책에서 block=True 이면 대기 자리와 빈 슬롯이 모두 생길 때까지 기다리므로 프레임을 버리지 않습니다.
+        """
+        if input_time is None:
+            input_time = time.time()
+        dropped = 0
+        with self._cond:
+            if self.closed:
+                return -1
+            if self.policy == 'fifo' and block:
+                # 추론/시각화 단계가 슬롯을 모두 점유하고 있으면 반환될 때까지 대기
+                self._cond.wait_for(
+                    lambda: (len(self._slots_in(SLOT_READY)) < self.capacity
+                             and self._slots_in(SLOT_FREE)) or self.closed)
+                if self.closed:
+                    return -1
+            ready = self._slots_in(SLOT_READY)
+            while len(ready) >= self.capacity:
+                self._state[ready.pop(0)] = SLOT_FREE
+                dropped += 1
+            free = self._slots_in(SLOT_FREE)
+            if not free:
+                self._counters[_DROPPED] += dropped + 1
+                return dropped + 1
+            slot = free[0]
+            self._state[slot] = SLOT_WRITING
+            self._counters[_SEQ] += 1
+            seq = self._counters[_SEQ]
+
+        # WRITING 상태의 슬롯은 수집 단계만 접근하므로 잠금 밖에서 기록
+        dst = self._frames[slot]
+        if frame.shape == self.shape:
+            np.copyto(dst, frame)
+        else:
+            cv2.resize(frame, (self.shape[1], self.shape[0]), dst=dst)
+
+        with self._cond:
+            self._seqs[slot] = seq
+            self._times[slot] = input_time
+            self._state[slot] = SLOT_READY
+            self._counters[_PUT] += 1
+            self._counters[_DROPPED] += dropped
+            self._cond.notify_all()
+        return dropped
+
+    def get(self, timeout=None):
+        """
+        가장 오래된 READY 슬롯을 점유하고 {"frame", "inputTime", "seq", "slot"} 을 반환합니다.
+        이전에 점유한 슬롯은 handoff() 되지 않았다면 자동으로 반환됩니다.
+        """
+        with self._cond:
+            self._release_held_locked()
+            if not self._cond.wait_for(
+                    lambda: self._slots_in(SLOT_READY) or self.closed,
+                    timeout):
+                return None
+            ready = self._slots_in(SLOT_READY)
+            if not ready:
+                return None
+            slot = ready[0]
+            self._state[slot] = SLOT_HELD
+            self._held = slot
+            self._counters[_GET] += 1
+            self._cond.notify_all()
+            return {
+                "frame": self._frames[slot],
+                "inputTime": self._times[slot],
+                "seq": self._seqs[slot],
+                "slot": slot
+            }
+
+    def _release_held_locked(self):
+        if self._held is not None:
+            self._state[self._held] = SLOT_FREE
+            self._held = None
+            self._cond.notify_all()
+
+    def handoff(self, slot):
+        """
+        점유 중인 슬롯의 소유권을 다음 단계(시각화)로 넘깁니다.
+        넘겨받은 단계는 사용 후 release(slot) 을 호출해야 합니다.
+        """
+        with self._cond:
+            self._state[slot] = SLOT_HANDOFF
+            if self._held == slot:
+                self._held = None
+
+    def release(self, slot=None):
+        with self._cond:
+            if slot is None:
+                self._release_held_locked()
+                return
+            self._state[slot] = SLOT_FREE
+            if self._held == slot:
+                self._held = None
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._counters[_CLOSED] = 1
+            self._cond.notify_all()
+
+    def unlink(self):
+        """
+        공유 메모리를 해제합니다. 생성한 프로세스에서만 호출합니다.
+        """
+        self._frames = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # 아직 프레임 뷰를 참조하는 객체가 남아 있으면 매핑은 프로세스 종료 시 해제됨
+            pass
+        if self._owner:
+            self._shm.unlink()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "pending": len(self._slots_in(SLOT_READY)),
+                "handoff": len(self._slots_in(SLOT_HANDOFF)),
+                "put": self._counters[_PUT],
+                "get": self._counters[_GET],
+                "dropped": self._counters[_DROPPED]
+            }
+
+
+class SharedDecodeTimer(object):
+    """
+    수집 프로세스의 JPEG 디코딩 시간을 추론 프로세스의 PipeTimer 로 전달하는 공유 카운터.
+
+    spawn 으로 넘어간 VideoReceiverHandler 의 PipeTimer 는 자식 프로세스의 복사본이므로,
+    수집 프로세스에서는 이 카운터에 누적하고 종료 후 merge() 로 부모의 PipeTimer 에 더합니다.
+
+    Args:
+        ctx: multiprocessing context
+    """
+
+    def __init__(self, ctx=mp):
+        self.elapsed = ctx.Value('d', 0., lock=True)
+        self.count = ctx.Value('q', 0, lock=False)
+
+    def add_decode_time(self, elapsed):
+        # 디코더 스레드에서 호출됨, count 도 elapsed 의 잠금으로 보호
+        with self.elapsed.get_lock():
+            self.elapsed.value += elapsed
+            self.count.value += 1
+
+    def merge(self, pipe_timer):
+        """
+        누적된 디코딩 시간을 pipe_timer 에 더하고 카운터를 비웁니다.
+        """
+        with self.elapsed.get_lock():
+            elapsed, count = self.elapsed.value, self.count.value
+            self.elapsed.value = 0.
+            self.count.value = 0
+        pipe_timer.module_time['decode'].add(elapsed)
+        pipe_timer.decode_num += count
+
+
+def run_ingest_stage(video_handler, ring, decode_timer=None):
+    """
+    수집 프로세스: 입력 소스에서 프레임을 읽어 공유 메모리 슬롯에 기록합니다.
+    decode_timer 가 있으면 디코딩 시간을 자식 프로세스의 PipeTimer 대신 여기에 누적합니다.
+    """
+    if decode_timer is not None:
+        video_handler.pipe_timer = decode_timer
+    capture = {
+        "file": video_handler.capture_video,
+        "camera": video_handler.capture_webcam,
+        "udp": video_handler.receive_frames
+    }[video_handler.input_type]
+    video_handler.start_time = time.time()
+    capture(ring)
+
+
+def run_visualize_stage(ring, msg_queue, pending, stop_event, labels,
+                        frame_size, out_path=None, video_fps=30,
+                        draw_center_traj=False):
+    """
+    시각화 프로세스: 추론 결과를 받아 슬롯의 프레임 위에 그리고 화면 출력 및 녹화를 수행합니다.
+    """
+    width, height = frame_size
+    writer = None
+    if out_path is not None:
+        fourcc = cv2.VideoWriter_fourcc(* 'mp4v')
+        writer = cv2.VideoWriter(out_path, fourcc, video_fps, (width, height))
+    drone_controller = DroneController()
+    drone_controller.init(width, height)
+    spatial_info_tracker = SpatialInfoTracker()
+    center_traj = [{}] if draw_center_traj else None
+
+    try:
+        while True:
+            msg = msg_queue.get()
+            if msg is None:
+                break
+            slot = msg["slot"]
+            try:
+                frame_rgb = ring.frame(slot)
+                control = msg.get("control")
+                if control is not None:
+                    control = dict(control)
+                    control.pop("is_locked", None)
+                    drone_controller.control_value.update(**control)
+                    drone_controller.visualize_control(frame_rgb)
+                if msg.get("spatial_info") is not None:
+                    spatial_info_tracker.visualize(
+                        frame_rgb, msg["spatial_info"], msg["other_bboxes"])
+
+                im = visualize_video_frame(
+                    frame_rgb,
+                    msg["result"],
+                    msg["frame_id"],
+                    msg["fps"],
+                    labels,
+                    target_id=msg["target_id"],
+                    records=msg["records"],
+                    center_traj=center_traj,
+                    latency=msg["inputTime"])
+            finally:
+                ring.release(slot)
+                with pending.get_lock():
+                    pending.value -= 1
+
+            if writer is not None:
+                writer.write(im)
+            cv2.imshow('Paddle-Pipeline', im)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                stop_event.set()
+    finally:
+        if writer is not None:
+            writer.release()
+            print('save result to {}'.format(out_path))
+        cv2.destroyAllWindows()
+
+
+class VisualizeStage(object):
+    """
+    시각화/녹화를 별도 프로세스에서 수행하고, 추론 루프와는 슬롯 번호와 결과만 주고받습니다.
+
+    시각화가 밀려 있으면 해당 프레임은 시각화를 건너뛰므로 제어 루프가 렌더링을 기다리지 않습니다.
+
+    Args:
+        ring (SharedFrameRing): 추론 단계와 공유하는 프레임 링 버퍼
+        labels (list): 클래스 이름
+        frame_size (tuple): (width, height)
+        out_path (str): 녹화 파일 경로, None 이면 녹화하지 않음
+        max_pending (int): 시각화 대기 가능한 최대 프레임 수
+    """
+
+    def __init__(self, ring, labels, frame_size, out_path=None, video_fps=30,
+                 draw_center_traj=False, max_pending=2, ctx=None):
+        ctx = ctx or mp.get_context()
+        self.ring = ring
+        self.max_pending = max_pending
+        self._queue = ctx.Queue()
+        self._pending = ctx.Value('i', 0)
+        self._stop_event = ctx.Event()
+        self.skipped = 0
+        self._process = ctx.Process(
+            target=run_visualize_stage,
+            args=(ring, self._queue, self._pending, self._stop_event, labels,
+                  frame_size, out_path, video_fps, draw_center_traj),
+            daemon=True)
+
+    def start(self):
+        self._process.start()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set() or not self._process.is_alive()
+
+    def submit(self, frame_data, result, frame_id, fps, target_id,
+               records=None, control=None, spatial_info=None,
+               other_bboxes=None):
+        """
+        프레임 슬롯을 시각화 단계로 넘깁니다. 시각화가 밀려 있으면 False 를 반환합니다.
+        """
+        with self._pending.get_lock():
+            if self._pending.value >= self.max_pending:
+                self.skipped += 1
+                return False
+            self._pending.value += 1
+        if not isinstance(result, dict):
+            result = {'mot': result.get('mot'), 'kpt': result.get('kpt')}
+        # 큐는 별도 스레드에서 직렬화하므로, 다음 프레임에 재사용되는 추적 결과 버퍼는 복사해서 넘김
+        if result.get('mot') is not None:
+            result = dict(result, mot={'boxes': np.array(result['mot']['boxes'])})
+        slot = frame_data["slot"]
+        self.ring.handoff(slot)
+        self._queue.put({
+            "slot": slot,
+            "inputTime": frame_data["inputTime"],
+            "result": result,
+            "frame_id": frame_id,
+            "fps": fps,
+            "target_id": target_id,
+            "records": [records[-1]] if records else None,
+            "control": control,
+            "spatial_info": spatial_info,
+            "other_bboxes": other_bboxes
+        })
+        return True
+
+    def close(self, timeout=5):
+        self._queue.put(None)
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
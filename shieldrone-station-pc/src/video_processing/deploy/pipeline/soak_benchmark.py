@@ -0,0 +1,249 @@
+"""
+장시간 스트림에서 파이프라인 후처리 단계의 메모리와 프레임당 지연 시간이 일정하게 유지되는지 확인하는 soak 벤치마크.
+
+모델 추론 없이 사람들이 계속 들어오고 나가는 합성 검출 결과를 만들어
+트래커 -> flow_statistic -> DataCollector -> KeypointTrackCache -> SpatialInfoTracker -> 궤적 시각화
+순서로 여러 시간 분량의 프레임을 재생하고, 구간별 RSS 와 프레임당 지연 시간을 기록합니다.
+
+deploy 디렉터리에서 실행합니다:
+    python pipeline/soak_benchmark.py --hours 2
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'] * 2)))
+sys.path.insert(0, parent_path)
+# pipe_utils 가 사용하는 메시지 형식(protocol) 경로
+src_path = os.path.abspath(os.path.join(__file__, *(['..'] * 4)))
+sys.path.append(src_path)
+
+from datacollector import DataCollector, Result
+from pipe_utils import KeypointTrackCache
+from spatial_info_utils import SpatialInfoTracker
+from pptracking.python.mot.tracker import BOTSORTTracker, JDETracker, OCSORTTracker
+from pptracking.python.mot.utils import flow_statistic
+from pptracking.python.mot.visualize import plot_tracking_dict
+
+TRACKERS = {
+    'BOTSORTTracker': BOTSORTTracker,
+    'OCSORTTracker': OCSORTTracker,
+    'JDETracker': JDETracker,
+}
+
+
+def read_rss_mb():
+    """
+    현재 프로세스의 RSS(MB). /proc 이 없으면 최대 RSS 를 대신 반환합니다.
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class SyntheticCrowd(object):
+    """
+    사람 people 명이 화면 안을 걸어다니고, 수명이 다하면 새 사람으로 교체되는 합성 검출 스트림.
+    교체될 때마다 트래커에는 새 트랙 id 가 생기므로 id 가 계속 늘어나는 장시간 스트림을 흉내냅니다.
+
+    Args:
+        people (int): 동시에 화면에 있는 사람 수
+        width (int): 프레임 폭
+        height (int): 프레임 높이
+        fps (int): 프레임 속도
+        life (tuple): 사람 한 명이 머무는 시간 범위(초)
+    """
+
+    def __init__(self, people=20, width=1920, height=1080, fps=30,
+                 life=(5, 60), seed=0):
+        self.rng = np.random.RandomState(seed)
+        self.width, self.height, self.fps = width, height, fps
+        self.life = life
+        self.size = np.array([60., 150.])
+        self.pos = np.zeros((people, 2))
+        self.vel = np.zeros((people, 2))
+        self.remain = np.zeros(people, dtype=np.int64)
+        self.spawned = 0
+        self.respawn(np.arange(people))
+
+    def respawn(self, idx):
+        n = len(idx)
+        self.pos[idx] = self.rng.uniform(
+            [100, 100], [self.width - 100, self.height - 200], size=(n, 2))
+        self.vel[idx] = self.rng.uniform(-2, 2, size=(n, 2))
+        self.remain[idx] = self.rng.randint(
+            self.life[0] * self.fps, self.life[1] * self.fps, size=n)
+        self.spawned += n
+
+    def step(self):
+        """
+        다음 프레임의 검출 결과 [N, 6] (cls_id, score, x0, y0, x1, y1) 를 반환합니다.
+        """
+        self.remain -= 1
+        expired = np.flatnonzero(self.remain <= 0)
+        if len(expired):
+            self.respawn(expired)
+        self.pos += self.vel
+        # 화면 밖으로 나가면 방향을 바꿈
+        bounce = (self.pos < 0) | (self.pos > [self.width, self.height] - self.size)
+        self.vel[bounce] *= -1
+        tl = self.pos + self.rng.normal(0, 1.0, size=self.pos.shape)
+        dets = np.empty((len(tl), 6), dtype=np.float32)
+        dets[:, 0] = 0
+        dets[:, 1] = self.rng.uniform(0.6, 0.95, size=len(tl))
+        dets[:, 2:4] = tl
+        dets[:, 4:6] = tl + self.size
+        return dets
+
+
+def tracker_boxes(tracker, online_targets):
+    """
+    트래커 출력을 mot_res['boxes'] 형식 [M, 7] (id, cls_id, score, x1, y1, x2, y2) 로 변환합니다.
+    """
+    if isinstance(tracker, OCSORTTracker):
+        out = np.asarray(online_targets, dtype=np.float32).reshape(-1, 6)
+        return np.concatenate(
+            [out[:, 5:6], np.zeros((len(out), 1)), out[:, 4:5], out[:, :4]],
+            axis=1)
+    if isinstance(tracker, JDETracker):
+        online_targets = online_targets[0]
+    boxes = [[t.track_id, 0, t.score, *t.tlbr] for t in online_targets]
+    return np.asarray(boxes, dtype=np.float32).reshape(-1, 7)
+
+
+def latency_trend(values):
+    """
+    구간별 지연 시간의 구간당 기울기. 쌍별 기울기의 중앙값(Theil-Sen)이라 튀는 구간 몇 개에 흔들리지 않습니다.
+    """
+    i, j = np.triu_indices(len(values), k=1)
+    if len(i) == 0:
+        return 0.
+    return float(np.median((values[j] - values[i]) / (j - i)))
+
+
+def benchmark_soak(hours=2.0,
+                   fps=30,
+                   people=20,
+                   tracker='BOTSORTTracker',
+                   windows=12,
+                   rss_tolerance_mb=32.,
+                   latency_tolerance=1.5,
+                   seed=0):
+    """
+    hours 시간 분량의 합성 스트림을 재생하고, 구간별 RSS 와 프레임당 지연 시간이 일정한지 확인합니다.
+
+    첫 구간은 캐시/할당이 안정되는 워밍업으로 보고, 이후 RSS 가 두 번째 구간보다 rss_tolerance_mb 이상
+    늘면 실패합니다. 지연 시간은 구간 하나끼리 비교하면 스케줄러 지터에 흔들리므로, 구간별 중앙 지연 시간의
+    추세(Theil-Sen 기울기)로 측정 기간 동안 늘어난 양을 추정해 전체 중앙값의 latency_tolerance - 1 배(+0.5ms)를
+    넘으면 실패합니다.
+
+    Returns:
+        list[dict]: 구간별 {"hours", "rss_mb", "p50_ms", "p99_ms", "tracks", "removed", "collector_ids"}
+    """
+    crowd = SyntheticCrowd(people=people, fps=fps, seed=seed)
+    mot_tracker = TRACKERS[tracker]()
+    spatial = SpatialInfoTracker()
+    spatial.lazy_init(crowd.width, crowd.height)
+    kpt_cache = KeypointTrackCache(refresh_interval=5, max_crops=8)
+    collector = DataCollector(max_frames=300, max_idle=900)
+    result = Result()
+    canvas = np.zeros((90, 160, 3), dtype=np.uint8)
+    center_traj = [{}]
+
+    id_set, interval_id_set = set(), set()
+    in_id_list, out_id_list, prev_center = list(), list(), dict()
+    records = deque(maxlen=100)
+
+    total_frames = int(hours * 3600 * fps)
+    window_frames = max(total_frames // windows, 1)
+    latencies = np.zeros(window_frames)
+    results = []
+    for frame_id in range(window_frames * windows):
+        dets = crowd.step()
+        start = time.perf_counter()
+
+        boxes = tracker_boxes(mot_tracker, mot_tracker.update(dets))
+        track_ids = boxes[:, 0]
+        tlwhs = np.concatenate(
+            [boxes[:, 3:5], boxes[:, 5:7] - boxes[:, 3:5]], axis=1)
+        flow_statistic((frame_id + 1, tlwhs, boxes[:, 2], track_ids), 10, fps,
+                       id_set, interval_id_set, in_id_list, out_id_list,
+                       prev_center, records)
+
+        result.update({'boxes': boxes}, 'mot')
+        collector.append(frame_id, result)
+
+        selected = kpt_cache.select(frame_id, track_ids, boxes[:, 3:])
+        if len(selected):
+            kpt_cache.update(frame_id, track_ids[selected], boxes[selected, 3:],
+                             boxes[selected, 3:], {
+                'keypoint': np.zeros((len(selected), 17, 3), dtype=np.float32),
+                'score': np.ones((len(selected), 1), dtype=np.float32)
+            })
+
+        if len(boxes):
+            spatial_info = spatial.run(boxes[0], boxes[1:], fps)
+            spatial.is_danger(spatial_info)
+            plot_tracking_dict(canvas, 1, {0: tlwhs}, {0: track_ids},
+                               {0: boxes[:, 2]}, frame_id, fps,
+                               records=records, center_traj=center_traj)
+
+        latencies[frame_id % window_frames] = time.perf_counter() - start
+        if (frame_id + 1) % window_frames == 0:
+            if isinstance(mot_tracker, OCSORTTracker):
+                tracks = len(mot_tracker.trackers)
+                removed = 0
+            elif isinstance(mot_tracker, JDETracker):
+                tracks = sum(len(v) for v in mot_tracker.tracked_tracks_dict.values())
+                removed = sum(len(v) for v in mot_tracker.removed_tracks_dict.values())
+            else:
+                tracks = len(mot_tracker.tracked_stracks)
+                removed = len(mot_tracker.removed_stracks)
+            res = {
+                "hours": (frame_id + 1) / fps / 3600,
+                "rss_mb": read_rss_mb(),
+                "p50_ms": float(np.percentile(latencies, 50) * 1000),
+                "p99_ms": float(np.percentile(latencies, 99) * 1000),
+                "tracks": tracks,
+                "removed": removed,
+                "collector_ids": len(collector.collector)
+            }
+            results.append(res)
+            print("hours: {hours:.2f}, rss: {rss_mb:.1f} MB, p50: {p50_ms:.3f} ms, "
+                  "p99: {p99_ms:.3f} ms, tracks: {tracks}, removed: {removed}, "
+                  "collector ids: {collector_ids}".format(**res))
+
+    print("spawned people: {}, total ids: {}".format(crowd.spawned, len(id_set)))
+    if len(results) >= 3:
+        base = results[1]
+        rss_growth = max(r["rss_mb"] for r in results[1:]) - base["rss_mb"]
+        assert rss_growth <= rss_tolerance_mb, \
+            "RSS grew by {:.1f} MB".format(rss_growth)
+        p50 = np.array([r["p50_ms"] for r in results[1:]])
+        level = float(np.median(p50))
+        growth = latency_trend(p50) * (len(p50) - 1)
+        assert growth <= level * (latency_tolerance - 1) + 0.5, \
+            "per-frame latency trend grew by {:.3f} ms over a median of {:.3f} ms".format(
+                growth, level)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type=float, default=2.0)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--people', type=int, default=20)
+    parser.add_argument('--tracker', default='BOTSORTTracker', choices=list(TRACKERS))
+    args = parser.parse_args()
+    benchmark_soak(hours=args.hours, fps=args.fps, people=args.people,
+                   tracker=args.tracker)
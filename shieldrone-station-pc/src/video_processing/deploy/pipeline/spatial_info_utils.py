@@ -1,6 +1,8 @@
 import cv2
 import numpy as np
-import math
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
 
 class SpatialInfoTracker:
     def __init__(self):
@@ -15,8 +17,32 @@ class SpatialInfoTracker:
         self.ema_bbox_width = None
         self.ema_bbox_height = None
 
-        # 이전 프레임에서의 각 사람의 위치를 저장할 딕셔너리 초기화
-        self.prev_positions = {}  # Key: obj_id, Value: (x, y)
+        # 이 속도(m/s) 보다 빠르게 목표에 다가오면 빠르게 접근하는 것으로 판단
+        self.APPROACH_SPEED = 0.5
+
+        # 이전 프레임에서의 각 사람의 위치 (id 순으로 정렬된 배열)
+        # 화면에서 사라진 사람은 PREV_MAX_AGE 프레임이 지나면 제거
+        self.PREV_MAX_AGE = 30
+        self.frame_count = 0
+        self.prev_ids = np.zeros(0, dtype=np.int64)
+        self.prev_xy = np.zeros((0, 2))
+        self.prev_frames = np.zeros(0, dtype=np.int64)
+        # 목표의 이전 위치와 그 프레임 번호, 목표 id 가 바뀌면 초기화
+        self.prev_target = None
+        self.prev_target_frame = None
+        self.prev_target_id = None
+
+        # 군중 위협 판단
+        # 목표 주변 감시 반경 = 근접 거리 기준 x CROWD_RADIUS_SCALE
+        self.CROWD_RADIUS_SCALE = 3
+        # 이 시간(초) 안에 목표에 닿는 사람을 모여드는 사람으로 판단
+        self.TTC_HORIZON = 3.0
+        # 모여드는 사람끼리 이 거리(m) 안에 있으면 같은 무리로 묶음
+        self.GROUP_LINK_DISTANCE = 1.5
+        # 무리/포위로 판단할 최소 인원
+        self.MIN_GROUP_SIZE = 3
+        # 모여드는 사람들이 목표 주위를 이 각도(도) 이상 둘러싸면 포위로 판단
+        self.ENCIRCLE_COVERAGE_DEG = 180
 
     def lazy_init(self, FRAME_WIDTH, FRAME_HEIGHT):
         self.FRAME_WIDTH = FRAME_WIDTH
@@ -72,6 +98,12 @@ class SpatialInfoTracker:
                            [0],
                            [self.DRONE_ALTITUDE]])
 
+        # 이미지 좌표 [u, v, 1] 을 월드 좌표계의 광선 방향으로 바꾸는 행렬 (R @ K^-1)
+        # 고도/각도가 바뀔 때만 다시 계산
+        if hasattr(self, "CAMERA_MATRIX"):
+            self.inv_camera_matrix = np.linalg.inv(self.CAMERA_MATRIX)
+            self.ray_matrix = self.R @ self.inv_camera_matrix
+
     def update_drone_parameters(self, altitude, rotation_angle_deg):
         # 드론의 고도와 카메라 각도를 업데이트
         self.DRONE_ALTITUDE = altitude
@@ -80,43 +112,104 @@ class SpatialInfoTracker:
         # 카메라 파라미터 재계산
         self.update_R_T()
 
-    def image_to_world(self, u, v):
-        # 이미지 좌표를 정규화된 이미지 좌표로 변환
-        uv1 = np.array([[u],
-                        [v],
-                        [1]])
-        inv_camera_matrix = np.linalg.inv(self.CAMERA_MATRIX)
-        normalized_coords = inv_camera_matrix @ uv1
-
-        # 카메라 좌표계에서의 광선 방향 벡터
-        ray_direction = self.R @ normalized_coords
+    def image_to_world_batch(self, uv):
+        """
+        (N, 2) 이미지 좌표를 지면(z=0) 위의 (N, 2) 월드 좌표로 한 번에 변환
+        """
+        uv = np.asarray(uv, dtype=np.float64).reshape(-1, 2)
+        # 광선 방향 = ray_matrix @ [u, v, 1]
+        rays = uv @ self.ray_matrix[:, :2].T + self.ray_matrix[:, 2]
 
         # 지면(z=0)과의 교점을 계산
-        s = -self.T[2][0] / ray_direction[2][0]
-        world_coords = self.T + s * ray_direction
-
-        return world_coords[0][0], world_coords[1][0]
+        s = -self.T[2, 0] / rays[:, 2]
+        return self.T[:2, 0] + s[:, None] * rays[:, :2]
 
-    def run(self, target_bbox, other_bboxes, fps):
-        delta_t = 1 / fps  # 프레임 간 시간 간격 (초)
-        result = {
-            "target": None,
-            "others": {}
+    def image_to_world(self, u, v):
+        world_x, world_y = self.image_to_world_batch([[u, v]])[0]
+        return world_x, world_y
+
+    @staticmethod
+    def box_centers(boxes):
+        """
+        [id, class, score, xmin, ymin, xmax, ymax] 박스들의 (N, 2) 중심 좌표
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 7)
+        return (boxes[:, 3:5] + boxes[:, 5:7]) / 2
+
+    def match_prev(self, ids, world, delta_t):
+        """
+        이전 위치 기록에서 ids 의 (N, 2) 속도를 구하고 기록을 현재 위치로 갱신.
+        이전 위치가 없는 사람의 속도는 NaN
+        """
+        self.frame_count += 1
+        velocity = np.full((len(ids), 2), np.nan)
+        prev_ids = self.prev_ids
+        if len(prev_ids) and len(ids):
+            idx = np.minimum(np.searchsorted(prev_ids, ids), len(prev_ids) - 1)
+            found = prev_ids[idx] == ids
+            idx = idx[found]
+            elapsed = (self.frame_count - self.prev_frames[idx]) * delta_t
+            velocity[found] = (world[found] - self.prev_xy[idx]) / elapsed[:, None]
+
+        # 이번 프레임에 없는 사람의 기록은 PREV_MAX_AGE 프레임까지만 유지
+        keep = ~np.isin(prev_ids, ids) & (self.frame_count - self.prev_frames <= self.PREV_MAX_AGE)
+        merged_ids = np.concatenate([prev_ids[keep], ids])
+        order = np.argsort(merged_ids, kind="stable")
+        self.prev_ids = merged_ids[order]
+        self.prev_xy = np.concatenate([self.prev_xy[keep], world])[order]
+        self.prev_frames = np.concatenate(
+            [self.prev_frames[keep], np.full(len(ids), self.frame_count)])[order]
+        return velocity
+
+    def threat(self, target_xy, target_velocity, world, velocity, distance_threshold):
+        """
+        목표 사람에 대한 다른 사람들의 위협 정도를 배열로 계산.
+
+        접근 여부는 다른 사람 자신의 속도로만 판단하므로, 목표가 서 있는 사람 곁을 지나가는 것은 위협이 아님.
+        ttc 는 스스로 빠르게 접근하는 사람에 대해서만 목표 속도까지 반영한 상대 속도로 계산.
+
+        Returns:
+            dict: delta_coords (N, 2), distance, velocity(목표 방향 접근 속도, 양수면 가까워짐),
+                  ttc(접촉까지 남은 시간, 빠르게 접근하지 않으면 inf), is_near, getting_closer_quickly
+        """
+        delta = world - target_xy
+        distance = np.hypot(delta[:, 0], delta[:, 1])
+
+        relative_velocity = velocity
+        if target_velocity is not None:
+            relative_velocity = velocity - target_velocity
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # 다른 사람 자신의 속도를 목표 방향으로 투영한 접근 속도
+            approach_speed = -np.einsum("ij,ij->i", delta, velocity) / distance
+            approach_speed[distance == 0] = np.nan
+            getting_closer_quickly = approach_speed > self.APPROACH_SPEED
+            closing_speed = -np.einsum("ij,ij->i", delta, relative_velocity) / distance
+            ttc = np.where(getting_closer_quickly & (closing_speed > 0),
+                           distance / closing_speed, np.inf)
+
+        return {
+            "delta_coords": delta,
+            "distance": distance,
+            "velocity": approach_speed,
+            "ttc": ttc,
+            "is_near": distance <= distance_threshold,
+            "getting_closer_quickly": getting_closer_quickly
         }
 
-        # 목표 사람의 이미지 좌표 초기화
-        target_u = None
-        target_v = None
-        target_world_x = None
-        target_world_y = None
+    def run(self, target_bbox, other_bboxes, fps, target_visible=True):
+        """
+        Args:
+            target_bbox: 목표 박스 [id, class, score, xmin, ymin, xmax, ymax]
+            other_bboxes: 다른 사람들의 박스 (N, 7)
+            fps (float): 프레임 속도
+            target_visible (bool): 이번 프레임에서 목표가 검출되었는지 여부,
+                False 이면 target_bbox 는 마지막으로 본 위치이므로 목표 속도를 계산하지 않음
+        """
+        delta_t = 1 / fps  # 프레임 간 시간 간격 (초)
 
         # 현재 프레임에서 목표 사람의 위치 찾기
         obj_id, obj_class, score, xmin, ymin, xmax, ymax = target_bbox
 
-        # 바운딩 박스의 중심 좌표 계산
-        target_u = (xmin + xmax) / 2
-        target_v = (ymin + ymax) / 2
-
         # 바운딩 박스의 폭과 높이 계산 및 EMA 적용
         bbox_width = xmax - xmin
         bbox_height = ymax - ymin
@@ -128,86 +221,117 @@ class SpatialInfoTracker:
             self.ema_bbox_width = self.EMA_ALPHA * bbox_width + (1 - self.EMA_ALPHA) * self.ema_bbox_width
             self.ema_bbox_height = self.EMA_ALPHA * bbox_height + (1 - self.EMA_ALPHA) * self.ema_bbox_height
 
-        target_bbox_width = self.ema_bbox_width
-        target_bbox_height = self.ema_bbox_height
-
-        # 이미지 좌표를 월드 좌표로 변환
-        target_world_x, target_world_y = self.image_to_world(target_u, target_v)
-
-        # 목표 사람의 정보 저장
-        result["target"] = {
-            "world_coords": (target_world_x, target_world_y),
+        # 목표 사람과의 거리 기준 (바운딩 박스 폭의 2배)
+        bbox_width_meters = (self.ema_bbox_width / self.FRAME_WIDTH) * (2 * self.DRONE_ALTITUDE * self.tan_half_horizontal_fov)
+        distance_threshold = 2 * bbox_width_meters
+
+        # 목표와 다른 사람들의 바운딩 박스 중심을 한 번에 월드 좌표로 변환
+        other_bboxes = np.asarray(other_bboxes, dtype=np.float64).reshape(-1, 7)
+        ids = other_bboxes[:, 0].astype(np.int64)
+        world = self.image_to_world_batch(
+            np.vstack([self.box_centers(target_bbox), self.box_centers(other_bboxes)]))
+        target_xy, world = world[0], world[1:]
+
+        velocity = self.match_prev(ids, world, delta_t)
+
+        # 목표 사람의 속도, 목표가 바뀌었거나 오래 보이지 않았으면 이전 위치를 버림
+        if int(obj_id) != self.prev_target_id or (
+                self.prev_target_frame is not None and
+                self.frame_count - self.prev_target_frame > self.PREV_MAX_AGE):
+            self.prev_target = None
+            self.prev_target_id = int(obj_id)
+        target_velocity = None
+        if target_visible:
+            if self.prev_target is not None:
+                elapsed = (self.frame_count - self.prev_target_frame) * delta_t
+                target_velocity = (target_xy - self.prev_target) / elapsed
+            self.prev_target = target_xy
+            self.prev_target_frame = self.frame_count
+        others = self.threat(target_xy, target_velocity, world, velocity, distance_threshold)
+        others["ids"] = ids
+        others["world_coords"] = world
+
+        return {
+            "target": {
+                "world_coords": (target_xy[0], target_xy[1]),
+            },
+            "others": others,
+            "crowd": self.crowd(world, others, distance_threshold * self.CROWD_RADIUS_SCALE)
         }
 
-        # 다른 사람들의 상대 위치 계산
-        for box in other_bboxes:
-            obj_id_other, obj_class_other, score_other, xmin_other, ymin_other, xmax_other, ymax_other = box
-            obj_id_other = int(obj_id_other)
-
-            # 바운딩 박스의 중심 좌표 계산
-            person_u = (xmin_other + xmax_other) / 2
-            person_v = (ymin_other + ymax_other) / 2
-
-            # 이미지 좌표를 월드 좌표로 변환
-            person_world_x, person_world_y = self.image_to_world(person_u, person_v)
-
-            # 상대 위치 계산
-            delta_x = person_world_x - target_world_x
-            delta_y = person_world_y - target_world_y
-            distance = math.hypot(delta_x, delta_y)
-
-            # 목표 사람과의 거리 기준 (바운딩 박스 폭의 2배)
-            bbox_width_meters = (target_bbox_width / self.FRAME_WIDTH) * (2 * self.DRONE_ALTITUDE * self.tan_half_horizontal_fov)
-            distance_threshold = 2 * bbox_width_meters
-            is_near = distance <= distance_threshold
-
-            # 이전 위치가 있는 경우 속도 계산
-            velocity = None
-            getting_closer_quickly = False
-            if obj_id_other in self.prev_positions:
-                prev_x, prev_y = self.prev_positions[obj_id_other]
-                vel_x = (person_world_x - prev_x) / delta_t
-                vel_y = (person_world_y - prev_y) / delta_t
-
-                dir_x = target_world_x - person_world_x
-                dir_y = target_world_y - person_world_y
-                distance_to_target = math.hypot(dir_x, dir_y)
-
-                if distance_to_target != 0:
-                    unit_dir_x = dir_x / distance_to_target
-                    unit_dir_y = dir_y / distance_to_target
-                    velocity = vel_x * unit_dir_x + vel_y * unit_dir_y
-                    # 빠르게 접근하는 경우
-                    if velocity and velocity > 0.5:
-                        getting_closer_quickly = True
-
-            # 객체 정보를 결과 리스트에 추가
-            result["others"][obj_id_other]={
-                "world_coords": (person_world_x, person_world_y),
-                "delta_coords": (delta_x, delta_y),
-                "distance": distance,
-                "is_near": is_near,
-                "velocity": velocity,
-                "getting_closer_quickly": getting_closer_quickly
-            }
-
-            # 현재 위치를 저장
-            self.prev_positions[obj_id_other] = (person_world_x, person_world_y)
+    def crowd(self, world, others, watch_radius):
+        """
+        프레임마다 월드 좌표로 KD 트리를 만들어 목표 주변 사람, 모여드는 무리, 포위 여부를 판단.
+        모든 쌍을 비교하지 않고 반경 질의로 가까운 쌍만 찾음.
 
+        Returns:
+            dict: nearby(감시 반경 안의 사람 인덱스), converging(모여드는 사람 인덱스),
+                  groups(모여드는 무리별 인덱스 배열 목록), coverage_deg(모여드는 사람들이 둘러싼 각도),
+                  encircled(포위 여부)
+        """
+        result = {
+            "nearby": np.zeros(0, dtype=np.int64),
+            "converging": np.zeros(0, dtype=np.int64),
+            "groups": [],
+            "coverage_deg": 0.0,
+            "encircled": False
+        }
+        if len(world) == 0:
+            return result
+
+        # 목표는 delta 의 원점이므로 목표 기준 좌표로 질의
+        delta = others["delta_coords"]
+        tree = cKDTree(delta)
+        nearby = np.sort(np.asarray(tree.query_ball_point((0.0, 0.0), watch_radius), dtype=np.int64))
+        result["nearby"] = nearby
+
+        converging = np.flatnonzero(others["ttc"] <= self.TTC_HORIZON)
+        result["converging"] = converging
+        if len(converging) < self.MIN_GROUP_SIZE:
+            return result
+
+        # 모여드는 사람들 사이의 가까운 쌍으로 무리(연결 요소) 구성
+        pairs = cKDTree(world[converging]).query_pairs(self.GROUP_LINK_DISTANCE, output_type="ndarray")
+        n = len(converging)
+        graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+        _, labels = connected_components(graph, directed=False)
+        sizes = np.bincount(labels)
+        # 감시 반경 안에 한 명이라도 있는 큰 무리만 남김
+        in_watch = np.isin(converging, nearby)
+        watched = np.bincount(labels, weights=in_watch) > 0
+        result["groups"] = [converging[labels == g]
+                            for g in np.flatnonzero((sizes >= self.MIN_GROUP_SIZE) & watched)]
+
+        # 감시 반경 안에서 모여드는 사람들이 목표 주위를 둘러싼 각도 = 360 - 가장 큰 빈 각도
+        closing_in = converging[in_watch]
+        if len(closing_in) >= self.MIN_GROUP_SIZE:
+            angles = np.sort(np.degrees(np.arctan2(delta[closing_in, 1], delta[closing_in, 0])))
+            gaps = np.diff(np.append(angles, angles[0] + 360))
+            result["coverage_deg"] = float(360 - gaps.max())
+            result["encircled"] = result["coverage_deg"] >= self.ENCIRCLE_COVERAGE_DEG
         return result
 
+    @staticmethod
+    def is_danger(result):
+        """
+        가까이 있으면서 빠르게 접근하는 사람이 있거나, 무리가 모여들거나, 포위된 경우
+        """
+        others = result["others"]
+        crowd = result.get("crowd")
+        if crowd is not None and (crowd["encircled"] or crowd["groups"]):
+            return True
+        return bool(np.any(others["is_near"] & others["getting_closer_quickly"]))
+
     def visualize(self, frame, result, other_bboxes):
 
         # 다른 사람들 시각화
-        for box in other_bboxes:
+        others = result["others"]
+        for i, box in enumerate(other_bboxes):
             obj_id_other, obj_class_other, score_other, xmin_other, ymin_other, xmax_other, ymax_other = box
-            person = result["others"][int(obj_id_other)]
-            person_x, person_y = person["world_coords"]
-            delta_x, delta_y = person["delta_coords"]
-            distance = person["distance"]
-            velocity = person["velocity"]
-            is_near = person["is_near"]
-            getting_closer_quickly = person["getting_closer_quickly"]
+            delta_x, delta_y = others["delta_coords"][i]
+            distance = others["distance"][i]
+            velocity = others["velocity"][i]
+            getting_closer_quickly = others["getting_closer_quickly"][i]
             xmin_int = int(xmin_other)
             ymin_int = int(ymin_other)
             xmax_int = int(xmax_other)
@@ -219,7 +343,7 @@ class SpatialInfoTracker:
                 f"Δx: {delta_x:.2f}",
                 f"Δy: {delta_y:.2f}",
                 f"Dist: {distance:.2f}",
-                f"Vel: {velocity:.2f}" if velocity is not None else "Vel: N/A",
+                f"Vel: {velocity:.2f}" if not np.isnan(velocity) else "Vel: N/A",
                 "Approaching" if getting_closer_quickly else "Stable"
             ]
 
@@ -230,4 +354,12 @@ class SpatialInfoTracker:
                 cv2.putText(frame, line, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,0,255), 1)
                 text_y += 20  # 다음 줄로 이동
 
+        # 군중 위협 요약
+        crowd = result.get("crowd")
+        if crowd is not None and len(crowd["converging"]) > 0:
+            text = f"Converging: {len(crowd['converging'])}, Groups: {len(crowd['groups'])}, Cover: {crowd['coverage_deg']:.0f}"
+            if crowd["encircled"]:
+                text += " ENCIRCLED"
+            cv2.putText(frame, text, (10, frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+
         return frame
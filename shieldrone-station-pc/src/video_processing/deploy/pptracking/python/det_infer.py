@@ -117,21 +117,25 @@ class Detector(object):
         self.batch_size = batch_size
         self.output_dir = output_dir
         self.threshold = threshold
+        self.preprocess_ops = None
 
     def set_config(self, model_dir):
         return PredictConfig(model_dir)
 
     def preprocess(self, image_list):
-        preprocess_ops = []
-        for op_info in self.pred_config.preprocess_infos:
-            new_op_info = op_info.copy()
-            op_type = new_op_info.pop('type')
-            preprocess_ops.append(eval(op_type)(**new_op_info))
+        # preprocess ops are stateless, build them once instead of per frame
+        if self.preprocess_ops is None:
+            preprocess_ops = []
+            for op_info in self.pred_config.preprocess_infos:
+                new_op_info = op_info.copy()
+                op_type = new_op_info.pop('type')
+                preprocess_ops.append(eval(op_type)(**new_op_info))
+            self.preprocess_ops = preprocess_ops
 
         input_im_lst = []
         input_im_info_lst = []
         for im_path in image_list:
-            im, im_info = preprocess(im_path, preprocess_ops)
+            im, im_info = preprocess(im_path, self.preprocess_ops)
             input_im_lst.append(im)
             input_im_info_lst.append(im_info)
         inputs = create_inputs(input_im_lst, input_im_info_lst)
@@ -15,7 +15,9 @@
 from . import jde_matching
 from . import deepsort_matching
 from . import ocsort_matching
+from . import iou_utils
 
 from .jde_matching import *
 from .deepsort_matching import *
 from .ocsort_matching import *
+from .iou_utils import *
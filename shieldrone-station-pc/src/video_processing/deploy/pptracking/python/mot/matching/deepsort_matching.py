@@ -18,6 +18,7 @@ This code is based on https://github.com/nwojke/deep_sort/tree/master/deep_sort
 import numpy as np
 from scipy.optimize import linear_sum_assignment
 from ..motion import kalman_filter
+from .iou_utils import bbox_overlaps, tlwh_to_tlbr
 
 INFTY_COST = 1e+5
 
@@ -47,22 +48,10 @@ def iou_1toN(bbox, candidates):
             and each candidate. A higher score means a larger fraction of the
             `bbox` is occluded by the candidate.
     """
-    bbox_tl = bbox[:2]
-    bbox_br = bbox[:2] + bbox[2:]
-    candidates_tl = candidates[:, :2]
-    candidates_br = candidates[:, :2] + candidates[:, 2:]
-
-    tl = np.c_[np.maximum(bbox_tl[0], candidates_tl[:, 0])[:, np.newaxis],
-               np.maximum(bbox_tl[1], candidates_tl[:, 1])[:, np.newaxis]]
-    br = np.c_[np.minimum(bbox_br[0], candidates_br[:, 0])[:, np.newaxis],
-               np.minimum(bbox_br[1], candidates_br[:, 1])[:, np.newaxis]]
-    wh = np.maximum(0., br - tl)
-
-    area_intersection = wh.prod(axis=1)
-    area_bbox = bbox[2:].prod()
-    area_candidates = candidates[:, 2:].prod(axis=1)
-    ious = area_intersection / (area_bbox + area_candidates - area_intersection)
-    return ious
+    return bbox_overlaps(
+        tlwh_to_tlbr(bbox, np.float64),
+        tlwh_to_tlbr(candidates, np.float64),
+        dtype=np.float64)[0]
 
 
 def iou_cost(tracks, detections, track_indices=None, detection_indices=None):
@@ -0,0 +1,220 @@
+# Copyright (c) 2022 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Vectorized pairwise box overlap kernels shared by the JDE, OC-SORT and
+DeepSORT matching modules.
+"""
+
+import time
+import numpy as np
+
+use_numba = True
+try:
+    import numba as nb
+
+    @nb.njit(fastmath=True, cache=True)
+    def nb_bbox_ious(boxes, query_boxes, offset):
+        N = boxes.shape[0]
+        K = query_boxes.shape[0]
+        ious = np.zeros((N, K), dtype=boxes.dtype)
+        for k in range(K):
+            box_area = ((query_boxes[k, 2] - query_boxes[k, 0] + offset) *
+                        (query_boxes[k, 3] - query_boxes[k, 1] + offset))
+            for n in range(N):
+                iw = (min(boxes[n, 2], query_boxes[k, 2]) -
+                      max(boxes[n, 0], query_boxes[k, 0]) + offset)
+                if iw > 0:
+                    ih = (min(boxes[n, 3], query_boxes[k, 3]) -
+                          max(boxes[n, 1], query_boxes[k, 1]) + offset)
+                    if ih > 0:
+                        ua = ((boxes[n, 2] - boxes[n, 0] + offset) *
+                              (boxes[n, 3] - boxes[n, 1] + offset) + box_area
+                              - iw * ih)
+                        ious[n, k] = iw * ih / ua
+        return ious
+
+except:
+    use_numba = False
+
+__all__ = ['bbox_overlaps']
+
+_MODES = ('iou', 'giou', 'diou', 'ios')
+
+
+def tlwh_to_tlbr(tlwhs, dtype=np.float32):
+    """
+    Convert boxes from `(top left x, top left y, width, height)` to
+    `(x1, y1, x2, y2)`.
+    """
+    tlwhs = np.asarray(tlwhs, dtype=dtype).reshape(-1, 4)
+    tlbrs = tlwhs.copy()
+    tlbrs[:, 2:] += tlbrs[:, :2]
+    return tlbrs
+
+
+def _as_tlbrs(boxes, dtype=np.float32):
+    # extra columns such as scores (OC-SORT passes [x1, y1, x2, y2, score])
+    # are ignored
+    boxes = np.asarray(boxes, dtype=dtype)
+    if boxes.ndim < 2:
+        boxes = boxes.reshape(-1, 4)
+    return np.ascontiguousarray(boxes[:, :4])
+
+
+def bbox_overlaps(atlbrs, btlbrs, mode='iou', offset=0., eps=1e-9,
+                  dtype=np.float32):
+    """
+    Compute the pairwise overlap between two sets of boxes with numpy
+    broadcasting, without Python loops over boxes.
+
+    Args:
+        atlbrs (ndarray|list): N boxes in format `(x1, y1, x2, y2, ...)`.
+        btlbrs (ndarray|list): K boxes in format `(x1, y1, x2, y2, ...)`.
+        mode (str): one of 'iou', 'giou', 'diou' and 'ios'. 'ios' is the
+            intersection over the smaller of the two areas.
+        offset (float): added to widths and heights, 1. reproduces the
+            pixel-inclusive areas used by the original JDE implementation.
+        eps (float): guard against zero-area boxes.
+        dtype (np.dtype): precision of the computation and of the result.
+
+    Returns:
+        overlaps (ndarray): matrix of shape (N, K) in `dtype`.
+    """
+    assert mode in _MODES, "mode should be one of {}".format(_MODES)
+    a = _as_tlbrs(atlbrs, dtype)
+    b = _as_tlbrs(btlbrs, dtype)
+    N, K = a.shape[0], b.shape[0]
+    if N * K == 0:
+        return np.zeros((N, K), dtype=dtype)
+
+    if mode == 'iou' and use_numba and N * K < 4096:
+        # small matrices: the jitted loop avoids temporary (N, K) arrays
+        return nb_bbox_ious(a, b, a.dtype.type(offset))
+
+    a = a[:, None, :]
+    b = b[None, :, :]
+    area_a = (a[..., 2] - a[..., 0] + offset) * (a[..., 3] - a[..., 1] + offset)
+    area_b = (b[..., 2] - b[..., 0] + offset) * (b[..., 3] - b[..., 1] + offset)
+
+    iw = np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0],
+                                                       b[..., 0]) + offset
+    ih = np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1],
+                                                       b[..., 1]) + offset
+    inter = np.maximum(iw, 0.) * np.maximum(ih, 0.)
+
+    if mode == 'ios':
+        return (inter / np.maximum(np.minimum(area_a, area_b), eps)).astype(
+            dtype, copy=False)
+
+    union = area_a + area_b - inter
+    ious = inter / np.maximum(union, eps)
+    if mode == 'iou':
+        return ious.astype(dtype, copy=False)
+
+    # smallest enclosing box
+    cw = np.maximum(a[..., 2], b[..., 2]) - np.minimum(a[..., 0],
+                                                       b[..., 0]) + offset
+    ch = np.maximum(a[..., 3], b[..., 3]) - np.minimum(a[..., 1],
+                                                       b[..., 1]) + offset
+    if mode == 'giou':
+        enclose = np.maximum(cw * ch, eps)
+        return (ious - (enclose - union) / enclose).astype(
+            dtype, copy=False)
+
+    # diou: penalize the normalized distance between box centers
+    dx = (a[..., 0] + a[..., 2] - b[..., 0] - b[..., 2]) / 2.
+    dy = (a[..., 1] + a[..., 3] - b[..., 1] - b[..., 3]) / 2.
+    diag = np.maximum(cw**2 + ch**2, eps)
+    return (ious - (dx**2 + dy**2) / diag).astype(dtype, copy=False)
+
+
+def _bbox_ious_loop(atlbrs, btlbrs):
+    # the original per-pair implementation of jde_matching.bbox_ious, kept as
+    # the reference for benchmark_iou
+    boxes = np.ascontiguousarray(atlbrs, dtype=np.float32)
+    query_boxes = np.ascontiguousarray(btlbrs, dtype=np.float32)
+    N = boxes.shape[0]
+    K = query_boxes.shape[0]
+    ious = np.zeros((N, K), dtype=boxes.dtype)
+    for k in range(K):
+        box_area = ((query_boxes[k, 2] - query_boxes[k, 0] + 1) *
+                    (query_boxes[k, 3] - query_boxes[k, 1] + 1))
+        for n in range(N):
+            iw = (min(boxes[n, 2], query_boxes[k, 2]) - max(
+                boxes[n, 0], query_boxes[k, 0]) + 1)
+            if iw > 0:
+                ih = (min(boxes[n, 3], query_boxes[k, 3]) - max(
+                    boxes[n, 1], query_boxes[k, 1]) + 1)
+                if ih > 0:
+                    ua = float((boxes[n, 2] - boxes[n, 0] + 1) * (boxes[
+                        n, 3] - boxes[n, 1] + 1) + box_area - iw * ih)
+                    ious[n, k] = iw * ih / ua
+    return ious
+
+
+def _random_tlbrs(num, rng):
+    tl = rng.uniform(0, 1920, size=(num, 2))
+    wh = rng.uniform(20, 200, size=(num, 2))
+    return np.concatenate([tl, tl + wh], axis=1).astype(np.float32)
+
+
+def benchmark_iou(sizes=(10, 50, 200),
+                  repeats=100,
+                  baseline=_bbox_ious_loop,
+                  seed=0):
+    """
+    Measure the per-frame cost of an N x N IoU matrix, as computed once per
+    frame by `iou_distance` with N tracks and N detections.
+
+    Args:
+        sizes (tuple): numbers of tracks to measure.
+        repeats (int): iterations averaged per size.
+        baseline (callable): reference implementation with the signature
+            `f(atlbrs, btlbrs)`, defaults to the original per-pair loop. Its
+            output is checked against `bbox_overlaps(..., offset=1.)`.
+
+    Returns:
+        results (list[dict]): per-size average cost in milliseconds.
+    """
+    rng = np.random.RandomState(seed)
+    results = []
+    for num in sizes:
+        a = _random_tlbrs(num, rng)
+        b = _random_tlbrs(num, rng)
+        res = {'tracks': num}
+        if baseline is not None:
+            assert np.allclose(
+                baseline(a, b), bbox_overlaps(
+                    a, b, offset=1.), atol=1e-5), "IoU mismatch"
+        kernels = [('iou', lambda: bbox_overlaps(a, b, offset=1.)),
+                   ('giou', lambda: bbox_overlaps(a, b, 'giou', offset=1.))]
+        if baseline is not None:
+            kernels.append(('baseline', lambda: baseline(a, b)))
+        for name, kernel in kernels:
+            kernel()  # warm up, triggers jit compilation
+            st = time.perf_counter()
+            for _ in range(repeats):
+                kernel()
+            res[name] = (time.perf_counter() - st) / repeats * 1000
+        results.append(res)
+        print("tracks: {:4d}, ".format(num) + ", ".join(
+            "{}: {:.4f} ms".format(k, v) for k, v in res.items()
+            if k != 'tracks'))
+    return results
+
+
+if __name__ == '__main__':
+    # run from the deploy directory:
+    #   python -m pptracking.python.mot.matching.iou_utils
+    benchmark_iou()
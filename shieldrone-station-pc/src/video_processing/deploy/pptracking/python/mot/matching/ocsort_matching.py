@@ -17,27 +17,14 @@ This code is based on https://github.com/noahcao/OC_SORT/blob/master/trackers/oc
 
 import os
 import numpy as np
+from .iou_utils import bbox_overlaps
 
 
 def iou_batch(bboxes1, bboxes2):
     """
     From SORT: Computes IOU between two bboxes in the form [x1,y1,x2,y2]
     """
-    bboxes2 = np.expand_dims(bboxes2, 0)
-    bboxes1 = np.expand_dims(bboxes1, 1)
-
-    xx1 = np.maximum(bboxes1[..., 0], bboxes2[..., 0])
-    yy1 = np.maximum(bboxes1[..., 1], bboxes2[..., 1])
-    xx2 = np.minimum(bboxes1[..., 2], bboxes2[..., 2])
-    yy2 = np.minimum(bboxes1[..., 3], bboxes2[..., 3])
-    w = np.maximum(0., xx2 - xx1)
-    h = np.maximum(0., yy2 - yy1)
-    wh = w * h
-    o = wh / ((bboxes1[..., 2] - bboxes1[..., 0]) *
-              (bboxes1[..., 3] - bboxes1[..., 1]) +
-              (bboxes2[..., 2] - bboxes2[..., 0]) *
-              (bboxes2[..., 3] - bboxes2[..., 1]) - wh)
-    return (o)
+    return bbox_overlaps(bboxes1, bboxes2, mode='iou', dtype=np.float64)
 
 
 def speed_direction_batch(dets, tracks):
@@ -41,6 +41,8 @@ class BOTSORTTracker(object):
         camera_motion (bool): Whether use camera motion, default False
         cmc_method (str): camera motion method,defalut sparseOptFlow
         frame_rate (int): fps buffer_size=int(frame_rate / 30.0 * track_buffer)
+        max_removed_tracks (int): removed tracks kept for bookkeeping, older
+            ones are dropped so memory stays bounded on long streams
     """
 
     def __init__(self,
@@ -52,11 +54,13 @@ class BOTSORTTracker(object):
                  min_box_area=0,
                  camera_motion=False,
                  cmc_method='sparseOptFlow',
-                 frame_rate=30):
+                 frame_rate=30,
+                 max_removed_tracks=100):
 
         self.tracked_stracks = []  # type: list[STrack]
         self.lost_stracks = []  # type: list[STrack]
         self.removed_stracks = []  # type: list[STrack]
+        self.max_removed_tracks = max_removed_tracks
 
         self.frame_id = 0
 
@@ -229,6 +233,8 @@ class BOTSORTTracker(object):
         self.lost_stracks.extend(lost_stracks)
         self.lost_stracks = sub_stracks(self.lost_stracks, self.removed_stracks)
         self.removed_stracks.extend(removed_stracks)
+        if len(self.removed_stracks) > self.max_removed_tracks:
+            del self.removed_stracks[:-self.max_removed_tracks or None]
         self.tracked_stracks, self.lost_stracks = remove_duplicate_stracks(
             self.tracked_stracks, self.lost_stracks)
 
@@ -57,6 +57,9 @@ class JDETracker(object):
         motion (str): motion model, KalmanFilter as default
         metric_type (str): either "euclidean" or "cosine", the distance metric 
             used for measurement to track association.
+        max_removed_tracks (int): removed tracks kept per class for
+            bookkeeping, older ones are dropped so memory stays bounded on
+            long streams
     """
 
     def __init__(self,
@@ -74,7 +77,8 @@ class JDETracker(object):
                  low_conf_thres=0.2,
                  input_size=[64, 192],
                  motion='KalmanFilter',
-                 metric_type='euclidean'):
+                 metric_type='euclidean',
+                 max_removed_tracks=100):
         self.use_byte = use_byte
         self.num_classes = num_classes
         self.det_thresh = det_thresh if not use_byte else conf_thres + 0.1
@@ -98,6 +102,7 @@ class JDETracker(object):
         self.tracked_tracks_dict = defaultdict(list)  # dict(list[STrack])
         self.lost_tracks_dict = defaultdict(list)  # dict(list[STrack])
         self.removed_tracks_dict = defaultdict(list)  # dict(list[STrack])
+        self.max_removed_tracks = max_removed_tracks
 
         self.max_time_lost = 0
         # max_time_lost will be calculated: int(frame_rate / 30.0 * track_buffer)
@@ -323,6 +328,9 @@ class JDETracker(object):
             self.lost_tracks_dict[cls_id] = sub_stracks(
                 self.lost_tracks_dict[cls_id], self.removed_tracks_dict[cls_id])
             self.removed_tracks_dict[cls_id].extend(removed_tracks_dict[cls_id])
+            removed = self.removed_tracks_dict[cls_id]
+            if len(removed) > self.max_removed_tracks:
+                del removed[:-self.max_removed_tracks or None]
             self.tracked_tracks_dict[cls_id], self.lost_tracks_dict[
                 cls_id] = remove_duplicate_stracks(
                     self.tracked_tracks_dict[cls_id],
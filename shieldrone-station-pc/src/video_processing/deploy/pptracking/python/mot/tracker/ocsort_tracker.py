@@ -16,6 +16,7 @@ This code is based on https://github.com/noahcao/OC_SORT/blob/master/trackers/oc
 """
 
 import time
+from collections import deque
 import numpy as np
 from ..matching.ocsort_matching import associate, linear_assignment, iou_batch, associate_only_iou
 from ..motion.ocsort_kalman_filter import OCSORTKalmanFilter
@@ -115,7 +116,7 @@ class KalmanBoxTracker(object):
         """
         self.last_observation = np.array([-1, -1, -1, -1, -1])  # placeholder
         self.observations = dict()
-        self.history_observations = []
+        self.history_observations = deque(maxlen=max(delta_t, 30))
         self.velocity = None
         self.delta_t = delta_t
 
@@ -145,6 +146,13 @@ class KalmanBoxTracker(object):
             self.last_observation = bbox
             self.observations[self.age] = bbox
             self.history_observations.append(bbox)
+            # only the last delta_t ages (and the latest one) are looked up by
+            # k_previous_obs, drop the rest so long-lived tracks stay bounded
+            while len(self.observations) > 1:
+                oldest = next(iter(self.observations))
+                if oldest >= self.age - self.delta_t:
+                    break
+                del self.observations[oldest]
 
             self.time_since_update = 0
             self.history = []
@@ -21,6 +21,9 @@ from PIL import Image, ImageDraw, ImageFile
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 from collections import deque
 
+# center trajectories kept per class, least recently seen ids are dropped first
+MAX_TRAJ_IDS = 256
+
 
 def visualize_box_mask(im, results, labels, threshold=0.5):
     """
@@ -233,9 +236,15 @@ def plot_tracking_dict(image,
             obj_id = int(obj_ids[i])
             if center_traj is not None:
                 record_id.add(obj_id)
-                if obj_id not in center_traj[cls_id]:
-                    center_traj[cls_id][obj_id] = deque(maxlen=30)
-                center_traj[cls_id][obj_id].append(center)
+                # move the id to the end so the least recently seen
+                # trajectories are dropped first
+                traj = center_traj[cls_id].pop(obj_id, None)
+                if traj is None:
+                    traj = deque(maxlen=30)
+                traj.append(center)
+                center_traj[cls_id][obj_id] = traj
+                while len(center_traj[cls_id]) > MAX_TRAJ_IDS:
+                    del center_traj[cls_id][next(iter(center_traj[cls_id]))]
 
             id_text = '{}'.format(int(obj_id))
             if ids2names != []:
@@ -41,6 +41,44 @@ from mot.mtmct.postprocess import trajectory_fusion, sub_cluster, gen_res, print
 from mot.mtmct.postprocess import get_mtmct_matching_results, save_mtmct_crops, save_mtmct_vis_results
 
 
+# result row of SDE_Detector.track_frame, every field is float64 so a result
+# can be viewed as the [N, 7] mot_res['boxes'] array without copying
+MOT_RESULT_DTYPE = np.dtype([('id', np.float64), ('cls', np.float64),
+                             ('score', np.float64), ('x1', np.float64),
+                             ('y1', np.float64), ('x2', np.float64),
+                             ('y2', np.float64)])
+
+
+def as_mot_boxes(result):
+    """
+    View a track_frame result as a [N, 7] array of
+    'id, cls_id, score, x1, y1, x2, y2' without copying.
+    """
+    return result.view(np.float64).reshape(-1, 7)
+
+
+class MOTStream(object):
+    """
+    State of one video stream tracked by SDE_Detector.track_frame.
+
+    Args:
+        tracker (object): tracker owned by this stream
+        capacity (int): initial rows of the result buffer, grows on demand
+    """
+
+    def __init__(self, tracker, capacity=64):
+        self.tracker = tracker
+        self.frame_count = 0
+        self.previous_det_result = None
+        self.result = np.zeros(capacity, dtype=MOT_RESULT_DTYPE)
+
+    def reserve(self, num):
+        if num > len(self.result):
+            self.result = np.zeros(
+                max(num, 2 * len(self.result)), dtype=MOT_RESULT_DTYPE)
+        return self.result
+
+
 class SDE_Detector(Detector):
     """
     Args:
@@ -174,6 +212,20 @@ class SDE_Detector(Detector):
         self.use_botsort_tracker = True if tracker_cfg[
             'type'] == 'BOTSORTTracker' else False
 
+        self.tracker_cfg = cfg
+        self.tracker = self.create_tracker()
+        self.default_stream = MOTStream(self.tracker)
+
+        self.do_mtmct = False if mtmct_dir is None else True
+        self.mtmct_dir = mtmct_dir
+
+    def create_tracker(self):
+        """
+        Create a new tracker from the tracker config, every video stream
+        needs its own tracker state.
+        """
+        cfg = self.tracker_cfg
+
         if self.use_deepsort_tracker:
             if self.reid_pred_config is not None and hasattr(
                     self.reid_pred_config, 'tracker'):
@@ -185,7 +237,7 @@ class SDE_Detector(Detector):
             min_box_area = cfg.get('min_box_area', 0)
             vertical_ratio = cfg.get('vertical_ratio', 0)
 
-            self.tracker = DeepSORTTracker(
+            return DeepSORTTracker(
                 budget=budget,
                 max_age=max_age,
                 max_iou_distance=max_iou_distance,
@@ -205,7 +257,7 @@ class SDE_Detector(Detector):
             use_byte = cfg.get('use_byte', False)
             use_angle_cost = cfg.get('use_angle_cost', False)
 
-            self.tracker = OCSORTTracker(
+            return OCSORTTracker(
                 det_thresh=det_thresh,
                 max_age=max_age,
                 min_hits=min_hits,
@@ -225,15 +277,17 @@ class SDE_Detector(Detector):
             track_buffer = cfg.get('track_buffer', 30)
             camera_motion = cfg.get('camera_motion', False)
             cmc_method = cfg.get('cmc_method', 'sparseOptFlow')
+            max_removed_tracks = cfg.get('max_removed_tracks', 100)
 
-            self.tracker = BOTSORTTracker(
+            return BOTSORTTracker(
                 track_high_thresh=track_high_thresh,
                 track_low_thresh=track_low_thresh,
                 new_track_thresh=new_track_thresh,
                 match_thresh=match_thresh,
                 track_buffer=track_buffer,
                 camera_motion=camera_motion,
-                cmc_method=cmc_method)
+                cmc_method=cmc_method,
+                max_removed_tracks=max_removed_tracks)
 
         else:
             # use ByteTracker
@@ -244,8 +298,9 @@ class SDE_Detector(Detector):
             match_thres = cfg.get('match_thres', 0.9)
             conf_thres = cfg.get('conf_thres', 0.6)
             low_conf_thres = cfg.get('low_conf_thres', 0.1)
+            max_removed_tracks = cfg.get('max_removed_tracks', 100)
 
-            self.tracker = JDETracker(
+            return JDETracker(
                 use_byte=use_byte,
                 det_thresh=det_thresh,
                 num_classes=self.num_classes,
@@ -253,10 +308,14 @@ class SDE_Detector(Detector):
                 vertical_ratio=vertical_ratio,
                 match_thres=match_thres,
                 conf_thres=conf_thres,
-                low_conf_thres=low_conf_thres, )
+                low_conf_thres=low_conf_thres,
+                max_removed_tracks=max_removed_tracks, )
 
-        self.do_mtmct = False if mtmct_dir is None else True
-        self.mtmct_dir = mtmct_dir
+    def create_stream(self):
+        """
+        Create the state of an additional video stream for track_frame.
+        """
+        return MOTStream(self.create_tracker())
 
     def postprocess(self, inputs, result):
         # postprocess output of predictor
@@ -463,6 +522,124 @@ class SDE_Detector(Detector):
                 }
                 return tracking_outs
 
+    def track_frame(self, frame, stream=None, reuse_det_result=None):
+        """
+        Streaming entry point, detect and track one decoded frame.
+
+        The frame is handed to preprocess as is: the preprocess ops allocate
+        their own outputs and never modify it, so no copy is needed. Tracker
+        outputs are written straight into the result buffer of the stream.
+
+        Args:
+            frame (np.ndarray): decoded RGB frame
+            stream (MOTStream): stream state, default_stream if None. Use
+                create_stream() for every additional video stream.
+            reuse_det_result (bool|None): track the previous detections of
+                the stream instead of running the detector, None to follow
+                skip_frame_num
+
+        Returns:
+            result (np.ndarray): MOT_RESULT_DTYPE array with fields
+                'id, cls, score, x1, y1, x2, y2'. It is a view of the stream
+                buffer and is overwritten by the next call on the stream.
+        """
+        stream = stream or self.default_stream
+        frame_count = stream.frame_count
+        timed = frame_count > self.warmup_frame
+        if reuse_det_result is None:
+            reuse_det_result = self.skip_frame_num > 1 and \
+                frame_count % self.skip_frame_num > 0
+        if stream.previous_det_result is None:
+            reuse_det_result = False
+
+        if not reuse_det_result:
+            if timed:
+                self.det_times.preprocess_time_s.start()
+            inputs = self.preprocess([frame])
+            if timed:
+                self.det_times.preprocess_time_s.end()
+                self.det_times.inference_time_s.start()
+            result = self.predict()
+            if timed:
+                self.det_times.inference_time_s.end()
+                self.det_times.postprocess_time_s.start()
+            det_result = self.postprocess(inputs, result)
+            stream.previous_det_result = det_result
+            if timed:
+                self.det_times.postprocess_time_s.end()
+        else:
+            det_result = stream.previous_det_result
+
+        if timed:
+            self.det_times.tracking_time_s.start()
+        if self.use_reid:
+            det_result['frame_id'] = frame_count
+            det_result['seq_name'] = None
+            det_result['ori_image'] = frame
+            det_result = self.reidprocess(det_result)
+        num = self._track_to_stream(stream, det_result, frame)
+        if timed:
+            self.det_times.tracking_time_s.end()
+            self.det_times.img_num += 1
+
+        stream.frame_count += 1
+        return stream.result[:num]
+
+    def _track_to_stream(self, stream, det_results, img):
+        pred_dets = det_results['boxes']  # cls_id, score, x0, y0, x1, y1
+        pred_embs = det_results.get('embeddings', None)
+        tracker = stream.tracker
+
+        if self.use_ocsort_tracker:
+            # [M, 6] x0, y0, x1, y1, score, id
+            out = tracker.update(pred_dets, pred_embs)
+            w, h = out[:, 2] - out[:, 0], out[:, 3] - out[:, 1]
+            keep = (w * h > tracker.min_box_area) & (w * h > 0)
+            if tracker.vertical_ratio > 0:
+                keep &= w / h <= tracker.vertical_ratio
+            out = out[keep]
+            res = stream.reserve(len(out))
+            res['id'][:len(out)] = out[:, 5]
+            res['cls'][:len(out)] = 0
+            res['score'][:len(out)] = out[:, 4]
+            for i, name in enumerate(('x1', 'y1', 'x2', 'y2')):
+                res[name][:len(out)] = out[:, i]
+            return len(out)
+
+        min_box_area = None
+        vertical_ratio = 0
+        if self.use_deepsort_tracker:
+            tracker.predict()
+            online_targets = [
+                t for t in tracker.update(pred_dets, pred_embs)
+                if t.is_confirmed() and t.time_since_update <= 1
+            ]
+            targets_by_cls = [(0, online_targets)]
+            vertical_ratio = tracker.vertical_ratio
+        elif self.use_botsort_tracker:
+            targets_by_cls = [(0, tracker.update(pred_dets, [img]))]
+            min_box_area = tracker.min_box_area
+        else:
+            online_targets_dict = tracker.update(pred_dets, pred_embs)
+            targets_by_cls = [(cls_id, online_targets_dict[cls_id])
+                              for cls_id in range(self.num_classes)]
+            min_box_area = tracker.min_box_area
+            vertical_ratio = tracker.vertical_ratio
+
+        res = stream.reserve(sum(len(t) for _, t in targets_by_cls))
+        num = 0
+        for cls_id, online_targets in targets_by_cls:
+            for t in online_targets:
+                x, y, w, h = t.to_tlwh(
+                ) if self.use_deepsort_tracker else t.tlwh
+                if min_box_area is not None and w * h <= min_box_area:
+                    continue
+                if vertical_ratio > 0 and w / h > vertical_ratio:
+                    continue
+                res[num] = (t.track_id, cls_id, t.score, x, y, x + w, y + h)
+                num += 1
+        return num
+
     def predict_image(self,
                       image_list,
                       run_benchmark=False,
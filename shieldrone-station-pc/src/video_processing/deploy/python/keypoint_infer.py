@@ -30,7 +30,7 @@ parent_path = os.path.abspath(os.path.join(__file__, *(['..'])))
 sys.path.insert(0, parent_path)
 
 from preprocess import preprocess, NormalizeImage, Permute
-from keypoint_preprocess import EvalAffine, TopDownEvalAffine, expand_crop
+from keypoint_preprocess import EvalAffine, TopDownEvalAffine, TopDownBatchAffine, expand_crop
 from keypoint_postprocess import HrHRNetPostProcess, HRNetPostProcess
 from visualize import visualize_pose
 from paddle.inference import Config
@@ -91,10 +91,86 @@ class KeyPointDetector(Detector):
             output_dir=output_dir,
             threshold=threshold, )
         self.use_dark = use_dark
+        self.batch_affine = self.build_batch_affine()
 
     def set_config(self, model_dir):
         return PredictConfig_KeyPoint(model_dir)
 
+    def build_batch_affine(self):
+        """
+        Fuse the preprocess of top-down models into one TopDownBatchAffine op,
+        returns None when the preprocess config can not be fused.
+        """
+        if self.pred_config.archcls != 'keypoint_topdown':
+            return None
+        ops = {}
+        for op_info in self.pred_config.preprocess_infos:
+            new_op_info = op_info.copy()
+            ops[new_op_info.pop('type')] = new_op_info
+        if set(ops.keys()) != set(
+            ['TopDownEvalAffine', 'NormalizeImage', 'Permute']):
+            return None
+        return TopDownBatchAffine(**ops['TopDownEvalAffine'],
+                                  **ops['NormalizeImage'])
+
+    def preprocess_crops(self, image, rects):
+        inputs = {}
+        inputs['image'], inputs['im_shape'] = self.batch_affine(image, rects)
+        input_names = self.predictor.get_input_names()
+        for i in range(len(input_names)):
+            input_tensor = self.predictor.get_input_handle(input_names[i])
+            if input_names[i] == 'x':
+                input_tensor.copy_from_cpu(inputs['image'])
+            else:
+                input_tensor.copy_from_cpu(inputs[input_names[i]])
+        return inputs
+
+    def predict_crops(self, image, rects):
+        """
+        Predict the keypoints of many boxes of one image, the boxes are warped
+        from the image directly into the input batch without crop copies.
+
+        Args:
+            image (np.ndarray): the full image (h, w, c)
+            rects (np.ndarray[N, 4]): int crop rects [x1, y1, x2, y2]
+        Returns:
+            results (dict): 'keypoint' and 'score' in crop coordinates, the
+                same as predict_image on the cropped images
+        """
+        rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+        if self.batch_affine is None:
+            return self.predict_image(
+                [image[y0:y1, x0:x1] for x0, y0, x1, y1 in rects],
+                visual=False)
+        if rects.shape[0] == 0:
+            return {
+                'keypoint': np.zeros(
+                    (0, 17, 3), dtype=np.float32),
+                'score': np.zeros(
+                    (0, 1), dtype=np.float32)
+            }
+
+        results = []
+        for start_index in range(0, rects.shape[0], self.batch_size):
+            batch_rects = rects[start_index:start_index + self.batch_size]
+            # preprocess
+            self.det_times.preprocess_time_s.start()
+            inputs = self.preprocess_crops(image, batch_rects)
+            self.det_times.preprocess_time_s.end()
+
+            # model prediction
+            self.det_times.inference_time_s.start()
+            result = self.predict()
+            self.det_times.inference_time_s.end()
+
+            # postprocess
+            self.det_times.postprocess_time_s.start()
+            result = self.postprocess(inputs, result)
+            self.det_times.postprocess_time_s.end()
+            self.det_times.img_num += batch_rects.shape[0]
+            results.append(result)
+        return self.merge_batch_result(results)
+
     def get_person_from_rect(self, image, results):
         # crop the person result from image
         self.det_times.preprocess_time_s.start()
@@ -16,10 +16,9 @@ from scipy.optimize import linear_sum_assignment
 from collections import abc, defaultdict
 import cv2
 import numpy as np
-import math
 import paddle
 import paddle.nn as nn
-from keypoint_preprocess import get_affine_mat_kernel, get_affine_transform
+from keypoint_preprocess import get_affine_mat_kernel, get_affine_transforms
 
 
 class HrHRNetPostProcess(object):
@@ -248,42 +247,81 @@ class HRNetPostProcess(object):
         return preds, maxvals
 
     def gaussian_blur(self, heatmap, kernel):
+        """blur all heatmaps at once with a zero-padded separable gaussian
+        kernel and rescale each one back to its original maximum
+
+        Args:
+            heatmap: numpy.ndarray([batch_size, num_joints, height, width])
+            kernel (int): odd gaussian kernel size
+
+        Returns:
+            heatmap: numpy.ndarray, blurred heatmaps, the input is not modified
+        """
         border = (kernel - 1) // 2
-        batch_size = heatmap.shape[0]
-        num_joints = heatmap.shape[1]
         height = heatmap.shape[2]
         width = heatmap.shape[3]
-        for i in range(batch_size):
-            for j in range(num_joints):
-                origin_max = np.max(heatmap[i, j])
-                dr = np.zeros((height + 2 * border, width + 2 * border))
-                dr[border:-border, border:-border] = heatmap[i, j].copy()
-                dr = cv2.GaussianBlur(dr, (kernel, kernel), 0)
-                heatmap[i, j] = dr[border:-border, border:-border].copy()
-                heatmap[i, j] *= origin_max / np.max(heatmap[i, j])
-        return heatmap
-
-    def dark_parse(self, hm, coord):
-        heatmap_height = hm.shape[0]
-        heatmap_width = hm.shape[1]
-        px = int(coord[0])
-        py = int(coord[1])
-        if 1 < px < heatmap_width - 2 and 1 < py < heatmap_height - 2:
-            dx = 0.5 * (hm[py][px + 1] - hm[py][px - 1])
-            dy = 0.5 * (hm[py + 1][px] - hm[py - 1][px])
-            dxx = 0.25 * (hm[py][px + 2] - 2 * hm[py][px] + hm[py][px - 2])
-            dxy = 0.25 * (hm[py+1][px+1] - hm[py-1][px+1] - hm[py+1][px-1] \
-                + hm[py-1][px-1])
-            dyy = 0.25 * (
-                hm[py + 2 * 1][px] - 2 * hm[py][px] + hm[py - 2 * 1][px])
-            derivative = np.matrix([[dx], [dy]])
-            hessian = np.matrix([[dxx, dxy], [dxy, dyy]])
-            if dxx * dyy - dxy**2 != 0:
-                hessianinv = hessian.I
-                offset = -hessianinv * derivative
-                offset = np.squeeze(np.array(offset.T), axis=0)
-                coord += offset
-        return coord
+        weights = cv2.getGaussianKernel(kernel, 0).ravel().astype(heatmap.dtype)
+        origin_max = heatmap.max(axis=(2, 3), keepdims=True)
+
+        padded = np.pad(heatmap, ((0, 0), (0, 0), (border, border),
+                                  (border, border)))
+        # horizontal pass keeps the padded rows so the vertical pass sees zeros
+        blur_x = weights[0] * padded[..., 0:width]
+        for k in range(1, kernel):
+            blur_x += weights[k] * padded[..., k:k + width]
+        blurred = weights[0] * blur_x[..., 0:height, :]
+        for k in range(1, kernel):
+            blurred += weights[k] * blur_x[..., k:k + height, :]
+
+        blurred_max = blurred.max(axis=(2, 3), keepdims=True)
+        ratio = np.where(blurred_max > 0, origin_max / np.where(
+            blurred_max > 0, blurred_max, 1), 1)
+        return blurred * ratio
+
+    def dark_parse(self, hm, coords):
+        """refine all keypoints with a second order taylor expansion of the
+        log heatmap around the maximum, solving the 2x2 hessian systems in
+        closed form
+
+        Args:
+            hm: numpy.ndarray([batch_size, num_joints, height, width]), log heatmaps
+            coords: numpy.ndarray([batch_size, num_joints, 2]), integer maxima
+
+        Returns:
+            coords: numpy.ndarray([batch_size, num_joints, 2]), refined coords
+        """
+        heatmap_height = hm.shape[2]
+        heatmap_width = hm.shape[3]
+        maps = hm.reshape((-1, heatmap_height, heatmap_width))
+        flat_coords = coords.reshape((-1, 2))
+        px = flat_coords[:, 0].astype(np.int64)
+        py = flat_coords[:, 1].astype(np.int64)
+        valid = (1 < px) & (px < heatmap_width - 2) & (1 < py) & (
+            py < heatmap_height - 2)
+        # clip so the stencil of invalid points stays in range, they are
+        # masked out below
+        px = np.clip(px, 2, heatmap_width - 3)
+        py = np.clip(py, 2, heatmap_height - 3)
+        b = np.arange(maps.shape[0])
+
+        def at(oy, ox):
+            return maps[b, py + oy, px + ox]
+
+        center = at(0, 0)
+        dx = 0.5 * (at(0, 1) - at(0, -1))
+        dy = 0.5 * (at(1, 0) - at(-1, 0))
+        dxx = 0.25 * (at(0, 2) - 2 * center + at(0, -2))
+        dxy = 0.25 * (at(1, 1) - at(-1, 1) - at(1, -1) + at(-1, -1))
+        dyy = 0.25 * (at(2, 0) - 2 * center + at(-2, 0))
+        det = dxx * dyy - dxy**2
+        valid &= det != 0
+        det = np.where(valid, det, 1)
+
+        offset = np.stack(
+            [-(dyy * dx - dxy * dy) / det, -(dxx * dy - dxy * dx) / det],
+            axis=1)
+        flat_coords += np.where(valid[:, None], offset, 0)
+        return flat_coords.reshape(coords.shape)
 
     def dark_postprocess(self, hm, coords, kernelsize):
         """
@@ -293,10 +331,38 @@ class HRNetPostProcess(object):
         hm = self.gaussian_blur(hm, kernelsize)
         hm = np.maximum(hm, 1e-10)
         hm = np.log(hm)
-        for n in range(coords.shape[0]):
-            for p in range(coords.shape[1]):
-                coords[n, p] = self.dark_parse(hm[n][p], coords[n][p])
-        return coords
+        return self.dark_parse(hm, coords)
+
+    def quarter_offset(self, heatmaps, coords):
+        """move every keypoint a quarter pixel from the highest response
+        towards the second highest response
+
+        Args:
+            heatmaps: numpy.ndarray([batch_size, num_joints, height, width])
+            coords: numpy.ndarray([batch_size, num_joints, 2]), integer maxima
+
+        Returns:
+            coords: numpy.ndarray([batch_size, num_joints, 2])
+        """
+        heatmap_height = heatmaps.shape[2]
+        heatmap_width = heatmaps.shape[3]
+        maps = heatmaps.reshape((-1, heatmap_height, heatmap_width))
+        flat_coords = coords.reshape((-1, 2))
+        px = np.floor(flat_coords[:, 0] + 0.5).astype(np.int64)
+        py = np.floor(flat_coords[:, 1] + 0.5).astype(np.int64)
+        valid = (1 < px) & (px < heatmap_width - 1) & (1 < py) & (
+            py < heatmap_height - 1)
+        px = np.clip(px, 1, heatmap_width - 2)
+        py = np.clip(py, 1, heatmap_height - 2)
+        b = np.arange(maps.shape[0])
+        diff = np.stack(
+            [
+                maps[b, py, px + 1] - maps[b, py, px - 1],
+                maps[b, py + 1, px] - maps[b, py - 1, px]
+            ],
+            axis=1)
+        flat_coords += np.where(valid[:, None], np.sign(diff) * .25, 0)
+        return flat_coords.reshape(coords.shape)
 
     def get_final_preds(self, heatmaps, center, scale, kernelsize=3):
         """the highest heatvalue location with a quarter offset in the
@@ -320,23 +386,12 @@ class HRNetPostProcess(object):
         if self.use_dark:
             coords = self.dark_postprocess(heatmaps, coords, kernelsize)
         else:
-            for n in range(coords.shape[0]):
-                for p in range(coords.shape[1]):
-                    hm = heatmaps[n][p]
-                    px = int(math.floor(coords[n][p][0] + 0.5))
-                    py = int(math.floor(coords[n][p][1] + 0.5))
-                    if 1 < px < heatmap_width - 1 and 1 < py < heatmap_height - 1:
-                        diff = np.array([
-                            hm[py][px + 1] - hm[py][px - 1],
-                            hm[py + 1][px] - hm[py - 1][px]
-                        ])
-                        coords[n][p] += np.sign(diff) * .25
-        preds = coords.copy()
+            coords = self.quarter_offset(heatmaps, coords)
 
         # Transform back
-        for i in range(coords.shape[0]):
-            preds[i] = transform_preds(coords[i], center[i], scale[i],
-                                       [heatmap_width, heatmap_height])
+        preds = transform_preds(coords, center, scale,
+                                [heatmap_width, heatmap_height]).astype(
+                                    coords.dtype)
 
         return preds, maxvals
 
@@ -348,11 +403,38 @@ class HRNetPostProcess(object):
 
 
 def transform_preds(coords, center, scale, output_size):
-    target_coords = np.zeros(coords.shape)
-    trans = get_affine_transform(center, scale * 200, 0, output_size, inv=1)
-    for p in range(coords.shape[0]):
-        target_coords[p, 0:2] = affine_transform(coords[p, 0:2], trans)
-    return target_coords
+    """project heatmap coords back to the image of each box
+
+    Args:
+        coords (np.ndarray[N, J, 2] or [J, 2]): heatmap coords
+        center (np.ndarray[N, 2] or [2, ]): box centers
+        scale (np.ndarray[N, 2] or [2, ]): box scales in 200 pixel units
+        output_size (list): heatmap size [w, h]
+
+    Returns:
+        np.ndarray: coords in the image, the same shape as coords
+    """
+    coords = np.asarray(coords)
+    single = coords.ndim == 2
+    if single:
+        coords = coords[None]
+    trans = get_affine_transforms(
+        center, np.asarray(scale).reshape(-1, 2) * 200, output_size, inv=True)
+    target_coords = batch_affine_transform(coords[..., 0:2], trans)
+    return target_coords[0] if single else target_coords
+
+
+def batch_affine_transform(pts, trans):
+    """apply one affine matrix per batch item to its points
+
+    Args:
+        pts (np.ndarray[N, J, 2]): points
+        trans (np.ndarray[N, 2, 3]): affine matrices
+
+    Returns:
+        np.ndarray[N, J, 2]: transformed points
+    """
+    return np.einsum('nij,nkj->nki', trans[:, :, :2], pts) + trans[:, None, :, 2]
 
 
 def affine_transform(pt, t):
@@ -362,8 +444,13 @@ def affine_transform(pt, t):
 
 
 def translate_to_ori_images(keypoint_result, batch_records):
+    """move keypoints from crop coords to original image coords, batch_records
+    holds the [x1, y1, x2, y2] of each crop in the original image
+    """
     kpts = keypoint_result['keypoint']
     scores = keypoint_result['score']
-    kpts[..., 0] += batch_records[:, 0:1]
-    kpts[..., 1] += batch_records[:, 1:2]
+    batch_records = np.asarray(batch_records)
+    if batch_records.size == 0:
+        return kpts, scores
+    kpts[..., 0:2] += batch_records.reshape(-1, 4)[:, None, 0:2]
     return kpts, scores
@@ -110,6 +110,42 @@ def get_affine_transform(center,
     return trans
 
 
+def get_affine_transforms(center, input_size, output_size, inv=False):
+    """Get the affine transform matrices of many boxes at once, the batched
+    counterpart of get_affine_transform without rotation and shift.
+
+    Like get_affine_transform, the scale factor only depends on the width of
+    the box, so the aspect ratio of the box content is preserved.
+
+    Args:
+        center (np.ndarray[N, 2]): Centers of the bounding boxes (x, y).
+        input_size (np.ndarray[N, 2]): Sizes of the boxes [w, h].
+        output_size (np.ndarray[2, ]): Size of the destination [w, h].
+        inv (bool): Option to inverse the affine transform direction.
+            (inv=False: src->dst or inv=True: dst->src)
+
+    Returns:
+        np.ndarray[N, 2, 3]: The transform matrices.
+    """
+    center = np.asarray(center, dtype=np.float64).reshape(-1, 2)
+    input_size = np.asarray(input_size, dtype=np.float64).reshape(-1, 2)
+    dst_w, dst_h = float(output_size[0]), float(output_size[1])
+    dst_center = np.array([dst_w * 0.5, dst_h * 0.5])
+
+    trans = np.zeros((center.shape[0], 2, 3), dtype=np.float64)
+    if inv:
+        ratio = input_size[:, 0] / dst_w
+        trans[:, 0, 0] = ratio
+        trans[:, 1, 1] = ratio
+        trans[:, :, 2] = center - dst_center * ratio[:, None]
+    else:
+        ratio = dst_w / input_size[:, 0]
+        trans[:, 0, 0] = ratio
+        trans[:, 1, 1] = ratio
+        trans[:, :, 2] = dst_center - center * ratio[:, None]
+    return trans
+
+
 def get_warp_matrix(theta, size_input, size_dst, size_target):
     """This code is based on 
         https://github.com/open-mmlab/mmpose/blob/master/mmpose/core/post_processing/post_transforms.py
@@ -241,3 +277,127 @@ def expand_crop(images, rect, expand_ratio=0.3):
     xmin = max(0, int(center[1] - w_half))
     xmax = min(imgw - 1, int(center[1] + w_half))
     return images[ymin:ymax, xmin:xmax, :], [xmin, ymin, xmax, ymax], org_rect
+
+
+def expand_crop_rects(image_shape, rects, expand_ratio=0.3):
+    """Compute the crop rects of expand_crop for many boxes at once, without
+    slicing the image.
+
+    Args:
+        image_shape (tuple): shape of the image (h, w, c).
+        rects (np.ndarray[N, 6]): [class, score, x1, y1, x2, y2] boxes.
+        expand_ratio (float): ratio to expand the boxes by.
+
+    Returns:
+        new_rects (np.ndarray[M, 4]): int crop rects [x1, y1, x2, y2].
+        org_rects (np.ndarray[M, 4]): int original rects [x1, y1, x2, y2].
+        keep (np.ndarray[M, ]): indices of the kept boxes in rects, boxes that
+            are not persons or whose crop is empty are skipped.
+    """
+    imgh, imgw = image_shape[0], image_shape[1]
+    rects = np.trunc(np.asarray(rects, dtype=np.float64).reshape(-1, 6))
+    label = rects[:, 0]
+    xmin, ymin, xmax, ymax = rects[:, 2], rects[:, 3], rects[:, 4], rects[:, 5]
+    h_half = (ymax - ymin) * (1 + expand_ratio) / 2.
+    w_half = (xmax - xmin) * (1 + expand_ratio) / 2.
+    w_half = np.where(h_half > w_half * 4 / 3, h_half * 0.75, w_half)
+    center_y = (ymin + ymax) / 2.
+    center_x = (xmin + xmax) / 2.
+    new_rects = np.stack(
+        [
+            np.maximum(0, np.trunc(center_x - w_half)),
+            np.maximum(0, np.trunc(center_y - h_half)),
+            np.minimum(imgw - 1, np.trunc(center_x + w_half)),
+            np.minimum(imgh - 1, np.trunc(center_y + h_half)),
+        ],
+        axis=1).astype(np.int64)
+    keep = np.where((label == 0) & (new_rects[:, 2] > new_rects[:, 0]) & (
+        new_rects[:, 3] > new_rects[:, 1]))[0]
+    return new_rects[keep], rects[keep, 2:6].astype(np.int64), keep
+
+
+class TopDownBatchAffine(object):
+    """Warp many boxes of one image straight into a normalized NCHW batch.
+
+    This fuses expand-cropping, TopDownEvalAffine, NormalizeImage and Permute
+    for top-down keypoint models. Each box is warped from a view of the full
+    image, so pixels outside the box are zero padded just like warping a crop,
+    and the normalization runs once over the whole batch.
+
+    Args:
+        trainsize (list): [w, h], the standard size used to train
+        mean (list): im - mean
+        std (list): im / std
+        is_scale (bool): whether need im / 255
+        norm_type (str): type in ['mean_std', 'none']
+        use_udp (bool): whether to use Unbiased Data Processing.
+    """
+
+    def __init__(self,
+                 trainsize,
+                 mean=[0.485, 0.456, 0.406],
+                 std=[0.229, 0.224, 0.225],
+                 is_scale=True,
+                 norm_type='mean_std',
+                 use_udp=False):
+        self.trainsize = [int(trainsize[0]), int(trainsize[1])]
+        self.use_udp = use_udp
+        # im * alpha + beta == ((im / 255) - mean) / std
+        alpha = np.full(3, 1.0 / 255.0 if is_scale else 1.0)
+        beta = np.zeros(3)
+        if norm_type == 'mean_std':
+            alpha /= np.array(std)
+            beta = -np.array(mean) / np.array(std)
+        self.alpha = alpha.astype(np.float32)[:, None, None]
+        self.beta = beta.astype(np.float32)[:, None, None]
+        self._warped = np.zeros((0, self.trainsize[1], self.trainsize[0], 3),
+                                dtype=np.uint8)
+        self._inputs = np.zeros((0, 3, self.trainsize[1], self.trainsize[0]),
+                                dtype=np.float32)
+
+    def _reserve(self, num):
+        if self._warped.shape[0] < num:
+            self._warped = np.zeros(
+                (num, ) + self._warped.shape[1:], dtype=np.uint8)
+            self._inputs = np.zeros(
+                (num, ) + self._inputs.shape[1:], dtype=np.float32)
+
+    def get_transforms(self, rects):
+        sizes = (rects[:, 2:4] - rects[:, 0:2]).astype(np.float64)
+        if self.use_udp:
+            return np.stack([
+                get_warp_matrix(0, size, [
+                    self.trainsize[0] - 1.0, self.trainsize[1] - 1.0
+                ], size) for size in sizes
+            ])
+        return get_affine_transforms(sizes / 2., sizes, self.trainsize)
+
+    def __call__(self, image, rects):
+        """
+        Args:
+            image (np.ndarray): the full image (h, w, c)
+            rects (np.ndarray[N, 4]): int crop rects [x1, y1, x2, y2]
+
+        Returns:
+            inputs (np.ndarray[N, 3, h, w]): float32 model input, a view of a
+                buffer reused by the next call
+            im_shape (np.ndarray[N, 2]): float32 crop shapes (h, w)
+        """
+        num = rects.shape[0]
+        self._reserve(num)
+        trans = self.get_transforms(rects)
+        dsize = (self.trainsize[0], self.trainsize[1])
+        for i, (xmin, ymin, xmax, ymax) in enumerate(rects):
+            # the slice is a view, cv2 treats it as the whole source image
+            cv2.warpAffine(
+                image[ymin:ymax, xmin:xmax],
+                trans[i],
+                dsize,
+                dst=self._warped[i],
+                flags=cv2.INTER_LINEAR)
+        inputs = self._inputs[:num]
+        np.multiply(
+            self._warped[:num].transpose((0, 3, 1, 2)), self.alpha, out=inputs)
+        inputs += self.beta
+        im_shape = (rects[:, [3, 2]] - rects[:, [1, 0]]).astype(np.float32)
+        return inputs, im_shape
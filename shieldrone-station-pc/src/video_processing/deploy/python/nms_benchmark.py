@@ -0,0 +1,170 @@
+# Copyright (c) 2021 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark and equivalence check for the vectorized NMS in utils.py. The
+per-pair loops below are the original implementations, kept unmodified as
+the reference.
+
+Usage:
+    python nms_benchmark.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+# add deploy path of PaddleDetection to sys.path
+parent_path = os.path.abspath(os.path.join(__file__, *(['..'])))
+sys.path.insert(0, parent_path)
+
+from utils import multiclass_nms
+
+
+def multiclass_nms_loop(bboxs, num_classes, match_threshold=0.6, match_metric='iou'):
+    final_boxes = []
+    for c in range(num_classes):
+        idxs = bboxs[:, 0] == c
+        if np.count_nonzero(idxs) == 0: continue
+        r = nms_loop(bboxs[idxs, 1:], match_threshold, match_metric)
+        final_boxes.append(np.concatenate([np.full((r.shape[0], 1), c), r], 1))
+    return final_boxes
+
+
+def nms_loop(dets, match_threshold=0.6, match_metric='iou'):
+    """ Apply NMS to avoid detecting too many overlapping bounding boxes.
+        Args:
+            dets: shape [N, 5], [score, x1, y1, x2, y2]
+            match_metric: 'iou' or 'ios'
+            match_threshold: overlap thresh for match metric.
+    """
+    if dets.shape[0] == 0:
+        return dets[[], :]
+    scores = dets[:, 0]
+    x1 = dets[:, 1]
+    y1 = dets[:, 2]
+    x2 = dets[:, 3]
+    y2 = dets[:, 4]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+
+    ndets = dets.shape[0]
+    suppressed = np.zeros((ndets), dtype=np.int32)
+
+    for _i in range(ndets):
+        i = order[_i]
+        if suppressed[i] == 1:
+            continue
+        ix1 = x1[i]
+        iy1 = y1[i]
+        ix2 = x2[i]
+        iy2 = y2[i]
+        iarea = areas[i]
+        for _j in range(_i + 1, ndets):
+            j = order[_j]
+            if suppressed[j] == 1:
+                continue
+            xx1 = max(ix1, x1[j])
+            yy1 = max(iy1, y1[j])
+            xx2 = min(ix2, x2[j])
+            yy2 = min(iy2, y2[j])
+            w = max(0.0, xx2 - xx1 + 1)
+            h = max(0.0, yy2 - yy1 + 1)
+            inter = w * h
+            if match_metric == 'iou':
+                union = iarea + areas[j] - inter
+                match_value = inter / union
+            elif match_metric == 'ios':
+                smaller = min(iarea, areas[j])
+                match_value = inter / smaller
+            else:
+                raise ValueError()
+            if match_value >= match_threshold:
+                suppressed[j] = 1
+    keep = np.where(suppressed == 0)[0]
+    dets = dets[keep, :]
+    return dets
+
+
+def check_nms(bboxs, num_classes, match_threshold=0.6, match_metric='iou'):
+    """ Assert multiclass_nms keeps the same boxes in the same order as the
+        original loop.
+    """
+    ref = multiclass_nms_loop(bboxs, num_classes, match_threshold,
+                              match_metric)
+    out = multiclass_nms(bboxs, num_classes, match_threshold, match_metric)
+    ref = np.concatenate(ref) if ref else np.zeros((0, 6))
+    out = np.concatenate(out) if out else np.zeros((0, 6))
+    assert ref.shape == out.shape and np.allclose(ref, out), \
+        "multiclass_nms result mismatch with {} boxes".format(bboxs.shape[0])
+
+
+def benchmark_nms(sizes=(100, 1000, 5000),
+                  num_classes=3,
+                  match_threshold=0.6,
+                  repeats=3,
+                  seed=0):
+    """ Compare multiclass_nms against the original per-pair loop on random
+        sliced-detection-like boxes, asserting both keep the same boxes.
+        Each size is also checked with scores rounded to 0.05, as overlapping
+        slices often give the same person exactly the same score.
+        Args:
+            sizes: numbers of candidate boxes to measure
+            num_classes: number of classes the boxes are spread over
+            repeats: iterations averaged per size
+        Returns:
+            list of dict, average cost in milliseconds per size and metric
+    """
+    rng = np.random.RandomState(seed)
+    results = []
+    for num in sizes:
+        xy = rng.uniform(0, 1920, size=(num, 2))
+        wh = rng.uniform(20, 160, size=(num, 2))
+        bboxs = np.concatenate(
+            [
+                rng.randint(0, num_classes, size=(num, 1)),
+                rng.uniform(0.3, 1.0, size=(num, 1)), xy, xy + wh
+            ],
+            axis=1)
+        tied = bboxs.copy()
+        tied[:, 1] = np.round(tied[:, 1] * 20) / 20
+        for metric in ('iou', 'ios'):
+            check_nms(tied, num_classes, match_threshold, metric)
+            res = {'boxes': num, 'metric': metric}
+            outputs = {}
+            for name, func in (('vectorized', multiclass_nms),
+                               ('loop', multiclass_nms_loop)):
+                st = time.time()
+                for _ in range(repeats):
+                    outputs[name] = func(bboxs, num_classes, match_threshold,
+                                         metric)
+                res[name] = (time.time() - st) / repeats * 1000
+            ref = np.concatenate(outputs['loop'])
+            out = np.concatenate(outputs['vectorized'])
+            assert ref.shape == out.shape and np.allclose(ref, out), \
+                "multiclass_nms result mismatch with {} boxes".format(num)
+            results.append(res)
+            print("boxes: {:5d}, metric: {}, vectorized: {:.2f} ms, "
+                  "loop: {:.2f} ms".format(num, metric, res['vectorized'],
+                                            res['loop']))
+    return results
+
+
+if __name__ == '__main__':
+    # equal scores: the original loop keeps the later box
+    check_nms(
+        np.array([[0, 0.9, 0, 0, 10, 10], [0, 0.9, 1, 1, 11, 11]]), 1)
+    benchmark_nms()
@@ -330,13 +330,73 @@ def get_current_memory_mb():
 
 
 def multiclass_nms(bboxs, num_classes, match_threshold=0.6, match_metric='iou'):
-    final_boxes = []
+    """ Apply NMS per class in a single pass. Boxes of each class are shifted
+        by a class-dependent offset so that boxes of different classes never
+        overlap, then one NMS runs over all classes.
+        Args:
+            bboxs: shape [N, 6], [class, score, x1, y1, x2, y2]
+            num_classes: classes outside [0, num_classes) are discarded
+            match_metric: 'iou' or 'ios'
+            match_threshold: overlap thresh for match metric.
+        Returns:
+            list of [M, 6] arrays, one per class that has boxes left
+    """
+    if bboxs.shape[0] == 0:
+        return []
+    classes = bboxs[:, 0]
+    valid = np.where((classes >= 0) & (classes < num_classes))[0]
+    if valid.shape[0] == 0:
+        return []
+    coords = bboxs[valid, 2:6]
+    span = coords.max() - coords.min() + 2
+    dets = bboxs[valid, 1:6].copy()
+    dets[:, 1:5] += (classes[valid] * span)[:, None]
+
+    # score order of each class taken exactly as nms() would on that class
+    # alone, so boxes with equal scores are resolved the same way
+    order = []
     for c in range(num_classes):
-        idxs = bboxs[:, 0] == c
-        if np.count_nonzero(idxs) == 0: continue
-        r = nms(bboxs[idxs, 1:], match_threshold, match_metric)
-        final_boxes.append(np.concatenate([np.full((r.shape[0], 1), c), r], 1))
-    return final_boxes
+        idxs = np.where(classes[valid] == c)[0]
+        order.append(idxs[dets[idxs, 0].argsort()[::-1]])
+    order = np.concatenate(order)
+
+    keep = valid[_nms_keep(dets, match_threshold, match_metric, order)]
+    # same order as running nms class by class: class first, then input order
+    keep = keep[np.lexsort((keep, classes[keep]))]
+    kept_classes = classes[keep]
+    splits = np.where(np.diff(kept_classes) != 0)[0] + 1
+    return np.split(bboxs[keep], splits)
+
+
+def _nms_keep(dets, match_threshold=0.6, match_metric='iou', order=None):
+    # Greedy NMS over the score order. Each step suppresses every remaining
+    # box that matches the current best one in a single numpy comparison.
+    if match_metric not in ('iou', 'ios'):
+        raise ValueError()
+    x1 = dets[:, 1]
+    y1 = dets[:, 2]
+    x2 = dets[:, 3]
+    y2 = dets[:, 4]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    if order is None:
+        order = dets[:, 0].argsort()[::-1]
+
+    keep = []
+    while order.shape[0] > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(
+            0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]) + 1)
+        h = np.maximum(
+            0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]) + 1)
+        inter = w * h
+        if match_metric == 'iou':
+            match_value = inter / (areas[i] + areas[rest] - inter)
+        else:
+            match_value = inter / np.minimum(areas[i], areas[rest])
+        order = rest[match_value < match_threshold]
+    return np.sort(np.asarray(keep, dtype=np.int64))
 
 
 def nms(dets, match_threshold=0.6, match_metric='iou'):
@@ -348,50 +408,7 @@ def nms(dets, match_threshold=0.6, match_metric='iou'):
     """
     if dets.shape[0] == 0:
         return dets[[], :]
-    scores = dets[:, 0]
-    x1 = dets[:, 1]
-    y1 = dets[:, 2]
-    x2 = dets[:, 3]
-    y2 = dets[:, 4]
-    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    order = scores.argsort()[::-1]
-
-    ndets = dets.shape[0]
-    suppressed = np.zeros((ndets), dtype=np.int32)
-
-    for _i in range(ndets):
-        i = order[_i]
-        if suppressed[i] == 1:
-            continue
-        ix1 = x1[i]
-        iy1 = y1[i]
-        ix2 = x2[i]
-        iy2 = y2[i]
-        iarea = areas[i]
-        for _j in range(_i + 1, ndets):
-            j = order[_j]
-            if suppressed[j] == 1:
-                continue
-            xx1 = max(ix1, x1[j])
-            yy1 = max(iy1, y1[j])
-            xx2 = min(ix2, x2[j])
-            yy2 = min(iy2, y2[j])
-            w = max(0.0, xx2 - xx1 + 1)
-            h = max(0.0, yy2 - yy1 + 1)
-            inter = w * h
-            if match_metric == 'iou':
-                union = iarea + areas[j] - inter
-                match_value = inter / union
-            elif match_metric == 'ios':
-                smaller = min(iarea, areas[j])
-                match_value = inter / smaller
-            else:
-                raise ValueError()
-            if match_value >= match_threshold:
-                suppressed[j] = 1
-    keep = np.where(suppressed == 0)[0]
-    dets = dets[keep, :]
-    return dets
+    return dets[_nms_keep(dets, match_threshold, match_metric), :]
 
 
 coco_clsid2catid = {
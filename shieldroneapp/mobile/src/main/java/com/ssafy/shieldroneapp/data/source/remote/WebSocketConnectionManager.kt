@@ -7,6 +7,7 @@ import okhttp3.WebSocketListener
 import android.util.Log
 import kotlinx.coroutines.*
 import okhttp3.Response
+import okio.ByteString
 import java.net.SocketException
 import java.util.concurrent.TimeUnit
 import java.util.concurrent.atomic.AtomicBoolean
@@ -50,6 +51,11 @@ class WebSocketConnectionManager(
                     webSocketSubscriptions.handleIncomingMessage(text)
                 }
 
+                override fun onMessage(webSocket: WebSocket, bytes: ByteString) {
+                    Log.d(TAG, "바이너리 메시지 수신: ${bytes.size} bytes")
+                    webSocketSubscriptions.handleIncomingFrame(bytes.toByteArray())
+                }
+
                 override fun onFailure(webSocket: WebSocket, t: Throwable, response: Response?) {
                     Log.e(
                         TAG,
@@ -10,6 +10,8 @@ data class WarningData(
     val time: String,
     val warningFlag: Boolean,
     val frame: String? = null,
+    // 0보다 크면 JPEG 프레임이 바로 다음 바이너리 메시지로 전송됨
+    val frameSize: Int = 0,
 )
 
 data class ObjectData(
@@ -40,13 +42,19 @@ class WebSocketMessageParser @Inject constructor() {
                 } else {
                     null
                 }
+                val frameSize = if (jsonObject.has("frameSize")) {
+                    jsonObject.get("frameSize").asInt
+                } else {
+                    0
+                }
 
                 Log.d(TAG, "경고음 메시지 파싱 성공 - time: $time, warningFlag: $warningFlag")
 
                 WarningData(
                     time,
                     warningFlag,
-                    frame
+                    frame,
+                    frameSize
                 )
             } else {
                 Log.d(TAG, "sendWarningFlag 타입이 아니거나 필수 필드 누락")
@@ -1,6 +1,7 @@
 package com.ssafy.shieldroneapp.data.source.remote
 
 import android.content.Context
+import android.util.Base64
 import android.util.Log
 import com.google.android.gms.wearable.Wearable
 import com.google.gson.Gson
@@ -53,6 +54,11 @@ class WebSocketSubscriptions @Inject constructor(
     private val gson = Gson()
     private var lastWarningTimestamp: Long = 0
 
+    // 위험 감지 메시지와 뒤따르는 JPEG 바이너리 메시지를 짝지어 처리하기 위한 대기 상태
+    private val frameLock = Any()
+    private var pendingWarning: WarningData? = null
+    private var pendingFrame: ByteArray? = null
+
     fun setupWatchMessageListener() {
         Wearable.getMessageClient(context).addListener { event ->
             when (event.path) {
@@ -125,8 +131,13 @@ class WebSocketSubscriptions @Inject constructor(
                         if (warningData != null) {
                             lastWarningTimestamp = System.currentTimeMillis()
                             Log.d(TAG, "위험 감지 메시지 파싱 성공 - warningFlag: ${warningData.warningFlag}")
-                            val isSafeConfirmed = alertHandler.getSafeConfirmationStatus()
-                            handleWarningAlert(warningData, isSafeConfirmed)
+                            if (warningData.frameSize > 0 && warningData.frame == null) {
+                                // JPEG 프레임은 별도 바이너리 메시지로 도착
+                                attachFrame(warningData = warningData)
+                            } else {
+                                val isSafeConfirmed = alertHandler.getSafeConfirmationStatus()
+                                handleWarningAlert(warningData, isSafeConfirmed)
+                            }
                         } else {
                             Log.e(TAG, "위험 감지 메시지 파싱 실패")
                         }
@@ -156,6 +167,39 @@ class WebSocketSubscriptions @Inject constructor(
         }
     }
 
+    fun handleIncomingFrame(frame: ByteArray) {
+        subscriptionScope.launch {
+            try {
+                attachFrame(frame = frame)
+            } catch (e: Exception) {
+                Log.e(TAG, "프레임 메시지 처리 중 오류 발생", e)
+            }
+        }
+    }
+
+    /**
+     * 위험 감지 메시지와 JPEG 프레임 중 먼저 도착한 쪽을 보관하고, 둘이 모두 도착하면 알림을 처리한다.
+     * 워치 전송 등 기존 흐름은 base64 문자열을 사용하므로 여기서 한 번만 인코딩한다.
+     */
+    private suspend fun attachFrame(warningData: WarningData? = null, frame: ByteArray? = null) {
+        val completed = synchronized(frameLock) {
+            val warning = warningData ?: pendingWarning
+            val bytes = frame ?: pendingFrame
+            if (warning != null && bytes != null) {
+                pendingWarning = null
+                pendingFrame = null
+                warning.copy(frame = Base64.encodeToString(bytes, Base64.NO_WRAP))
+            } else {
+                if (warningData != null) pendingWarning = warningData
+                if (frame != null) pendingFrame = frame
+                null
+            }
+        } ?: return
+
+        val isSafeConfirmed = alertHandler.getSafeConfirmationStatus()
+        handleWarningAlert(completed, isSafeConfirmed)
+    }
+
     private suspend fun handleWarningAlert(
         warningData: WarningData,
         userConfirmedSafe: Boolean = false,